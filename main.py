@@ -1,47 +1,89 @@
 import argparse
 import subprocess
+import sys
 
-# Import config loaders and pipeline classes for each task
-from src.config_loaders.preprocessing_config_loader import preprocessing_config_loader
-from src.preprocessing_pipeline import PreprocessingPipeline
-
-from src.config_loaders.training_config_loader import training_config_loader
-from src.training_pipeline import TrainingPipeline
-
-from src.config_loaders.testing_config_loader import testing_config_loader
-from src.testing_pipeline import TestingPipeline
+# Config loaders and pipelines are only imported by the selected mode: torch, transformers, datasets or boto3
+# take seconds to import and most modes do not need all of them
+MODE_MODULES = {"process_data": ["src.config_loaders.preprocessing_config_loader", "src.preprocessing_pipeline"],
+                "train": ["src.config_loaders.training_config_loader", "src.training_pipeline"],
+                "test": ["src.config_loaders.testing_config_loader", "src.testing_pipeline"],
+                "inference": ["src.web_app.inference_server"],
+                "bench": ["src.config_loaders.benchmark_config_loader", "src.benchmark_pipeline"],
+                "score": ["src.config_loaders.scoring_config_loader", "src.scoring_pipeline"],
+                "sweep": ["src.config_loaders.sweep_config_loader", "src.sweep_pipeline"]}
 
 if __name__ == "__main__":
 
     # Parse command-line argument to determine which mode to run
     parser = argparse.ArgumentParser(description="Sentiment Prediction")
-    parser.add_argument("mode", choices=["process_data", "train", "test", "inference"],
-                        default="process_data", nargs="?", help="Choose mode: process_data, train, test, or inference")
+    parser.add_argument("mode", choices=["process_data", "train", "test", "inference", "bench", "score", "sweep"],
+                        default="process_data", nargs="?", help="Choose mode: process_data, train, test, inference, bench, score, or sweep")
+    parser.add_argument("--import-report", action="store_true", help="Print the import time of the selected mode instead of running it")
     args = parser.parse_args()
 
+    if args.import_report:
+        from src.utils.startup_report import print_import_report
+        print_import_report(modules=MODE_MODULES[args.mode])
+        sys.exit(0)
+
     # Launch the appropriate pipeline based on the selected mode
 
     if args.mode == "process_data":
         # Load processing config and run data preprocessing pipeline
+        from src.config_loaders.preprocessing_config_loader import preprocessing_config_loader
+        from src.preprocessing_pipeline import PreprocessingPipeline
         processing_config = preprocessing_config_loader(config_path="config/preprocessing_config.json")
         processing_pipeline = PreprocessingPipeline(config=processing_config)
         processing_pipeline.run()
     
     elif args.mode == "train":
         # Load training config and run training pipeline
+        from src.config_loaders.training_config_loader import training_config_loader
+        from src.training_pipeline import TrainingPipeline
         training_config = training_config_loader(config_path="config/training_config.json")
         training_pipeline = TrainingPipeline(config=training_config)
         training_pipeline.run()
     
     elif args.mode == "test":
         # Load testing config and run testing pipeline
+        from src.config_loaders.testing_config_loader import testing_config_loader
+        from src.testing_pipeline import TestingPipeline
         testing_config = testing_config_loader(config_path="config/testing_config.json")
         testing_pipeline = TestingPipeline(config=testing_config)
         testing_pipeline.run()
     
     elif args.mode == "inference":
-        # Run the Streamlit app
-        subprocess.run(["streamlit", "run", "src/web_app/app.py"])
+        # Start the micro-batching inference service, then run the Streamlit app as a thin client of the service
+        inference_server = subprocess.Popen([sys.executable, "src/web_app/inference_server.py"])
+        try:
+            subprocess.run(["streamlit", "run", "src/web_app/app.py"])
+        finally:
+            inference_server.terminate()
+            inference_server.wait()
+    
+    elif args.mode == "bench":
+        # Load benchmark config and run the benchmark suite
+        from src.config_loaders.benchmark_config_loader import benchmark_config_loader
+        from src.benchmark_pipeline import BenchmarkPipeline
+        benchmark_config = benchmark_config_loader(config_path="config/benchmark_config.json")
+        benchmark_pipeline = BenchmarkPipeline(config=benchmark_config)
+        benchmark_pipeline.run()
+    
+    elif args.mode == "score":
+        # Load scoring config and score the unlabeled reviews with a pool of worker processes
+        from src.config_loaders.scoring_config_loader import scoring_config_loader
+        from src.scoring_pipeline import ScoringPipeline
+        scoring_config = scoring_config_loader(config_path="config/scoring_config.json")
+        scoring_pipeline = ScoringPipeline(config=scoring_config)
+        scoring_pipeline.run()
+    
+    elif args.mode == "sweep":
+        # Load sweep config and train the trials of the hyperparameter sweep with a pool of worker processes
+        from src.config_loaders.sweep_config_loader import sweep_config_loader
+        from src.sweep_pipeline import SweepPipeline
+        sweep_config = sweep_config_loader(config_path="config/sweep_config.json")
+        sweep_pipeline = SweepPipeline(config=sweep_config)
+        sweep_pipeline.run()
     
     else:
-        print("Invalid mode. Please choose 'process_data', 'train', 'test', or 'inference'.")
\ No newline at end of file
+        print("Invalid mode. Please choose 'process_data', 'train', 'test', 'inference', 'bench', 'score', or 'sweep'.")
\ No newline at end of file
@@ -1,21 +1,74 @@
 import os
+import json
+import hashlib
+import posixpath
+import threading
 import boto3
+from botocore.exceptions import ClientError
+from datetime import datetime, timezone
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, Any, Iterable
 
+MANIFEST_FILE_NAME = ".s3_manifest.json"
+# Written last when a model is promoted to an S3 prefix: a model is complete in S3 once its promotion manifest exists
+PROMOTION_MANIFEST_FILE_NAME = "promotion_manifest.json"
+
+def compute_model_version(etags: Dict[str, str]) -> str:
+    """Identity of a model, computed from the ETags of its files."""
+    return hashlib.sha256(json.dumps(etags, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def compute_s3_etag(file_path: str, multipart_chunksize: int) -> str:
+    """
+    Compute the ETag that S3 assigns to a file uploaded with the given multipart chunk size
+    (MD5 of the content for single part uploads, MD5 of the concatenated part MD5s followed by the number of parts otherwise).
+
+    Args:
+        file_path (str): Local file path.
+        multipart_chunksize (int): Multipart threshold and part size used for the upload.
+
+    Returns:
+        str: ETag of the file, without quotes.
+    """
+    part_digests = []
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(multipart_chunksize), b""):
+            part_digests.append(hashlib.md5(chunk).digest())
+
+    if len(part_digests) == 0:
+        return hashlib.md5(b"").hexdigest()
+    if os.path.getsize(file_path) < multipart_chunksize:
+        return part_digests[0].hex()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
 
 class S3Manager:
     """
     A utility class for managing AWS S3 Service operations.
+
+    Directory transfers run in a thread pool, large files are transferred in multipart, and files whose ETag did not change
+    are skipped. A local manifest records the ETag of each transferred file, so an interrupted transfer resumes where it stopped.
     """
 
-    def __init__(self, bucket_name: str) -> None:
+    def __init__(self,
+                 bucket_name: str,
+                 max_workers: int = 8,
+                 multipart_chunksize: int = 8 * 1024 * 1024,
+                 s3_client: Optional[Any] = None) -> None:
         """
         Initialize the S3Manager with the given bucket name.
 
         Args:
             bucket_name (str): Name of the S3 bucket to operate on.
+            max_workers (int): Number of files transferred concurrently.
+            multipart_chunksize (int): Size above which files are transferred in multipart, and size of each part.
+            s3_client (Optional[Any]): S3 client to use (e.g. a client pointing to a local S3 stand-in). A default boto3 client is created if None.
         """
         self.bucket_name = bucket_name
-        self.s3 = boto3.client('s3')
+        self.max_workers = max_workers
+        self.multipart_chunksize = multipart_chunksize
+        self.transfer_config = TransferConfig(multipart_threshold=multipart_chunksize, multipart_chunksize=multipart_chunksize)
+        self.s3 = s3_client if s3_client is not None else boto3.client('s3')
+        self._manifest_lock = threading.Lock()
 
     def create_bucket_if_not_exists(self) -> None:
         """
@@ -30,37 +83,185 @@ class S3Manager:
         else:
             print(f"Bucket '{self.bucket_name}' already exists. Reusing it.")
 
-    def upload_directory(self, local_directory_path: str, s3_prefix: str) -> None:
+    def list_objects(self, s3_prefix: str) -> Dict[str, Dict[str, Any]]:
         """
-        Upload the contents of a local directory to the specified S3 prefix.
+        List the objects stored under an S3 prefix.
+
+        Args:
+            s3_prefix (str): Prefix in the S3 bucket.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: ETag (without quotes) and size of each object, by S3 key.
+        """
+        objects = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for result in paginator.paginate(Bucket=self.bucket_name, Prefix=s3_prefix):
+            for file_obj in result.get("Contents", []):
+                if file_obj['Key'].endswith("/"):
+                    continue
+                objects[file_obj['Key']] = {"etag": file_obj['ETag'].strip('"'), "size": file_obj['Size']}
+        return objects
+
+    def _load_manifest(self, local_directory_path: str) -> Dict[str, Dict[str, Any]]:
+        manifest_path = os.path.join(local_directory_path, MANIFEST_FILE_NAME)
+        if not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except json.JSONDecodeError:
+            return {}
+
+    def _save_manifest(self, local_directory_path: str, manifest: Dict[str, Dict[str, Any]]) -> None:
+        # Written through a temporary file, so an interruption never leaves a corrupted manifest
+        manifest_path = os.path.join(local_directory_path, MANIFEST_FILE_NAME)
+        with self._manifest_lock:
+            with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as file:
+                json.dump(manifest, file, indent=2, sort_keys=True)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def _record(self, manifest: Dict[str, Dict[str, Any]], rel_path: str, local_file_path: str, etag: str) -> None:
+        stat = os.stat(local_file_path)
+        with self._manifest_lock:
+            manifest[rel_path] = {"etag": etag, "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def _local_etag(self, manifest: Dict[str, Dict[str, Any]], rel_path: str, local_file_path: str) -> str:
+        # Reuse the ETag recorded in the manifest if the file did not change since, to avoid re-hashing large weight files
+        stat = os.stat(local_file_path)
+        entry = manifest.get(rel_path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["etag"]
+        etag = compute_s3_etag(local_file_path, self.multipart_chunksize)
+        self._record(manifest, rel_path, local_file_path, etag)
+        return etag
+
+    def _run_transfers(self, transfers: list, local_directory_path: str, manifest: Dict[str, Dict[str, Any]]) -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(transfer): transfer for transfer in transfers}
+                for future in as_completed(futures):
+                    future.result()
+                    self._save_manifest(local_directory_path, manifest)
+        finally:
+            # Keep track of the completed transfers even if one of them failed (saved once the other transfers have finished)
+            self._save_manifest(local_directory_path, manifest)
+
+    def upload_directory(self, local_directory_path: str, s3_prefix: str) -> Dict[str, str]:
+        """
+        Upload the contents of a local directory to the specified S3 prefix, keeping the subdirectory structure.
+        Files already stored in S3 with the same ETag are skipped.
 
         Args:
             local_directory_path (str): Local directory path to upload.
             s3_prefix (str): Prefix in the S3 bucket under which files will be stored.
+
+        Returns:
+            Dict[str, str]: ETag of each uploaded (or already up to date) file, by relative path.
         """
+        manifest = self._load_manifest(local_directory_path)
+        remote_objects = self.list_objects(s3_prefix)
+        etags = {}
+        transfers = []
+
         for root, _, files in os.walk(local_directory_path):
             for file in files:
+                if file.startswith(MANIFEST_FILE_NAME):
+                    continue
                 local_file_path = os.path.join(root, file).replace("\\", "/")
-                s3_key = os.path.join(s3_prefix, file).replace("\\", "/")
-                self.s3.upload_file(local_file_path, self.bucket_name, s3_key)
-                print(f"Uploaded: {local_file_path} --> s3://{self.bucket_name}/{s3_key}")
-    
-    def download_directory(self, s3_prefix: str, local_directory_path: str) -> None:
+                rel_path = os.path.relpath(local_file_path, local_directory_path).replace("\\", "/")
+                s3_key = posixpath.join(s3_prefix, rel_path)
+                etag = self._local_etag(manifest, rel_path, local_file_path)
+                etags[rel_path] = etag
+
+                remote_object = remote_objects.get(s3_key)
+                if remote_object is not None and remote_object["etag"] == etag and remote_object["size"] == os.path.getsize(local_file_path):
+                    print(f"Skipped (unchanged): {local_file_path} --> s3://{self.bucket_name}/{s3_key}")
+                    continue
+
+                def upload(local_file_path=local_file_path, s3_key=s3_key):
+                    self.s3.upload_file(local_file_path, self.bucket_name, s3_key, Config=self.transfer_config)
+                    print(f"Uploaded: {local_file_path} --> s3://{self.bucket_name}/{s3_key}")
+                transfers.append(upload)
+
+        self._run_transfers(transfers, local_directory_path, manifest)
+        return etags
+
+    def download_directory(self, s3_prefix: str, local_directory_path: str, rel_paths: Optional[Iterable[str]] = None) -> Dict[str, str]:
         """
         Download all files from a given S3 prefix to a local directory.
+        Files already downloaded with the same ETag (according to the local manifest) are skipped.
 
         Args:
             s3_prefix (str): The prefix/folder in the S3 bucket to download from.
             local_directory_path (str): The local directory where files will be saved.
+            rel_paths (Optional[Iterable[str]]): Only download these files (relative paths, e.g. the files of a promotion manifest). All files if None.
+
+        Returns:
+            Dict[str, str]: ETag of each downloaded (or already up to date) file, by relative path.
         """
         os.makedirs(local_directory_path, exist_ok=True)
-        paginator = self.s3.get_paginator('list_objects_v2')
+        manifest = self._load_manifest(local_directory_path)
+        rel_paths = set(rel_paths) if rel_paths is not None else None
+        etags = {}
+        transfers = []
 
-        for result in paginator.paginate(Bucket=self.bucket_name, Prefix=s3_prefix):
-            for file_obj in result.get("Contents", []):
-                s3_key = file_obj['Key']
-                rel_path = os.path.relpath(s3_key, s3_prefix)
-                local_file_path = os.path.join(local_directory_path, rel_path)
+        for s3_key, remote_object in self.list_objects(s3_prefix).items():
+            rel_path = os.path.relpath(s3_key, s3_prefix).replace("\\", "/")
+            if rel_path == PROMOTION_MANIFEST_FILE_NAME or (rel_paths is not None and rel_path not in rel_paths):
+                continue
+            local_file_path = os.path.join(local_directory_path, rel_path)
+            etags[rel_path] = remote_object["etag"]
+
+            if os.path.exists(local_file_path) and os.path.getsize(local_file_path) == remote_object["size"] \
+                    and self._local_etag(manifest, rel_path, local_file_path) == remote_object["etag"]:
+                print(f"Skipped (unchanged): s3://{self.bucket_name}/{s3_key} --> {local_file_path}")
+                continue
+
+            def download(s3_key=s3_key, rel_path=rel_path, local_file_path=local_file_path, etag=remote_object["etag"]):
+                # Download to a temporary file first, so an interrupted download is never taken for a complete file
                 os.makedirs(os.path.dirname(local_file_path), exist_ok=True)
-                self.s3.download_file(self.bucket_name, s3_key, local_file_path)
-                print(f"Downloaded: s3://{self.bucket_name}/{s3_key} --> {local_file_path}")
\ No newline at end of file
+                self.s3.download_file(self.bucket_name, s3_key, f"{local_file_path}.part", Config=self.transfer_config)
+                os.replace(f"{local_file_path}.part", local_file_path)
+                self._record(manifest, rel_path, local_file_path, etag)
+                print(f"Downloaded: s3://{self.bucket_name}/{s3_key} --> {local_file_path}")
+            transfers.append(download)
+
+        self._run_transfers(transfers, local_directory_path, manifest)
+        return etags
+
+    def write_promotion_manifest(self, s3_prefix: str, etags: Dict[str, str], metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Write the promotion manifest of the model uploaded to an S3 prefix (to call once all its files are uploaded).
+
+        Args:
+            s3_prefix (str): Prefix in the S3 bucket where the model was uploaded.
+            etags (Dict[str, str]): ETag of each file of the model, by relative path (as returned by upload_directory).
+            metadata (Optional[Dict[str, Any]]): Additional information saved in the manifest (e.g. the test metrics).
+
+        Returns:
+            str: Version of the promoted model.
+        """
+        model_version = compute_model_version(etags)
+        manifest = {"model_version": model_version,
+                    "promoted_at": datetime.now(timezone.utc).isoformat(),
+                    "files": etags,
+                    **(metadata or {})}
+        s3_key = posixpath.join(s3_prefix, PROMOTION_MANIFEST_FILE_NAME)
+        self.s3.put_object(Bucket=self.bucket_name, Key=s3_key, Body=json.dumps(manifest, indent=2).encode("utf-8"), ContentType="application/json")
+        print(f"Promotion manifest of model version {model_version} written to s3://{self.bucket_name}/{s3_key}")
+        return model_version
+
+    def read_promotion_manifest(self, s3_prefix: str) -> Optional[Dict[str, Any]]:
+        """
+        Read the promotion manifest of the model stored under an S3 prefix.
+
+        Returns:
+            Optional[Dict[str, Any]]: The manifest, or None if no model was promoted with a manifest to this prefix.
+        """
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=posixpath.join(s3_prefix, PROMOTION_MANIFEST_FILE_NAME))
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
@@ -1,16 +1,30 @@
 from src.config_loaders.preprocessing_config_loader import PreprocessingConfig
 from src.config_loaders.training_config_loader import TrainingConfig
 from src.config_loaders.testing_config_loader import TestingConfig
+from src.config_loaders.benchmark_config_loader import BenchmarkConfig
+from src.config_loaders.scoring_config_loader import ScoringConfig
+from src.config_loaders.sweep_config_loader import SweepConfig
+from src.utils.instrumentation import StageProfiler
 from abc import ABC, abstractmethod
 from typing import Union
 
 class BasePipeline(ABC):
     """Abstract base class for main pipelines"""
     
-    def __init__(self, config: Union[PreprocessingConfig, TrainingConfig, TestingConfig]):
+    def __init__(self, config: Union[PreprocessingConfig, TrainingConfig, TestingConfig, BenchmarkConfig, ScoringConfig, SweepConfig]):
         self.config = config
+        self.profiler = StageProfiler(pipeline_name=type(self).__name__, config=getattr(config, "instrumentation", None))
     
-    @abstractmethod
     def run(self) -> None:
-        """run the pipeline."""
-        pass
\ No newline at end of file
+        """run the pipeline, recording the time and memory of each of its stages."""
+        status = "failed"
+        try:
+            self._run()
+            status = "succeeded"
+        finally:
+            self.profiler.finish(status=status)
+
+    @abstractmethod
+    def _run(self) -> None:
+        """run the stages of the pipeline (see StageProfiler.start_stage)."""
+        pass
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import platform
+import urllib.request
+from datetime import datetime, timezone
+import numpy as np
+import torch
+from colorama import Fore, Style
+from transformers import AutoConfig, DataCollatorWithPadding
+from src.config_loaders.benchmark_config_loader import BenchmarkConfig
+from src.base_pipeline import BasePipeline
+from src.modeling.batch_predictor import BatchPredictor
+from src.modeling.model import ModelBuilder
+from src.utils.synthetic_reviews import generate_synthetic_reviews
+from typing import Callable, Dict, List
+
+class BenchmarkPipeline(BasePipeline):
+    def __init__(self, config: BenchmarkConfig):
+        super().__init__(config)
+        self.metrics: Dict[str, Dict] = {}
+
+    def _record(self, name: str, value: float, unit: str, higher_is_better: bool) -> None:
+        self.metrics[name] = {"value": round(float(value), 4), "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{Fore.CYAN}{name}: {value:.2f} {unit}{Style.RESET_ALL}")
+
+    def _time(self, fn: Callable[[], None], n_runs: int) -> List[float]:
+        # Untimed warmup runs first (allocations, lazy initializations, caches)
+        for _ in range(self.config.n_warmup):
+            fn()
+        durations = []
+        for _ in range(n_runs):
+            start_time = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start_time)
+        return durations
+
+    def _bench_tokenizer(self, predictor: BatchPredictor, reviews: Dict[int, List[str]]) -> None:
+        print(f"{Fore.YELLOW}Benchmarking tokenizer throughput...{Style.RESET_ALL}")
+        for n_words, texts in reviews.items():
+            encodings = predictor.tokenizer(texts, truncation=True, max_length=self.config.max_input_length)
+            n_tokens = sum(len(input_ids) for input_ids in encodings["input_ids"])
+            duration = np.median(self._time(lambda: predictor.tokenizer(texts, truncation=True, max_length=self.config.max_input_length), n_runs=5))
+            self._record(f"tokenizer.reviews_per_s.words_{n_words}", len(texts) / duration, "reviews/s", higher_is_better=True)
+            self._record(f"tokenizer.tokens_per_s.words_{n_words}", n_tokens / duration, "tokens/s", higher_is_better=True)
+
+    def _bench_training_step(self, reviews: Dict[int, List[str]], sentiments: Dict[int, List[str]]) -> None:
+        print(f"{Fore.YELLOW}Benchmarking training step time...{Style.RESET_ALL}")
+        model_config = AutoConfig.from_pretrained(self.config.model_path)
+        model_builder = ModelBuilder(model_name=self.config.model_path,
+                                     num_labels=model_config.num_labels,
+                                     id2label=model_config.id2label,
+                                     label2id=model_config.label2id,
+                                     tokenizer_pretrained_model=self.config.model_path,
+                                     learning_rate=self.config.learning_rate,
+                                     freeze_backbone=self.config.freeze_backbone)
+        model, tokenizer = model_builder.initialize()
+        model.train()
+        optimizer = torch.optim.AdamW([param for param in model.parameters() if param.requires_grad], lr=self.config.learning_rate)
+        collator = DataCollatorWithPadding(tokenizer=tokenizer)
+
+        for n_words, texts in reviews.items():
+            texts = texts[:self.config.training_batch_size]
+            labels = [model_config.label2id[sentiment] for sentiment in sentiments[n_words][:self.config.training_batch_size]]
+            encodings = tokenizer(texts, truncation=True, max_length=self.config.max_input_length)
+            batch = collator([{"input_ids": input_ids, "attention_mask": attention_mask, "labels": label}
+                              for input_ids, attention_mask, label in zip(encodings["input_ids"], encodings["attention_mask"], labels)])
+
+            def training_step() -> None:
+                loss = model(**batch).loss
+                loss.backward()
+                optimizer.step()
+                optimizer.zero_grad()
+
+            durations = self._time(training_step, n_runs=self.config.n_training_steps)
+            self._record(f"training.step_ms.words_{n_words}", np.median(durations) * 1000, "ms", higher_is_better=False)
+
+    def _bench_batch_inference(self, predictor: BatchPredictor, texts: List[str]) -> None:
+        print(f"{Fore.YELLOW}Benchmarking batch inference throughput on {len(texts)} reviews of mixed lengths...{Style.RESET_ALL}")
+        for batch_size in self.config.batch_sizes:
+            predictor.batch_size = batch_size
+            duration = np.median(self._time(lambda: predictor.predict(texts), n_runs=3))
+            self._record(f"inference.reviews_per_s.batch_{batch_size}", len(texts) / duration, "reviews/s", higher_is_better=True)
+
+    def _record_latencies(self, prefix: str, durations: List[float]) -> None:
+        for percentile in [50, 95, 99]:
+            self._record(f"{prefix}.p{percentile}_ms", np.percentile(durations, percentile) * 1000, "ms", higher_is_better=False)
+
+    def _bench_single_request(self, predictor: BatchPredictor, texts: List[str]) -> None:
+        print(f"{Fore.YELLOW}Benchmarking single-request latency ({self.config.n_latency_requests} requests)...{Style.RESET_ALL}")
+        requests = [texts[idx % len(texts)] for idx in range(self.config.n_latency_requests)]
+        durations = []
+        for text in requests[:self.config.n_warmup]:
+            predictor.predict([text])
+        for text in requests:
+            start_time = time.perf_counter()
+            predictor.predict([text])
+            durations.append(time.perf_counter() - start_time)
+        self._record_latencies("latency.predictor", durations)
+
+        if self.config.service_url:
+            print(f"{Fore.YELLOW}Benchmarking end-to-end latency of the inference service at {self.config.service_url}...{Style.RESET_ALL}")
+            durations = []
+            # Each request is made unique so that the prediction cache of the service is not measured instead of the model
+            for idx, text in enumerate(requests):
+                request = urllib.request.Request(f"{self.config.service_url}/predict",
+                                                 data=json.dumps({"text": f"{text} #{idx}"}).encode("utf-8"),
+                                                 headers={"Content-Type": "application/json"})
+                start_time = time.perf_counter()
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+                durations.append(time.perf_counter() - start_time)
+            self._record_latencies("latency.service", durations)
+
+    def _metadata(self) -> Dict:
+        return {"timestamp": datetime.now(timezone.utc).isoformat(),
+                "model_path": self.config.model_path,
+                "backend": self.config.backend,
+                "torch_version": torch.__version__,
+                "torch_num_threads": torch.get_num_threads(),
+                "platform": platform.platform(),
+                "processor": platform.processor(),
+                "cpu_count": os.cpu_count()}
+
+    def _compare_to_baseline(self) -> List[Dict]:
+        with open(self.config.baseline_file, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["metrics"]
+
+        comparison = []
+        for name, metric in self.metrics.items():
+            if name not in baseline or baseline[name]["value"] == 0:
+                continue
+            change = (metric["value"] - baseline[name]["value"]) / baseline[name]["value"]
+            # A regression is a degradation beyond the tolerance: lower throughput or higher time
+            degradation = -change if metric["higher_is_better"] else change
+            regression = degradation > self.config.regression_tolerance
+            comparison.append({"metric": name,
+                               "baseline": baseline[name]["value"],
+                               "current": metric["value"],
+                               "relative_change": round(change, 4),
+                               "regression": regression})
+            color = Fore.RED if regression else Fore.GREEN if degradation < -self.config.regression_tolerance else Fore.CYAN
+            print(f"{color}{name}: {baseline[name]['value']} -> {metric['value']} {metric['unit']} ({change:+.1%}){' REGRESSION' if regression else ''}{Style.RESET_ALL}")
+        return comparison
+
+    def _run(self):
+
+        print(f"{Fore.GREEN}Starting benchmark pipeline...{Style.RESET_ALL}")
+
+        # Generate the synthetic reviews
+        self.profiler.start_stage("generate")
+        print(f"{Fore.YELLOW}Generating {self.config.n_reviews} synthetic reviews for each length {self.config.review_lengths} (words)...{Style.RESET_ALL}")
+        reviews, sentiments = {}, {}
+        for n_words in self.config.review_lengths:
+            reviews[n_words], sentiments[n_words] = generate_synthetic_reviews(n_reviews=self.config.n_reviews, n_words=n_words, seed=self.config.seed)
+        mixed_texts = [text for idx in range(self.config.n_reviews) for text in (reviews[n_words][idx] for n_words in self.config.review_lengths)]
+
+        # Load the model
+        self.profiler.start_stage("load_model")
+        print(f"{Fore.YELLOW}Loading trained model from {self.config.model_path} ({self.config.backend} backend)...{Style.RESET_ALL}")
+        start_time = time.perf_counter()
+        predictor = BatchPredictor(model_path=self.config.model_path, max_length=self.config.max_input_length, backend=self.config.backend)
+        self._record("model.load_s", time.perf_counter() - start_time, "s", higher_is_better=False)
+
+        # Run the benchmarks
+        self.profiler.start_stage("tokenizer")
+        self._bench_tokenizer(predictor=predictor, reviews=reviews)
+        self.profiler.start_stage("training_step")
+        self._bench_training_step(reviews=reviews, sentiments=sentiments)
+        self.profiler.start_stage("batch_inference")
+        self._bench_batch_inference(predictor=predictor, texts=mixed_texts)
+        self.profiler.start_stage("single_request")
+        self._bench_single_request(predictor=predictor, texts=mixed_texts)
+        self.profiler.end_stage()
+        results = {"metadata": self._metadata(), "metrics": self.metrics}
+
+        # Compare to the baseline
+        regressions = []
+        if self.config.baseline_file and os.path.exists(self.config.baseline_file):
+            print(f"{Fore.YELLOW}Comparing results to the baseline {self.config.baseline_file} (tolerance: {self.config.regression_tolerance:.0%})...{Style.RESET_ALL}")
+            results["comparison"] = self._compare_to_baseline()
+            regressions = [entry["metric"] for entry in results["comparison"] if entry["regression"]]
+            if regressions:
+                print(f"{Fore.RED}{len(regressions)} regression(s) flagged: {regressions}{Style.RESET_ALL}")
+            else:
+                print(f"{Fore.GREEN}No regression flagged.{Style.RESET_ALL}")
+        elif self.config.baseline_file:
+            print(f"{Fore.RED}Baseline {self.config.baseline_file} not found. Skipping the comparison...{Style.RESET_ALL}")
+
+        # Save the results (and the new baseline if requested)
+        os.makedirs(os.path.dirname(self.config.output_file) or ".", exist_ok=True)
+        with open(self.config.output_file, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(Fore.MAGENTA + f"Benchmark results saved at {self.config.output_file}." + Style.RESET_ALL)
+        if self.config.update_baseline and self.config.baseline_file:
+            os.makedirs(os.path.dirname(self.config.baseline_file) or ".", exist_ok=True)
+            with open(self.config.baseline_file, "w", encoding="utf-8") as file:
+                json.dump({"metadata": results["metadata"], "metrics": self.metrics}, file, indent=2)
+            print(Fore.MAGENTA + f"Baseline updated at {self.config.baseline_file}." + Style.RESET_ALL)
+
+        # Raised rather than asserted: the gate must also fail the CI job under python -O
+        if self.config.fail_on_regression and regressions:
+            raise RuntimeError(f"Benchmark regressions beyond {self.config.regression_tolerance:.0%}: {regressions}")
+
+        print(f"{Fore.GREEN}Benchmark pipeline completed successfully!{Style.RESET_ALL}")
@@ -0,0 +1,34 @@
+import json
+from pydantic import BaseModel, Field
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from typing import List, Literal, Optional
+
+class BenchmarkConfig(BaseModel):
+    model_path: str = Field(..., description="Path to load the trained model to benchmark")
+    backend: Literal["pytorch", "onnx", "torchscript"] = Field(default="pytorch", description="Inference backend used for the inference benchmarks")
+    max_input_length: int = Field(default=512, description="Maximum token length of a review (longer reviews are truncated)")
+    review_lengths: List[int] = Field(default=[32, 128, 512], description="Lengths (in words) of the synthetic reviews")
+    n_reviews: int = Field(default=256, description="Number of synthetic reviews generated for each review length")
+    batch_sizes: List[int] = Field(default=[1, 8, 32, 64], description="Batch sizes of the batch inference throughput benchmark")
+    training_batch_size: int = Field(default=16, description="Batch size of the training step benchmark")
+    n_training_steps: int = Field(default=10, description="Number of timed training steps for each review length")
+    learning_rate: float = Field(default=2e-5, description="Learning rate of the optimizer used by the training step benchmark")
+    freeze_backbone: bool = Field(default=True, description="Whether to freeze the backbone as in training (see ModelBuilder)")
+    n_latency_requests: int = Field(default=200, description="Number of timed single-review requests of the latency benchmark")
+    n_warmup: int = Field(default=3, description="Number of untimed runs before each benchmark")
+    service_url: Optional[str] = Field(None, description="URL of a running inference service, whose end-to-end /predict latency is also measured (skipped if not specified)")
+    seed: int = Field(default=42, description="Seed of the synthetic reviews generator")
+    output_file: str = Field(..., description="Path to save the benchmark results (JSON)")
+    baseline_file: Optional[str] = Field(None, description="Path of the baseline results the current results are compared to")
+    regression_tolerance: float = Field(default=0.1, description="Relative degradation from the baseline above which a metric is flagged as a regression (0.1 = 10%)")
+    update_baseline: bool = Field(default=False, description="Whether to save the current results as the new baseline")
+    fail_on_regression: bool = Field(default=False, description="Whether to fail the run when a regression is flagged")
+    instrumentation: Optional[InstrumentationConfig] = Field(None, description="Optional per-stage time and memory instrumentation config")
+
+def benchmark_config_loader(config_path: str) -> BenchmarkConfig:
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            config = json.load(file)
+        return BenchmarkConfig(**config)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Could not find benchmark config file: {config_path}")
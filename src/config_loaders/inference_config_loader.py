@@ -1,10 +1,45 @@
 import json
 from pydantic import BaseModel, Field
+from src.config_loaders.sliding_window_config import SlidingWindowConfig
+from typing import Literal, Optional
+
+class ServerConfig(BaseModel):
+    host: str = Field(default="127.0.0.1", description="Host the inference service listens on")
+    port: int = Field(default=8000, description="Port the inference service listens on")
+    max_batch_size: int = Field(default=32, description="Maximum number of reviews per micro-batch")
+    max_wait_ms: float = Field(default=10.0, description="Maximum time to wait for more requests before running a micro-batch (in milliseconds)")
+    max_batch_tokens: Optional[int] = Field(default=8192, description="Maximum padded size of a micro-batch in estimated tokens (number of reviews x longest review), batches are only limited by max_batch_size if not specified")
+    latency_slo_ms: Optional[float] = Field(default=500.0, description="Target queueing latency of a review (in milliseconds): reviews waiting for half of it go before shorter ones, and reviews expected to wait longer are rejected")
+    max_queue_size: Optional[int] = Field(default=1024, description="Maximum number of reviews waiting for a micro-batch, further reviews are rejected with 429 (unbounded if not specified)")
+
+    @property
+    def url(self) -> str:
+        # A service listening on all interfaces is reached locally
+        host = "127.0.0.1" if self.host == "0.0.0.0" else self.host
+        return f"http://{host}:{self.port}"
+
+class PredictionCacheConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to cache predictions by normalized review text and model version")
+    max_size: int = Field(default=10000, description="Maximum number of predictions kept in memory (least recently used are evicted)")
+    ttl_seconds: Optional[float] = Field(None, description="Time to live of a cached prediction in seconds (no expiration if not specified)")
+    disk_path: Optional[str] = Field(None, description="Path of an on-disk cache (SQLite) shared by several processes (memory only if not specified)")
+    disk_max_size: Optional[int] = Field(default=1000000, description="Maximum number of predictions kept in the on-disk cache, the oldest are deleted (unbounded if not specified)")
+
+class HotSwapConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to poll S3 for a newly promoted model and swap it in without restarting the service")
+    poll_interval_s: float = Field(default=60.0, description="Time between two checks of the S3 prefix for a new model version (in seconds)")
+    keep_versions: int = Field(default=3, description="Number of model versions kept on disk (the previous version is also kept in memory for an instant rollback)")
 
 class InferenceConfig(BaseModel):
     bucket_name: str = Field(..., description="Name of the S3 bucket containing the model")
     local_model_dir: str = Field(..., description="Local path where the model will be downloaded")
     s3_model_prefix: str = Field(..., description="S3 prefix (folder path) where model files are located")
+    max_input_length: int = Field(default=512, description="Maximum token length of a review during prediction (longer reviews are truncated)")
+    backend: Literal["pytorch", "onnx", "torchscript"] = Field(default="pytorch", description="Inference backend: eager PyTorch model or graph exported after training (onnx, torchscript)")
+    sliding_window: SlidingWindowConfig = Field(default_factory=SlidingWindowConfig, description="Sliding-window inference of the reviews longer than max_input_length")
+    server: ServerConfig = Field(default_factory=ServerConfig, description="Inference service configuration")
+    cache: PredictionCacheConfig = Field(default_factory=PredictionCacheConfig, description="Prediction cache configuration")
+    hot_swap: HotSwapConfig = Field(default_factory=HotSwapConfig, description="Model hot-swap configuration")
 
 def inference_config_loader(config_path: str) -> InferenceConfig:
     try:
@@ -12,4 +47,4 @@ def inference_config_loader(config_path: str) -> InferenceConfig:
             config = json.load(file)
         return InferenceConfig(**config)
     except FileNotFoundError:
-        raise FileNotFoundError(f"Could not find inference config file: {config_path}")
\ No newline at end of file
+        raise FileNotFoundError(f"Could not find inference config file: {config_path}")
@@ -0,0 +1,9 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+class InstrumentationConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to record the wall time, CPU time and peak memory of each stage of the pipeline")
+    report_dir: str = Field(default="data/output/run_reports", description="Directory where the JSON report of each run is saved")
+    torch_profiler: bool = Field(default=False, description="Whether to record a torch profiler trace of the stages (Chrome trace format)")
+    torch_profiler_stages: List[str] = Field(default_factory=list, description="Stages traced by the torch profiler (all stages if empty)")
+    trace_dir: str = Field(default="data/output/traces", description="Directory where the torch profiler traces are saved")
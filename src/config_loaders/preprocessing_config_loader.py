@@ -1,5 +1,7 @@
 import json
 from pydantic import BaseModel, Field
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from typing import Optional
 
 class PreprocessingConfig(BaseModel):
     url_data: str = Field(..., description="URL of the input data")
@@ -9,6 +11,9 @@ class PreprocessingConfig(BaseModel):
     training_data_path: str = Field(..., description="Path to save the training data file")
     validation_data_path: str = Field(..., description="Path to save the validation data file")
     test_data_path: str = Field(..., description="Path to save the test data file")
+    streaming: bool = Field(default=False, description="Whether to process the data by chunks, each review being assigned to a split by a stable hash (memory stays flat whatever the input size)")
+    chunk_size: int = Field(default=10000, description="Number of rows read at once in streaming mode")
+    instrumentation: Optional[InstrumentationConfig] = Field(None, description="Optional per-stage time and memory instrumentation config")
 
 def preprocessing_config_loader(config_path: str) -> PreprocessingConfig:
     try:
@@ -0,0 +1,27 @@
+import json
+from pydantic import BaseModel, Field
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from src.config_loaders.sliding_window_config import SlidingWindowConfig
+from typing import Literal, Optional
+
+class ScoringConfig(BaseModel):
+    input_data_path: str = Field(..., description="Path of the unlabeled reviews to score (CSV, Parquet or Arrow file with a review column)")
+    output_data_path: str = Field(..., description="Path to save the input rows with their predicted sentiment and score (CSV, Parquet or Arrow file)")
+    model_path: str = Field(..., description="Path to load the trained model")
+    backend: Literal["pytorch", "onnx", "torchscript"] = Field(default="pytorch", description="Inference backend: eager PyTorch model or graph exported after training (onnx, torchscript)")
+    max_input_length: int = Field(default=512, description="Maximum token length of a review during prediction (longer reviews are truncated)")
+    sliding_window: SlidingWindowConfig = Field(default_factory=SlidingWindowConfig, description="Sliding-window inference of the reviews longer than max_input_length")
+    batch_size: int = Field(default=32, description="Maximum number of reviews per forward pass")
+    chunk_size: int = Field(default=10000, description="Number of rows of a shard, the unit of work of a worker and of the checkpointing")
+    n_workers: Optional[int] = Field(None, description="Number of worker processes, each with its own copy of the model (number of cores / threads_per_worker if not specified)")
+    threads_per_worker: int = Field(default=1, description="Number of torch threads of each worker process")
+    resume: bool = Field(default=True, description="Whether to resume an interrupted job from its completed shards (restart from scratch otherwise)")
+    instrumentation: Optional[InstrumentationConfig] = Field(None, description="Optional per-stage time and memory instrumentation config")
+
+def scoring_config_loader(config_path: str) -> ScoringConfig:
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            config = json.load(file)
+        return ScoringConfig(**config)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Could not find scoring config file: {config_path}")
@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import Literal
+
+class SlidingWindowConfig(BaseModel):
+    enabled: bool = Field(default=False, description="Whether to split reviews longer than max_input_length into overlapping token windows instead of truncating them")
+    window_overlap: int = Field(default=128, description="Number of tokens shared by two consecutive windows of a review")
+    aggregation: Literal["mean", "confidence"] = Field(default="mean", description="Aggregation of the window logits of a review: mean, or mean weighted by the confidence (max probability) of each window")
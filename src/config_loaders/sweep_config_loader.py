@@ -0,0 +1,31 @@
+import json
+from pydantic import BaseModel, Field
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from typing import Any, Dict, List, Literal, Optional
+
+class TrialPruningConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to stop the trials whose validation accuracy is below the median of the other trials at the same epoch")
+    grace_epochs: int = Field(default=1, ge=1, description="Number of epochs a trial always runs before it can be pruned")
+    min_trials: int = Field(default=3, ge=1, description="Minimum number of other trials evaluated at the same epoch to compute the median")
+
+class SweepConfig(BaseModel):
+    training_config_path: str = Field(..., description="Path of the training config whose data, tokenizer cache and model parameters are the base of every trial")
+    search_space: Dict[str, List[Any]] = Field(..., description="Values tried for each model parameter (fields of the model section of the training config)")
+    search: Literal["grid", "random"] = Field(default="grid", description="Grid search over all the combinations, or random search over n_trials of them")
+    n_trials: Optional[int] = Field(None, ge=1, description="Number of combinations sampled by the random search (all combinations if not specified)")
+    seed: int = Field(default=42, description="Seed of the random search and of the training of the trials")
+    n_epochs: Optional[int] = Field(None, ge=1, description="Maximum number of epochs of a trial (n_epochs of the training config if not specified)")
+    n_workers: Optional[int] = Field(None, ge=1, description="Number of trials trained concurrently (number of cores / threads_per_worker if not specified)")
+    threads_per_worker: int = Field(default=1, ge=1, description="Number of torch threads of each trial")
+    trial_pruning: TrialPruningConfig = Field(default_factory=TrialPruningConfig, description="Early pruning of the hopeless trials")
+    sweep_dir: str = Field(..., description="Directory of the training files and the progress of the trials")
+    leaderboard_output_file: str = Field(..., description="Path to save the trials ranked by best validation accuracy (CSV)")
+    instrumentation: Optional[InstrumentationConfig] = Field(None, description="Optional per-stage time and memory instrumentation config")
+
+def sweep_config_loader(config_path: str) -> SweepConfig:
+    try:
+        with open(config_path, "r", encoding="utf-8") as file:
+            config = json.load(file)
+        return SweepConfig(**config)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Could not find sweep config file: {config_path}")
@@ -1,6 +1,8 @@
 import json
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from src.config_loaders.sliding_window_config import SlidingWindowConfig
+from typing import List, Optional, Literal
 
 class PushCondition(BaseModel):
     metric: str = Field(..., description="Metric name to evaluate (e.g. accuracy, precision)")
@@ -12,13 +14,33 @@ class PushModelS3Config(BaseModel):
     bucket_name: str = Field(..., description="S3 bucket name")
     prefix: str = Field(..., description="Prefix path in the S3 bucket")
 
+class QuantizationConfig(BaseModel):
+    enabled: bool = Field(..., description="Whether to produce and evaluate an int8 version of the trained model")
+    output_path: str = Field(..., description="Path to save the int8 model")
+    metrics_output_file: str = Field(..., description="Path to save the performance metrics of the int8 model")
+    report_output_file: str = Field(..., description="Path to save the backend, size and latency of the fp32 and int8 models")
+    s3_prefix: str = Field(..., description="Prefix path in the S3 bucket where the int8 model is pushed")
+    parity_tolerance: float = Field(default=1e-3, description="Maximum absolute logit difference allowed between the int8 TorchScript graph and the eager int8 model (the int8 model is not pushed otherwise)")
+
+class MetricsConfig(BaseModel):
+    positive_label: Optional[str] = Field(default="positive", description="Label whose precision, recall and F1 score are reported (macro average over the labels if not specified)")
+    threshold_sweep: bool = Field(default=True, description="Whether to save the precision, recall and F1 score of positive_label over a sweep of decision thresholds")
+    n_thresholds: int = Field(default=99, ge=1, description="Number of decision thresholds of the sweep, evenly spaced in ]0, 1[")
 
 class TestingConfig(BaseModel):
     test_data_path: str = Field(..., description="Path to load the test data file")
     trained_model_path: str = Field(..., description="Path to load the trained model")
     batch_size: int = Field(default=32, description="Batch size required for Dataloader")
+    max_batch_tokens: Optional[int] = Field(None, description="Maximum number of padded tokens per batch (number of reviews x longest review), batches are only limited by batch_size if not specified")
+    max_input_length: int = Field(default=512, description="Maximum token length of a review during prediction (longer reviews are truncated)")
+    backend: Literal["pytorch", "onnx", "torchscript"] = Field(default="pytorch", description="Inference backend: eager PyTorch model or graph exported after training (onnx, torchscript)")
+    sliding_window: SlidingWindowConfig = Field(default_factory=SlidingWindowConfig, description="Sliding-window inference of the reviews longer than max_input_length")
+    prediction_chunk_size: int = Field(default=4096, ge=1, description="Number of reviews predicted at once: the metrics are accumulated chunk by chunk")
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig, description="Classification metrics config")
     metrics_output_file: str = Field(..., description="Path to save the performance metrics")
     push_model_s3: Optional[PushModelS3Config] = Field(None, description="Optional S3 push config")
+    quantization: Optional[QuantizationConfig] = Field(None, description="Optional int8 dynamic quantization config")
+    instrumentation: Optional[InstrumentationConfig] = Field(None, description="Optional per-stage time and memory instrumentation config")
 
 def testing_config_loader(config_path: str) -> TestingConfig:
     try:
@@ -1,6 +1,7 @@
 import json
 from pydantic import BaseModel, Field
-from typing import Optional
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from typing import Optional, Literal
 
 class ModelConfig(BaseModel):
     tokenizer_pretrained_model: str = Field(default="t5-base", description="Pretrained model name for the tokenizer")
@@ -11,15 +12,78 @@ class ModelConfig(BaseModel):
     dropout_rate: Optional[float] = Field(None, ge=0.0, le=1.0, description="Dropout rate to prevent overfitting")
     freeze_backbone: bool = Field(default=True, description="Freeze the backbone of the model during training (recommanded to accelerate the training)")
 
+class ExportConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to export the best model to an optimized inference graph after training")
+    format: Literal["onnx", "torchscript"] = Field(default="onnx", description="Export format (ONNX falls back to TorchScript if the export fails)")
+    parity_n_samples: int = Field(default=256, description="Number of validation reviews used to check the exported graph against the eager model")
+    parity_tolerance: float = Field(default=1e-3, description="Maximum absolute logit difference allowed between the exported graph and the eager model")
+
+class EarlyStoppingConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to stop the training when the validation accuracy stops improving")
+    patience: int = Field(default=3, ge=1, description="Number of evaluations without improvement of the validation accuracy before stopping")
+    min_delta: float = Field(default=0.0, ge=0.0, description="Minimum increase of the validation accuracy counted as an improvement")
+    max_steps: Optional[int] = Field(None, ge=1, description="Step budget: the training stops after this number of optimizer steps (no budget if not specified)")
+    max_train_minutes: Optional[float] = Field(None, gt=0.0, description="Wall-clock budget of a run in minutes (no budget if not specified)")
+    keep_best_checkpoints: Optional[int] = Field(2, ge=1, description="Number of best checkpoints kept in train_dir, plus the latest one (all checkpoints kept if not specified)")
+
+class ComputeConfig(BaseModel):
+    bf16: bool = Field(default=False, description="Whether to train under bf16 autocast on CPU (the weights and the optimizer states stay in fp32)")
+    gradient_accumulation_steps: int = Field(default=1, ge=1, description="Number of batches whose gradients are accumulated before each optimizer step (effective batch size: model.batch_size x gradient_accumulation_steps)")
+    num_threads: Optional[int] = Field(None, ge=1, description="Number of torch intra-op threads (chosen by the calibration, or all the cores, if not specified)")
+    num_interop_threads: Optional[int] = Field(None, ge=1, description="Number of torch inter-op threads (torch default if not specified)")
+    dataloader_num_workers: Optional[int] = Field(None, ge=0, description="Number of dataloader worker processes (chosen by the calibration, or none, if not specified)")
+    calibrate: bool = Field(default=False, description="Whether to time a few training steps with candidate thread and worker counts before training and keep the fastest (only for the values not specified)")
+    calibration_steps: int = Field(default=5, ge=1, description="Number of timed training steps per candidate configuration")
+
+class IncrementalConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to fine-tune the last promoted model on the rows added since the last run instead of training from model_name on all rows")
+    base_model_path: str = Field(..., description="Local path of the last promoted model, the starting point of the incremental run (full training if it does not exist)")
+    bucket_name: Optional[str] = Field(None, description="S3 bucket of the promoted model, downloaded to base_model_path before training (local model used if not specified)")
+    s3_prefix: Optional[str] = Field(None, description="Prefix path of the promoted model in the S3 bucket")
+    manifest_path: str = Field(..., description="Path of the manifest of the content hashes of the rows each trained model was trained on (keyed by the content hash of the model)")
+    replay_ratio: float = Field(default=1.0, ge=0.0, description="Number of already trained rows sampled and replayed per new row, against forgetting")
+    n_epochs: Optional[int] = Field(None, description="Number of epochs of an incremental run (n_epochs if not specified)")
+    seed: int = Field(default=42, description="Seed of the replay sample")
+
+class DistillationConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to train a smaller student model on the soft labels of a fine-tuned teacher instead of fine-tuning model_name")
+    teacher_model_path: str = Field(..., description="Path of the fine-tuned teacher model (it must use the same tokenizer as the student)")
+    student_num_layers: int = Field(default=2, description="Number of encoder layers of the student, copied from the teacher (evenly spaced)")
+    student_model_name: Optional[str] = Field(None, description="Pretrained model used as student instead of a copy of the teacher with fewer layers")
+    temperature: float = Field(default=2.0, gt=0.0, description="Softmax temperature of the teacher and student logits in the soft label loss")
+    alpha: float = Field(default=0.5, ge=0.0, le=1.0, description="Weight of the soft label loss (the hard label loss is weighted by 1 - alpha)")
+    teacher_logits_cache_dir: Optional[str] = Field(None, description="Directory to cache the teacher logits of the training data (recomputed at each run if not specified)")
+
+class PruningConfig(BaseModel):
+    enabled: bool = Field(default=True, description="Whether to prune the attention heads and the intermediate neurons of the best model after training")
+    target_sparsity: float = Field(default=0.5, ge=0.0, lt=1.0, description="Fraction of the heads and of the intermediate neurons removed at the last pruning step")
+    n_steps: int = Field(default=4, ge=1, description="Number of pruning steps to reach target_sparsity (importance scores are recomputed at each step)")
+    latency_budget_ms: Optional[float] = Field(None, description="Stop pruning at the first step whose latency (ms per review) is within this budget (prune up to target_sparsity if not specified)")
+    n_validation_samples: int = Field(default=512, description="Number of validation reviews used to score the importance and to measure the accuracy and latency of each step")
+    fine_tune_epochs: float = Field(default=0.0, description="Number of epochs of fine-tuning of the pruned model on the training data (no fine-tuning if 0)")
+    output_path: str = Field(default="trained_models/best_model_pruned", description="Path to save the pruned model (the unpruned best model is kept at best_model_path as a baseline)")
+    replace_best_model: bool = Field(default=False, description="Whether to also save the pruned model over best_model_path, so that it is exported, tested and promoted instead of the unpruned model")
+    report_output_file: str = Field(..., description="Path to save the accuracy, latency and size of the model at each pruning step (CSV)")
+
 class TrainingConfig(BaseModel):
     training_data_path: str = Field(..., description="Path to load the training data file")
     validation_data_path: str = Field(..., description="Path to load the validation data file")
+    tokenized_cache_dir: Optional[str] = Field(None, description="Directory to cache the tokenized datasets (no caching if not specified)")
+    frozen_features_cache_dir: Optional[str] = Field(None, description="Directory to cache the outputs of the frozen layers, used to only train the unfrozen tail when freeze_backbone is true (disabled if not specified)")
     model: ModelConfig = Field(..., description="Model-related configuration")
     n_epochs: int = Field(..., description="Number of epochs for training the model")
     train_dir: str = Field(..., description="Directory to save the training files")
     clean_train_dir_before_training: bool = Field(default=True, description="Whether to clean the training directory before training")
+    resume_from_checkpoint: bool = Field(default=True, description="Whether to resume an interrupted run from its latest checkpoint in train_dir (model, optimizer, scheduler and data order)")
     best_model_path: str = Field(..., description="Path to save the best model during training")
+    early_stopping: Optional[EarlyStoppingConfig] = Field(None, description="Optional early stopping, training budget and checkpoint retention config")
+    compute: ComputeConfig = Field(default_factory=ComputeConfig, description="Mixed precision, gradient accumulation and CPU thread configuration of the training")
     training_curve_path: str = Field(..., description="Path to save the loss and metrics curves after training")
+    pruning: Optional[PruningConfig] = Field(None, description="Optional structured pruning of the best model")
+    export: Optional[ExportConfig] = Field(None, description="Optional export of the best model to an optimized inference graph")
+    incremental: Optional[IncrementalConfig] = Field(None, description="Optional incremental training on the rows added since the last run")
+    distillation: Optional[DistillationConfig] = Field(None, description="Optional knowledge distillation of a fine-tuned teacher into a smaller student")
+    instrumentation: Optional[InstrumentationConfig] = Field(None, description="Optional per-stage time and memory instrumentation config")
 
 def training_config_loader(config_path: str) -> TrainingConfig:
     try:
@@ -1,34 +1,92 @@
+import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
-from typing import List, Dict
+from typing import List, Dict, Optional
 from src.utils.schema import MetricSchema
 from colorama import Fore, Style
 
 class MetricsCalculator:
-    def __init__(self, 
-                 true_labels: List[str], 
-                 pred_labels: List[str], 
-                 output_csv_path: str
+    """
+    Streaming classification metrics over integer-encoded labels (index i is labels[i]), for any number of labels.
+
+    Batches of true and predicted label ids are accumulated into a confusion matrix as the predictions come in,
+    so that the predictions of the whole set never need to be kept. Precision, recall and F1 score are computed for
+    positive_label, or macro-averaged over the labels if it is not specified. Metrics are not rounded: the promotion
+    gate compares the exact values to its thresholds.
+
+    The probabilities of positive_label are also kept (4 bytes per review) to sweep decision thresholds without re-scoring
+    (see threshold_sweep): a review is predicted positive when its probability is at least the threshold (one-vs-rest).
+    """
+
+    def __init__(self,
+                 labels: List[str],
+                 output_csv_path: str,
+                 positive_label: Optional[str] = None
                  ) -> None:
-        self.true_labels = true_labels
-        self.pred_labels = pred_labels
+        assert positive_label is None or positive_label in labels, f"Positive label {positive_label} not found in the labels of the model: {labels}."
+        self.labels = list(labels)
         self.output_csv_path = output_csv_path
+        self.positive_index = self.labels.index(positive_label) if positive_label is not None else None
+        self.confusion_matrix = np.zeros((len(self.labels), len(self.labels)), dtype=np.int64) # Rows: true labels, columns: predicted labels
+        self._positive_probabilities: List[np.ndarray] = []
+        self._is_positive: List[np.ndarray] = []
+
+    def update(self, true_ids: np.ndarray, pred_ids: np.ndarray, probabilities: Optional[np.ndarray] = None) -> None:
+        """Add a batch of true and predicted label ids (and optionally the predicted probabilities, of shape (n_reviews, n_labels))."""
+        n_labels = len(self.labels)
+        true_ids = np.asarray(true_ids, dtype=np.int64)
+        pred_ids = np.asarray(pred_ids, dtype=np.int64)
+        # Each (true, predicted) pair is a cell of the flattened confusion matrix: a single bincount per batch
+        self.confusion_matrix += np.bincount(true_ids * n_labels + pred_ids, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+        if probabilities is not None and self.positive_index is not None:
+            self._positive_probabilities.append(np.asarray(probabilities)[:, self.positive_index].astype(np.float32))
+            self._is_positive.append(true_ids == self.positive_index)
+
+    def compute(self) -> Dict[str, float]:
+        true_positives = np.diag(self.confusion_matrix).astype(np.float64)
+        n_predicted = self.confusion_matrix.sum(axis=0)
+        n_actual = self.confusion_matrix.sum(axis=1)
+        # Labels never predicted (or absent) get a precision (or recall) of 0, as with sklearn
+        precision = np.divide(true_positives, n_predicted, out=np.zeros_like(true_positives), where=n_predicted > 0)
+        recall = np.divide(true_positives, n_actual, out=np.zeros_like(true_positives), where=n_actual > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(true_positives), where=precision + recall > 0)
+        if self.positive_index is not None:
+            precision, recall, f1 = precision[self.positive_index], recall[self.positive_index], f1[self.positive_index]
+        else:
+            precision, recall, f1 = precision.mean(), recall.mean(), f1.mean()
+        return {MetricSchema.ACCURACY: float(true_positives.sum() / max(self.confusion_matrix.sum(), 1)),
+                MetricSchema.PRECISION: float(precision),
+                MetricSchema.RECALL: float(recall),
+                MetricSchema.F1_SCORE: float(f1)}
+
+    def threshold_sweep(self, thresholds: np.ndarray) -> pd.DataFrame:
+        """
+        Precision, recall and F1 score of positive_label at each decision threshold, in one vectorized pass over the kept probabilities.
+
+        The probabilities are sorted once: the reviews predicted positive at a threshold are the ones after its insertion position.
+        """
+        assert len(self._positive_probabilities) > 0, "No probabilities of a positive label were kept: set positive_label and pass the probabilities to update."
+        probabilities = np.concatenate(self._positive_probabilities)
+        is_positive = np.concatenate(self._is_positive)
+        order = np.argsort(probabilities, kind="stable")
+        # Number of positive reviews among the i reviews with the lowest probabilities
+        positives_below = np.concatenate([[0], np.cumsum(is_positive[order])])
+        first_predicted = np.searchsorted(probabilities[order], thresholds, side="left")
+        n_predicted = len(probabilities) - first_predicted
+        true_positives = (positives_below[-1] - positives_below[first_predicted]).astype(np.float64)
+        precision = np.divide(true_positives, n_predicted, out=np.zeros_like(true_positives), where=n_predicted > 0)
+        recall = true_positives / max(positives_below[-1], 1)
+        f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(true_positives), where=precision + recall > 0)
+        return pd.DataFrame({"threshold": thresholds,
+                             "n_predicted_positive": n_predicted,
+                             MetricSchema.PRECISION: precision,
+                             MetricSchema.RECALL: recall,
+                             MetricSchema.F1_SCORE: f1})
 
     def calculate_metrics(self) -> Dict[str, float]:
-        accuracy = accuracy_score(self.true_labels, self.pred_labels)
-        precision = precision_score(self.true_labels, self.pred_labels, pos_label="positive")
-        recall = recall_score(self.true_labels, self.pred_labels, pos_label="positive")
-        f1 = f1_score(self.true_labels, self.pred_labels, pos_label="positive")
-
-        metrics = {
-            MetricSchema.ACCURACY: round(accuracy, 3),
-            MetricSchema.PRECISION: round(precision, 3),
-            MetricSchema.RECALL: round(recall, 3),
-            MetricSchema.F1_SCORE: round(f1, 3),
-        }
+        metrics = self.compute()
 
         df = pd.DataFrame([metrics])
         df.to_csv(self.output_csv_path, index=False)
         print(Fore.MAGENTA + f"CSV file with performance metrics saved at {self.output_csv_path}." + Style.RESET_ALL)
 
-        return metrics
\ No newline at end of file
+        return metrics
@@ -0,0 +1,208 @@
+import os
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoConfig, AutoModelForSequenceClassification
+from typing import List, Dict, Iterator, Optional, Tuple
+from src.utils.schema import BackendSchema, ExportSchema, AggregationSchema
+
+class BatchPredictor:
+    """
+    Batched, length-bucketed sentiment predictor.
+
+    Reviews are sorted by token length and grouped into batches of similar length, so that each batch
+    is only padded to its own longest review. Predictions are returned in the original input order.
+    With a token budget, a batch is also closed once its padded size (number of reviews x longest review) would exceed
+    max_batch_tokens: short reviews share large batches, long reviews run in small ones, and each forward pass costs about the same.
+
+    With sliding windows, reviews longer than max_length are split into overlapping windows instead of being truncated.
+    The windows of all reviews are batched together by length, and the logits of the windows of a review are aggregated.
+    """
+
+    def __init__(self, model_path: str, batch_size: int = 32, max_length: int = 512, backend: str = BackendSchema.PYTORCH,
+                 sliding_window: bool = False, window_overlap: int = 128, aggregation: str = AggregationSchema.MEAN,
+                 num_threads: Optional[int] = None, max_batch_tokens: Optional[int] = None) -> None:
+        """
+        Load the tokenizer and the model from a local directory (or a Hugging Face model name).
+
+        Args:
+            model_path (str): Path of the trained model directory.
+            batch_size (int): Maximum number of reviews per forward pass.
+            max_length (int): Maximum number of tokens per review (longer reviews are truncated).
+            backend (str): Inference backend: eager PyTorch model (pytorch), or the graph exported next to the model (onnx or torchscript).
+            sliding_window (bool): Whether to split long reviews into overlapping windows of max_length tokens instead of truncating them.
+            window_overlap (int): Number of tokens shared by two consecutive windows of a review.
+            aggregation (str): Aggregation of the window logits of a review: mean, or mean weighted by the confidence of each window.
+            num_threads (Optional[int]): Number of threads of the onnx session (onnxruntime default if not specified). The torch threads are set per process (torch.set_num_threads).
+            max_batch_tokens (Optional[int]): Maximum number of padded tokens per forward pass (only batch_size reviews per batch if not specified).
+        """
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.backend = backend
+        self.sliding_window = sliding_window
+        self.window_overlap = window_overlap
+        self.aggregation = aggregation
+        self.max_batch_tokens = max_batch_tokens
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=True)
+        if sliding_window:
+            assert aggregation in (AggregationSchema.MEAN, AggregationSchema.CONFIDENCE), f"Unknown window aggregation: {aggregation}."
+            assert 0 <= window_overlap < max_length - self.tokenizer.num_special_tokens_to_add(), f"The window overlap ({window_overlap}) must be smaller than the window content ({max_length} tokens minus the special tokens)."
+        config = AutoConfig.from_pretrained(model_path)
+        self.id2label = {int(idx): label for idx, label in config.id2label.items()}
+
+        if backend == BackendSchema.PYTORCH:
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+            self.model.eval()
+        elif backend == BackendSchema.ONNX:
+            import onnxruntime as ort
+            session_options = ort.SessionOptions()
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if num_threads is not None:
+                session_options.intra_op_num_threads = num_threads
+            self.model = ort.InferenceSession(self._exported_model_path(ExportSchema.ONNX_MODEL_FILE), session_options, providers=["CPUExecutionProvider"])
+        elif backend == BackendSchema.TORCHSCRIPT:
+            self.model = torch.jit.load(self._exported_model_path(ExportSchema.TORCHSCRIPT_MODEL_FILE))
+            self.model.eval()
+        else:
+            raise ValueError(f"Unknown inference backend: {backend}. Expected one of: {BackendSchema.PYTORCH}, {BackendSchema.ONNX}, {BackendSchema.TORCHSCRIPT}.")
+
+    def _exported_model_path(self, file_name: str) -> str:
+        exported_model_path = os.path.join(self.model_path, file_name)
+        if not os.path.exists(exported_model_path):
+            raise FileNotFoundError(f"Could not find the exported model at {exported_model_path}. Please export the model after training and try again.")
+        return exported_model_path
+
+    def tokenize(self, texts: List[str]) -> List[List[int]]:
+        # Tokenize without padding: each review keeps its own length
+        encodings = self.tokenizer(texts, truncation=True, max_length=self.max_length, padding=False)
+        return encodings["input_ids"]
+
+    def tokenize_windows(self, texts: List[str]) -> Tuple[List[List[int]], np.ndarray]:
+        """
+        Tokenize the reviews into windows of at most max_length tokens (one truncated window per review if sliding windows are disabled).
+
+        Returns:
+            Tuple[List[List[int]], np.ndarray]: Token ids of each window, and index of the review of each window.
+        """
+        if len(texts) == 0:
+            return [], np.zeros(0, dtype=np.int64)
+        if not self.sliding_window:
+            return self.tokenize(texts), np.arange(len(texts))
+        # Each window gets its own special tokens, and repeats the last window_overlap tokens of the previous one
+        encodings = self.tokenizer(texts, truncation=True, max_length=self.max_length, stride=self.window_overlap,
+                                   return_overflowing_tokens=True, padding=False)
+        return encodings["input_ids"], np.asarray(encodings["overflow_to_sample_mapping"])
+
+    def aggregate_windows(self, window_logits: np.ndarray, review_indices: np.ndarray, n_reviews: int) -> np.ndarray:
+        """Aggregate the logits of the windows of each review (see tokenize_windows) into one row per review."""
+        if self.aggregation == AggregationSchema.CONFIDENCE:
+            # Windows the model is confident about (e.g. a conclusion) outweigh neutral ones (e.g. a plot summary)
+            weights = softmax(window_logits).max(axis=-1)
+        else:
+            weights = np.ones(len(window_logits), dtype=np.float32)
+        logits = np.zeros((n_reviews, window_logits.shape[-1]), dtype=np.float32)
+        np.add.at(logits, review_indices, window_logits * weights[:, None])
+        total_weights = np.zeros(n_reviews, dtype=np.float32)
+        np.add.at(total_weights, review_indices, weights)
+        return logits / total_weights[:, None]
+
+    def logits_from_windows(self, window_input_ids: List[List[int]], review_indices: np.ndarray, n_reviews: int) -> np.ndarray:
+        """Compute the logits of already tokenized windows (see tokenize_windows), aggregated per review in the original input order."""
+        # The windows of all reviews share the length-bucketed batches: full windows of long reviews are batched together
+        window_logits = self.logits_from_input_ids(window_input_ids)
+        if not self.sliding_window:
+            return window_logits
+        return self.aggregate_windows(window_logits, review_indices, n_reviews)
+
+    def _iter_batches(self, input_ids: List[List[int]]) -> Iterator[Tuple[np.ndarray, List[List[int]]]]:
+        # Sort reviews by token length so that each batch groups reviews of similar length
+        lengths = [len(ids) for ids in input_ids]
+        order = np.argsort(lengths, kind="stable")
+        start = 0
+        while start < len(order):
+            end = start + 1
+            # Sorted by length: the next review is the longest of the batch, the batch is padded to its length
+            while end < len(order) and end - start < self.batch_size and \
+                    (self.max_batch_tokens is None or (end - start + 1) * lengths[order[end]] <= self.max_batch_tokens):
+                end += 1
+            batch_indices = order[start:end]
+            yield batch_indices, [input_ids[idx] for idx in batch_indices]
+            start = end
+
+    def _forward(self, batch_input_ids: List[List[int]]) -> np.ndarray:
+        batch = self._pad(batch_input_ids)
+        if self.backend == BackendSchema.ONNX:
+            return self.model.run(None, {name: tensor.numpy() for name, tensor in batch.items()})[0]
+
+        with torch.inference_mode():
+            if self.backend == BackendSchema.TORCHSCRIPT:
+                logits = self.model(batch["input_ids"], batch["attention_mask"])
+            else:
+                logits = self.model(**batch).logits
+        return logits.float().numpy()
+
+    def _pad(self, batch_input_ids: List[List[int]]) -> Dict[str, torch.Tensor]:
+        # Pad the batch only to its own longest review
+        max_length = max(len(ids) for ids in batch_input_ids)
+        input_ids = torch.full((len(batch_input_ids), max_length), self.tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch_input_ids), max_length), dtype=torch.long)
+        for idx, ids in enumerate(batch_input_ids):
+            input_ids[idx, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[idx, :len(ids)] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+    def predict_logits(self, texts: List[str]) -> np.ndarray:
+        """
+        Compute the logits of each review, in the original input order.
+
+        Args:
+            texts (List[str]): Reviews to classify.
+
+        Returns:
+            np.ndarray: Array of shape (n_reviews, n_labels).
+        """
+        window_input_ids, review_indices = self.tokenize_windows(texts)
+        return self.logits_from_windows(window_input_ids, review_indices, len(texts))
+
+    def logits_from_input_ids(self, input_ids: List[List[int]]) -> np.ndarray:
+        """Compute the logits of already tokenized reviews (see tokenize), in the original input order."""
+        logits = np.zeros((len(input_ids), len(self.id2label)), dtype=np.float32)
+        if len(input_ids) == 0:
+            return logits
+
+        for batch_indices, batch_input_ids in self._iter_batches(input_ids):
+            logits[batch_indices] = self._forward(batch_input_ids)
+        return logits
+
+    def predict(self, texts: List[str]) -> List[Dict[str, float]]:
+        """
+        Predict the label and the score of each review, in the original input order.
+
+        Args:
+            texts (List[str]): Reviews to classify.
+
+        Returns:
+            List[Dict[str, float]]: One {"label", "score"} dict per review (same format as the transformers pipeline).
+        """
+        return self.predictions_from_logits(self.predict_logits(texts))
+
+    def predict_input_ids(self, input_ids: List[List[int]]) -> List[Dict[str, float]]:
+        """Predict the label and the score of already tokenized reviews (see tokenize), in the original input order."""
+        return self.predictions_from_logits(self.logits_from_input_ids(input_ids))
+
+    def predictions_from_logits(self, logits: np.ndarray) -> List[Dict[str, float]]:
+        """Convert logits of shape (n_reviews, n_labels) to one {"label", "score"} dict per review."""
+        probabilities = softmax(logits)
+        pred_ids = probabilities.argmax(axis=-1)
+        return [{"label": self.id2label[int(pred_id)], "score": float(probabilities[idx, pred_id])}
+                for idx, pred_id in enumerate(pred_ids)]
+
+    def __call__(self, texts: List[str]) -> List[Dict[str, float]]:
+        if isinstance(texts, str):
+            texts = [texts]
+        return self.predict(texts)
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
@@ -0,0 +1,77 @@
+import os
+import time
+import torch
+from transformers import Trainer
+from colorama import Fore, Style
+from typing import Callable, Dict, List, Optional, Tuple
+
+def thread_candidates(n_cores: int) -> List[int]:
+    """Numbers of torch intra-op threads tried by the calibration: all the cores, one core left to the data loading, half of the cores."""
+    return sorted({n_cores, max(n_cores - 1, 1), max(n_cores // 2, 1)}, reverse=True)
+
+def time_training_steps(trainer: Trainer, n_threads: int, n_steps: int) -> float:
+    """
+    Run n_steps training steps (forward, backward and optimizer step) with n_threads torch threads.
+
+    The trainer is a throwaway one (its own copy of the model, built with the dataloader workers to time): its model is
+    updated by a plain AdamW optimizer, the Trainer itself is only used for its dataloader and its loss.
+
+    Returns:
+        float: Number of training samples per second (a first warm-up step is not timed).
+    """
+    torch.set_num_threads(n_threads)
+    model = trainer.model
+    model.train()
+    optimizer = torch.optim.AdamW([param for param in model.parameters() if param.requires_grad], lr=trainer.args.learning_rate)
+
+    def training_step(batch: Dict[str, torch.Tensor]) -> None:
+        with torch.autocast(device_type="cpu", dtype=torch.bfloat16, enabled=trainer.args.bf16):
+            loss = trainer.compute_loss(model, batch)
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+
+    batches = iter(trainer.get_train_dataloader())
+    training_step(next(batches))
+    n_samples, start_time = 0, time.perf_counter()
+    for _ in range(n_steps):
+        batch = next(batches, None)
+        if batch is None:
+            break
+        n_samples += len(next(iter(batch.values())))
+        training_step(batch)
+    elapsed_s = time.perf_counter() - start_time
+    del batches # Stops the dataloader workers
+    return n_samples / elapsed_s if elapsed_s > 0 else 0.0
+
+def calibrate_cpu_settings(build_trainer: Callable[[int], Trainer], n_steps: int, num_threads: Optional[int] = None,
+                           dataloader_num_workers: Optional[int] = None) -> Tuple[int, int, List[Dict]]:
+    """
+    Choose the number of torch threads and of dataloader workers of the training by timing a few training steps with each candidate.
+
+    The number of threads is chosen first (without dataloader workers), then the number of workers with the chosen threads.
+    The values already set (num_threads, dataloader_num_workers) are not calibrated. Each candidate is timed on a trainer returned by
+    build_trainer(n_workers), which must train a copy of the model: the model and the training arguments of the run are left unchanged.
+    The random number generators are used: they are reseeded by the Trainer of the run.
+
+    Returns:
+        Tuple[int, int, List[Dict]]: Number of threads and of workers chosen, and throughput of each tried configuration.
+    """
+    n_cores = os.cpu_count() or 1
+    throughputs: Dict[Tuple[int, int], float] = {}
+
+    def measure(n_threads: int, n_workers: int) -> float:
+        if (n_threads, n_workers) not in throughputs: # Configurations of both phases are only timed once
+            throughputs[(n_threads, n_workers)] = time_training_steps(trainer=build_trainer(n_workers), n_threads=n_threads, n_steps=n_steps)
+            print(f"{Fore.CYAN} - {n_threads} thread(s), {n_workers} dataloader worker(s): {throughputs[(n_threads, n_workers)]:.1f} samples/s{Style.RESET_ALL}")
+        return throughputs[(n_threads, n_workers)]
+
+    if num_threads is None:
+        n_workers = dataloader_num_workers if dataloader_num_workers is not None else 0
+        num_threads = max(thread_candidates(n_cores), key=lambda n_threads: measure(n_threads, n_workers))
+    if dataloader_num_workers is None:
+        # Workers only help when the collation is not negligible: more than 2 workers would mostly take cores from the model
+        dataloader_num_workers = max(range(min(n_cores, 2) + 1), key=lambda n_workers: measure(num_threads, n_workers))
+    results = [{"num_threads": n_threads, "dataloader_num_workers": n_workers, "samples_per_s": round(samples_per_s, 2)}
+               for (n_threads, n_workers), samples_per_s in throughputs.items()]
+    return num_threads, dataloader_num_workers, results
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import numpy as np
+from torch import nn
+from datasets import Dataset
+from transformers import AutoModelForSequenceClassification, PreTrainedModel, Trainer
+from colorama import Fore, Style
+from typing import Optional
+from src.modeling.batch_predictor import BatchPredictor
+from src.utils.toolbox import compute_model_files_hash
+
+TEACHER_LOGITS_COLUMN = "teacher_logits"
+
+def build_student_model(teacher_model_path: str, num_layers: int) -> PreTrainedModel:
+    """
+    Build a student by copying the fine-tuned teacher and only keeping num_layers of its encoder layers (evenly spaced, first and last included).
+
+    The student starts from the teacher's embeddings, kept layers and classification head, which converges much faster than a random
+    initialization, and stays a regular Hugging Face model (same tokenizer, same export and serving path).
+    """
+    model = AutoModelForSequenceClassification.from_pretrained(teacher_model_path)
+    encoder_layers = model.base_model.encoder.layer
+    assert 0 < num_layers < len(encoder_layers), f"The student must have between 1 and {len(encoder_layers) - 1} layers, got {num_layers}."
+    kept_layers = sorted(set(np.linspace(0, len(encoder_layers) - 1, num_layers).round().astype(int).tolist()))
+    model.base_model.encoder.layer = nn.ModuleList([encoder_layers[idx] for idx in kept_layers])
+    model.config.num_hidden_layers = len(kept_layers)
+    print(f"{Fore.CYAN}Student built from teacher layers {kept_layers} of {len(encoder_layers)}.{Style.RESET_ALL}")
+    return model
+
+def teacher_logits_cache_key(teacher_model_path: str, dataset_key: str) -> str:
+    # The teacher is identified by the content of its config and weights files
+    key = f"{dataset_key}|{compute_model_files_hash(teacher_model_path)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def compute_teacher_logits(teacher_model_path: str, dataset: Dataset, batch_size: int, cache_path: Optional[str] = None) -> np.ndarray:
+    """
+    Compute the logits of the teacher on a tokenized (unpadded) dataset once, and store them in an on-disk cache (.npy).
+
+    The teacher runs on the same token ids as the student (length-bucketed batches, see BatchPredictor). Existing caches are reused,
+    no caching if cache_path is None.
+
+    Returns:
+        np.ndarray: Array of shape (n_reviews, n_labels).
+    """
+    if cache_path is not None and os.path.exists(cache_path):
+        print(Fore.MAGENTA + f"Loading teacher logits from cache {cache_path}." + Style.RESET_ALL)
+        return np.load(cache_path)
+
+    print(f"{Fore.YELLOW}Computing teacher logits of {len(dataset)} reviews...{Style.RESET_ALL}")
+    teacher = BatchPredictor(model_path=teacher_model_path, batch_size=batch_size)
+    logits = teacher.logits_from_input_ids(dataset["input_ids"])
+    if cache_path is None:
+        return logits
+
+    # Write to a temporary file first so that an interrupted run never leaves a partial cache entry
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.tmp.npy"
+    np.save(tmp_path, logits)
+    os.replace(tmp_path, cache_path)
+    print(Fore.MAGENTA + f"Teacher logits cached at {cache_path}." + Style.RESET_ALL)
+    return logits
+
+class DistillationTrainer(Trainer):
+    """
+    Trainer of a student on a blend of the teacher's soft labels and the hard labels:
+    loss = alpha * T^2 * KL(teacher / T || student / T) + (1 - alpha) * cross_entropy(student, labels).
+
+    Batches without teacher logits (e.g. evaluation) use the hard label loss only.
+    """
+
+    def __init__(self, *args, temperature: float, alpha: float, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.temperature = temperature
+        self.alpha = alpha
+
+    def compute_loss(self, model, inputs, return_outputs=False):
+        teacher_logits = inputs.pop(TEACHER_LOGITS_COLUMN, None)
+        outputs = model(**inputs)
+        loss = outputs.loss
+        if teacher_logits is not None:
+            # Scaled by T^2 so that the gradients of the soft loss keep the same magnitude whatever the temperature
+            soft_loss = nn.functional.kl_div(nn.functional.log_softmax(outputs.logits / self.temperature, dim=-1),
+                                             nn.functional.softmax(teacher_logits.to(outputs.logits.dtype) / self.temperature, dim=-1),
+                                             reduction="batchmean") * self.temperature ** 2
+            loss = self.alpha * soft_loss + (1 - self.alpha) * loss
+        return (loss, outputs) if return_outputs else loss
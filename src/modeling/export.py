@@ -0,0 +1,156 @@
+import os
+import numpy as np
+import torch
+from torch import nn
+from transformers import AutoModelForSequenceClassification
+from colorama import Fore, Style
+from typing import List, Dict
+from src.utils.schema import BackendSchema, ExportSchema
+from src.modeling.batch_predictor import BatchPredictor
+
+class _LogitsWrapper(nn.Module):
+    # Positional (input_ids, attention_mask) -> logits signature, required by the ONNX and TorchScript exporters
+    def __init__(self, model: nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+# Number of tokens per review of the example inputs the models are traced on
+TRACE_SEQUENCE_LENGTH = 16
+
+def _example_inputs(batch_size: int = 2, sequence_length: int = TRACE_SEQUENCE_LENGTH) -> tuple:
+    input_ids = torch.ones((batch_size, sequence_length), dtype=torch.long)
+    attention_mask = torch.ones((batch_size, sequence_length), dtype=torch.long)
+    return input_ids, attention_mask
+
+def exported_model_path(model_path: str, backend: str) -> str:
+    file_name = ExportSchema.ONNX_MODEL_FILE if backend == BackendSchema.ONNX else ExportSchema.TORCHSCRIPT_MODEL_FILE
+    return os.path.join(model_path, file_name)
+
+def export_onnx(model: nn.Module, output_dir: str, opset_version: int = 14) -> str:
+    """
+    Export the model to ONNX (dynamic batch and sequence axes) and apply the ONNX Runtime graph optimizations (operator fusion).
+
+    Args:
+        model (nn.Module): Sequence classification model to export.
+        output_dir (str): Directory where the ONNX graph is saved.
+        opset_version (int): ONNX opset version.
+
+    Returns:
+        str: Path of the optimized ONNX graph.
+    """
+    import onnxruntime as ort
+
+    onnx_path = exported_model_path(model_path=output_dir, backend=BackendSchema.ONNX)
+    raw_onnx_path = f"{onnx_path}.raw"
+    torch.onnx.export(_LogitsWrapper(model).eval(),
+                      _example_inputs(),
+                      raw_onnx_path,
+                      input_names=["input_ids", "attention_mask"],
+                      output_names=["logits"],
+                      dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                                    "attention_mask": {0: "batch", 1: "sequence"},
+                                    "logits": {0: "batch"}},
+                      opset_version=opset_version)
+
+    # Offline graph optimizations (extended level, the hardware-specific ones are applied when the session is created)
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    session_options.optimized_model_filepath = onnx_path
+    ort.InferenceSession(raw_onnx_path, session_options, providers=["CPUExecutionProvider"])
+    os.remove(raw_onnx_path)
+    return onnx_path
+
+def export_torchscript(model: nn.Module, output_dir: str) -> str:
+    """
+    Export the model to a frozen TorchScript graph.
+
+    Args:
+        model (nn.Module): Sequence classification model to export.
+        output_dir (str): Directory where the TorchScript graph is saved.
+
+    Returns:
+        str: Path of the TorchScript graph.
+    """
+    torchscript_path = exported_model_path(model_path=output_dir, backend=BackendSchema.TORCHSCRIPT)
+    with torch.inference_mode():
+        traced_model = torch.jit.trace(_LogitsWrapper(model).eval(), _example_inputs(), strict=False)
+    torch.jit.save(torch.jit.freeze(traced_model), torchscript_path)
+    return torchscript_path
+
+def check_torchscript_parity(model: nn.Module, torchscript_path: str, sequence_lengths: List[int], batch_size: int = 2, seed: int = 0) -> Dict[int, float]:
+    """
+    Compare a TorchScript graph with the eager model it was traced from, on random reviews of several lengths.
+
+    The graph is traced on a single shape: the other lengths check that it did not keep shape-specific values.
+    The last review of each batch is half padded, so that the attention mask is exercised too.
+
+    Args:
+        model (nn.Module): Eager sequence classification model.
+        torchscript_path (str): Path of the TorchScript graph traced from the model.
+        sequence_lengths (List[int]): Numbers of tokens per review of the compared batches.
+        batch_size (int): Number of reviews per compared batch.
+        seed (int): Seed of the random token ids.
+
+    Returns:
+        Dict[int, float]: Maximum absolute logit difference for each sequence length.
+    """
+    traced_model = torch.jit.load(torchscript_path)
+    generator = torch.Generator().manual_seed(seed)
+    max_abs_diffs = {}
+    with torch.inference_mode():
+        for sequence_length in sequence_lengths:
+            input_ids = torch.randint(model.config.vocab_size, (batch_size, sequence_length), generator=generator)
+            attention_mask = torch.ones((batch_size, sequence_length), dtype=torch.long)
+            attention_mask[-1, max(sequence_length // 2, 1):] = 0
+            eager_logits = _LogitsWrapper(model).eval()(input_ids, attention_mask)
+            max_abs_diffs[sequence_length] = float((eager_logits - traced_model(input_ids, attention_mask)).abs().max())
+    return max_abs_diffs
+
+def export_model(model_path: str, export_format: str) -> str:
+    """
+    Export the trained model saved in model_path to an optimized graph saved next to it.
+    ONNX export falls back to TorchScript if ONNX Runtime is not installed or the export fails.
+
+    Args:
+        model_path (str): Directory of the trained model.
+        export_format (str): Export format (onnx or torchscript).
+
+    Returns:
+        str: Backend of the exported graph (onnx or torchscript).
+    """
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+
+    if export_format == BackendSchema.ONNX:
+        try:
+            onnx_path = export_onnx(model=model, output_dir=model_path)
+            print(Fore.MAGENTA + f"ONNX graph saved at {onnx_path}." + Style.RESET_ALL)
+            return BackendSchema.ONNX
+        except Exception as error:
+            print(f"{Fore.RED}ONNX export failed ({error}). Falling back to TorchScript...{Style.RESET_ALL}")
+
+    torchscript_path = export_torchscript(model=model, output_dir=model_path)
+    print(Fore.MAGENTA + f"TorchScript graph saved at {torchscript_path}." + Style.RESET_ALL)
+    return BackendSchema.TORCHSCRIPT
+
+def check_parity(model_path: str, backend: str, texts: List[str], max_length: int, batch_size: int) -> Dict[str, float]:
+    """
+    Compare the predictions of an exported backend with the eager PyTorch model.
+
+    Args:
+        model_path (str): Directory of the trained model (and of the exported graph).
+        backend (str): Backend to compare with the eager model.
+        texts (List[str]): Reviews used for the comparison.
+        max_length (int): Maximum number of tokens per review.
+        batch_size (int): Batch size used for the predictions.
+
+    Returns:
+        Dict[str, float]: Maximum absolute logit difference and label agreement rate.
+    """
+    eager_logits = BatchPredictor(model_path=model_path, batch_size=batch_size, max_length=max_length).predict_logits(texts)
+    backend_logits = BatchPredictor(model_path=model_path, batch_size=batch_size, max_length=max_length, backend=backend).predict_logits(texts)
+    return {"max_abs_diff": float(np.abs(eager_logits - backend_logits).max()),
+            "label_agreement": float((eager_logits.argmax(axis=-1) == backend_logits.argmax(axis=-1)).mean())}
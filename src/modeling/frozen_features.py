@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import torch
+from torch import nn
+from datasets import Dataset
+from transformers import PreTrainedModel
+from transformers.modeling_outputs import SequenceClassifierOutput
+from colorama import Fore, Style
+from typing import List, Dict
+from src.utils.schema import DataSchema
+
+def get_extended_attention_mask(attention_mask: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+    # Additive mask broadcastable to (batch, heads, query, key), as built inside BertModel
+    extended_attention_mask = attention_mask[:, None, None, :].to(dtype)
+    return (1.0 - extended_attention_mask) * torch.finfo(dtype).min
+
+class FrozenTailModel(nn.Module):
+    """
+    Unfrozen tail of a BERT sequence classifier: the last encoder layers, the pooler and the classification head.
+
+    The modules are shared with the full model, so training the tail updates the full model in place.
+    """
+
+    def __init__(self, model: PreTrainedModel, first_trainable_layer: int) -> None:
+        super().__init__()
+        self.config = model.config
+        self.layers = nn.ModuleList(model.bert.encoder.layer[first_trainable_layer:])
+        self.pooler = model.bert.pooler
+        self.dropout = model.dropout
+        self.classifier = model.classifier
+
+    def forward(self, hidden_states: torch.Tensor, attention_mask: torch.Tensor, labels: torch.Tensor = None) -> SequenceClassifierOutput:
+        extended_attention_mask = get_extended_attention_mask(attention_mask, hidden_states.dtype)
+        for layer in self.layers:
+            hidden_states = layer(hidden_states, attention_mask=extended_attention_mask)[0]
+        pooled_output = self.dropout(self.pooler(hidden_states))
+        logits = self.classifier(pooled_output)
+
+        loss = None
+        if labels is not None:
+            loss = nn.functional.cross_entropy(logits.view(-1, self.config.num_labels), labels.view(-1))
+        return SequenceClassifierOutput(loss=loss, logits=logits)
+
+class FrozenFeatureDataset(torch.utils.data.Dataset):
+    """Dataset of cached hidden states (memory-mapped fp16 tokens of all reviews, concatenated) and labels."""
+
+    def __init__(self, cache_path: str) -> None:
+        self.hidden_states = np.load(os.path.join(cache_path, "hidden_states.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(cache_path, "offsets.npy"))
+        self.labels = np.load(os.path.join(cache_path, "labels.npy"))
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __getitem__(self, idx: int) -> Dict[str, torch.Tensor]:
+        hidden_states = self.hidden_states[self.offsets[idx]:self.offsets[idx + 1]]
+        return {"hidden_states": torch.from_numpy(hidden_states.astype(np.float32)),
+                "labels": torch.tensor(self.labels[idx], dtype=torch.long)}
+
+def collate_frozen_features(features: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+    # Pad the hidden states of the batch to its own longest review, the attention mask is rebuilt from the review lengths
+    lengths = [feature["hidden_states"].shape[0] for feature in features]
+    hidden_size = features[0]["hidden_states"].shape[1]
+    hidden_states = torch.zeros((len(features), max(lengths), hidden_size), dtype=torch.float32)
+    attention_mask = torch.zeros((len(features), max(lengths)), dtype=torch.long)
+    for idx, (feature, length) in enumerate(zip(features, lengths)):
+        hidden_states[idx, :length] = feature["hidden_states"]
+        attention_mask[idx, :length] = 1
+    return {"hidden_states": hidden_states,
+            "attention_mask": attention_mask,
+            "labels": torch.stack([feature["labels"] for feature in features])}
+
+def frozen_features_cache_key(model_name: str, first_trainable_layer: int, dataset_key: str) -> str:
+    key = f"{model_name}|{first_trainable_layer}|{dataset_key}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def compute_frozen_features(model: PreTrainedModel,
+                            dataset: Dataset,
+                            first_trainable_layer: int,
+                            cache_path: str,
+                            batch_size: int) -> FrozenFeatureDataset:
+    """
+    Run the frozen prefix of the model (embeddings and encoder layers before first_trainable_layer) once over a tokenized dataset,
+    and store the resulting hidden states in an on-disk cache.
+
+    Hidden states are stored in fp16 without padding (all the tokens of all the reviews concatenated, with the review offsets),
+    the attention mask of a review is given by its length. Existing caches are reused.
+
+    Args:
+        model (PreTrainedModel): BERT sequence classifier whose prefix is frozen.
+        dataset (Dataset): Tokenized (unpadded) dataset.
+        first_trainable_layer (int): Index of the first encoder layer that is trained.
+        cache_path (str): Directory of the cache entry.
+        batch_size (int): Batch size used to run the frozen prefix.
+
+    Returns:
+        FrozenFeatureDataset: Memory-mapped dataset of the cached hidden states.
+    """
+    if os.path.isdir(cache_path):
+        print(Fore.MAGENTA + f"Loading frozen features from cache {cache_path}." + Style.RESET_ALL)
+        return FrozenFeatureDataset(cache_path)
+
+    print(f"{Fore.YELLOW}Computing frozen features of {len(dataset)} reviews (embeddings and encoder layers 0-{first_trainable_layer - 1})...{Style.RESET_ALL}")
+    input_ids = dataset["input_ids"]
+    lengths = np.array([len(ids) for ids in input_ids], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+
+    tmp_path = f"{cache_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    hidden_states = np.lib.format.open_memmap(os.path.join(tmp_path, "hidden_states.npy"), mode="w+",
+                                              dtype=np.float16, shape=(int(offsets[-1]), model.config.hidden_size))
+
+    was_training = model.training
+    model.eval()
+    order = np.argsort(lengths, kind="stable") # Batches of reviews of similar length to limit padding
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch_indices = order[start:start + batch_size]
+            max_length = int(lengths[batch_indices].max())
+            batch_input_ids = torch.full((len(batch_indices), max_length), model.config.pad_token_id or 0, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch_indices), max_length), dtype=torch.long)
+            for row, idx in enumerate(batch_indices):
+                batch_input_ids[row, :lengths[idx]] = torch.tensor(input_ids[idx], dtype=torch.long)
+                attention_mask[row, :lengths[idx]] = 1
+
+            batch_hidden_states = model.bert.embeddings(input_ids=batch_input_ids.to(model.device))
+            extended_attention_mask = get_extended_attention_mask(attention_mask.to(model.device), batch_hidden_states.dtype)
+            for layer in model.bert.encoder.layer[:first_trainable_layer]:
+                batch_hidden_states = layer(batch_hidden_states, attention_mask=extended_attention_mask)[0]
+
+            batch_hidden_states = batch_hidden_states.to(torch.float16).cpu().numpy()
+            for row, idx in enumerate(batch_indices):
+                hidden_states[offsets[idx]:offsets[idx + 1]] = batch_hidden_states[row, :lengths[idx]]
+    model.train(was_training)
+
+    hidden_states.flush()
+    del hidden_states
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "labels.npy"), np.asarray(dataset[DataSchema.LABEL], dtype=np.int64))
+    with open(os.path.join(tmp_path, "metadata.json"), "w", encoding="utf-8") as file:
+        json.dump({"n_reviews": len(lengths), "n_tokens": int(offsets[-1]), "first_trainable_layer": first_trainable_layer}, file)
+    os.replace(tmp_path, cache_path)
+    print(Fore.MAGENTA + f"Frozen features cached at {cache_path}." + Style.RESET_ALL)
+    return FrozenFeatureDataset(cache_path)
@@ -4,6 +4,9 @@ from colorama import Fore, Style
 from typing import Optional
 
 class ModelBuilder:
+    # Keeping layer 3 trainable allows for greater task-specific adaptation; otherwise, the classifier alone is too simple to capture complex patterns
+    FIRST_TRAINABLE_LAYER = 3
+
     def __init__(
         self,
         model_name: str,
@@ -45,7 +48,7 @@ class ModelBuilder:
             for name, param in model.named_parameters():
                 if not (
                         name.startswith("classifier.") or 
-                        name.startswith("bert.encoder.layer.3.") # Keeping layer 3 trainable allows for greater task-specific adaptation; otherwise, the classifier alone is too simple to capture complex patterns
+                        name.startswith(f"bert.encoder.layer.{self.FIRST_TRAINABLE_LAYER}.")
                     ):
                     param.requires_grad = False
             print(f"{Fore.CYAN}Encoder parameters frozen.{Style.RESET_ALL}")
@@ -0,0 +1,128 @@
+import time
+import numpy as np
+import torch
+from transformers import PreTrainedModel
+from transformers.pytorch_utils import prune_linear_layer
+from typing import Dict, Iterator, List, Tuple
+
+def _iter_padded_batches(input_ids: List[List[int]], labels: np.ndarray, batch_size: int, pad_token_id: int) -> Iterator[Dict[str, torch.Tensor]]:
+    # Reviews sorted by length: each batch is only padded to its own longest review
+    order = np.argsort([len(ids) for ids in input_ids], kind="stable")
+    for start in range(0, len(order), batch_size):
+        batch_indices = order[start:start + batch_size]
+        max_length = max(len(input_ids[idx]) for idx in batch_indices)
+        batch_input_ids = torch.full((len(batch_indices), max_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch_indices), max_length), dtype=torch.long)
+        for row, idx in enumerate(batch_indices):
+            batch_input_ids[row, :len(input_ids[idx])] = torch.tensor(input_ids[idx], dtype=torch.long)
+            attention_mask[row, :len(input_ids[idx])] = 1
+        yield {"input_ids": batch_input_ids, "attention_mask": attention_mask, "labels": torch.as_tensor(labels[batch_indices], dtype=torch.long)}
+
+def count_heads(model: PreTrainedModel) -> int:
+    return sum(layer.attention.self.num_attention_heads for layer in model.base_model.encoder.layer)
+
+def compute_importance(model: PreTrainedModel, input_ids: List[List[int]], labels: np.ndarray, batch_size: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    Score the attention heads and the intermediate neurons of each encoder layer by their first-order (Taylor) importance:
+    the absolute gradient of the loss with respect to a multiplicative mask on their output, accumulated over labeled reviews.
+
+    The masks are applied with forward hooks, so that already pruned layers (fewer heads, smaller intermediate size) are scored as well.
+
+    Returns:
+        Tuple[List[np.ndarray], List[np.ndarray]]: Importance of the remaining heads, and of the intermediate neurons, of each layer.
+    """
+    layers = model.base_model.encoder.layer
+    head_masks = [torch.ones(layer.attention.self.num_attention_heads, requires_grad=True) for layer in layers]
+    neuron_masks = [torch.ones(layer.intermediate.dense.out_features, requires_grad=True) for layer in layers]
+
+    def mask_heads(head_mask: torch.Tensor):
+        def hook(module, inputs, outputs):
+            context = outputs[0]
+            batch_size, seq_length, _ = context.shape
+            context = (context.view(batch_size, seq_length, len(head_mask), -1) * head_mask[None, None, :, None]).view(batch_size, seq_length, -1)
+            return (context,) + tuple(outputs[1:])
+        return hook
+
+    def mask_neurons(neuron_mask: torch.Tensor):
+        return lambda module, inputs, output: output * neuron_mask
+
+    handles = []
+    for layer, head_mask, neuron_mask in zip(layers, head_masks, neuron_masks):
+        handles.append(layer.attention.self.register_forward_hook(mask_heads(head_mask)))
+        handles.append(layer.intermediate.register_forward_hook(mask_neurons(neuron_mask)))
+
+    # Only the masks need gradients
+    requires_grad = {name: param.requires_grad for name, param in model.named_parameters()}
+    for param in model.parameters():
+        param.requires_grad = False
+    was_training = model.training
+    model.eval()
+    head_importance = [np.zeros(len(head_mask)) for head_mask in head_masks]
+    neuron_importance = [np.zeros(len(neuron_mask)) for neuron_mask in neuron_masks]
+    try:
+        for batch in _iter_padded_batches(input_ids, labels, batch_size, model.config.pad_token_id or 0):
+            loss = model(**batch).loss
+            gradients = torch.autograd.grad(loss, head_masks + neuron_masks)
+            for idx in range(len(layers)):
+                head_importance[idx] += gradients[idx].abs().numpy()
+                neuron_importance[idx] += gradients[len(layers) + idx].abs().numpy()
+    finally:
+        for handle in handles:
+            handle.remove()
+        for name, param in model.named_parameters():
+            param.requires_grad = requires_grad[name]
+        model.train(was_training)
+
+    # Heads are compared across layers: their scores are normalized per layer (Michel et al., 2019)
+    head_importance = [importance / (np.linalg.norm(importance) + 1e-12) for importance in head_importance]
+    return head_importance, neuron_importance
+
+def prune_model(model: PreTrainedModel, sparsity: float, head_importance: List[np.ndarray], neuron_importance: List[np.ndarray],
+                n_original_heads: int, original_intermediate_size: int) -> None:
+    """
+    Remove the least important heads and intermediate neurons in place, until sparsity (fraction of the original ones) is reached.
+
+    Heads are ranked across layers and at least one head is kept per layer; they are removed with the transformers prune_heads API,
+    so that the pruned heads are recorded in the model config. Intermediate neurons are removed in the same number from every layer,
+    so that the model keeps a single intermediate_size and can be loaded with from_pretrained (and transformers.pipeline).
+    """
+    layers = model.base_model.encoder.layer
+
+    # Heads: indices of prune_heads are the original indices of the heads
+    n_heads_to_prune = int(round(sparsity * n_original_heads)) - (n_original_heads - count_heads(model))
+    candidates = []
+    for layer_idx, (layer, importance) in enumerate(zip(layers, head_importance)):
+        original_heads = [head for head in range(model.config.num_attention_heads) if head not in layer.attention.pruned_heads]
+        candidates.extend((score, layer_idx, original_head) for score, original_head in zip(importance, original_heads))
+    heads_to_prune: Dict[int, List[int]] = {}
+    for score, layer_idx, original_head in sorted(candidates):
+        if n_heads_to_prune <= 0:
+            break
+        n_remaining_heads = layers[layer_idx].attention.self.num_attention_heads - len(heads_to_prune.get(layer_idx, []))
+        if n_remaining_heads > 1:
+            heads_to_prune.setdefault(layer_idx, []).append(original_head)
+            n_heads_to_prune -= 1
+    model.prune_heads(heads_to_prune)
+
+    # Intermediate neurons: the most important ones of each layer are kept
+    intermediate_size = max(1, int(round((1 - sparsity) * original_intermediate_size)))
+    if intermediate_size < model.config.intermediate_size:
+        for layer, importance in zip(layers, neuron_importance):
+            kept_neurons = torch.as_tensor(np.sort(np.argsort(-importance, kind="stable")[:intermediate_size]), dtype=torch.long)
+            layer.intermediate.dense = prune_linear_layer(layer.intermediate.dense, kept_neurons, dim=0)
+            layer.output.dense = prune_linear_layer(layer.output.dense, kept_neurons, dim=1)
+        model.config.intermediate_size = intermediate_size
+
+def evaluate_model(model: PreTrainedModel, input_ids: List[List[int]], labels: np.ndarray, batch_size: int) -> Tuple[float, float]:
+    """Accuracy and average batched prediction latency (ms per review) of the model on labeled reviews."""
+    was_training = model.training
+    model.eval()
+    correct = 0
+    start_time = time.perf_counter()
+    with torch.inference_mode():
+        for batch in _iter_padded_batches(input_ids, labels, batch_size, model.config.pad_token_id or 0):
+            logits = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits
+            correct += int((logits.argmax(dim=-1) == batch["labels"]).sum())
+    latency_ms = (time.perf_counter() - start_time) * 1000 / max(len(input_ids), 1)
+    model.train(was_training)
+    return correct / max(len(input_ids), 1), latency_ms
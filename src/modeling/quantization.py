@@ -0,0 +1,36 @@
+import os
+import torch
+from torch import nn
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from colorama import Fore, Style
+from typing import Dict
+from src.modeling.export import export_torchscript, check_torchscript_parity, TRACE_SEQUENCE_LENGTH
+
+def quantize_model(model_path: str, output_path: str, parity_max_length: int) -> Dict[int, float]:
+    """
+    Quantize the Linear layers of a trained model to int8 (dynamic quantization: int8 weights, activations quantized on the fly).
+
+    The quantized model is saved as a TorchScript graph with the model configuration and the tokenizer,
+    so that it can be served by the torchscript backend of the BatchPredictor. The fp32 weights are not copied.
+    The graph is traced on short reviews: it is checked against the eager int8 model at the traced length and at parity_max_length.
+
+    Args:
+        model_path (str): Directory of the trained fp32 model.
+        output_path (str): Directory where the int8 model is saved.
+        parity_max_length (int): Longest reviews (in tokens) on which the graph is checked (capped by the positions of the model).
+
+    Returns:
+        Dict[int, float]: Maximum absolute logit difference between the graph and the eager int8 model for each checked length.
+    """
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    quantized_model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    os.makedirs(output_path, exist_ok=True)
+    torchscript_path = export_torchscript(model=quantized_model, output_dir=output_path)
+    model.config.save_pretrained(output_path)
+    AutoTokenizer.from_pretrained(model_path).save_pretrained(output_path)
+    print(Fore.MAGENTA + f"Int8 model saved at {output_path}." + Style.RESET_ALL)
+
+    max_length = min(parity_max_length, getattr(model.config, "max_position_embeddings", parity_max_length))
+    return check_torchscript_parity(model=quantized_model, torchscript_path=torchscript_path, sequence_lengths=sorted({TRACE_SEQUENCE_LENGTH, max_length}))
@@ -0,0 +1,120 @@
+import os
+import re
+import json
+import time
+import shutil
+import numpy as np
+from transformers import TrainerCallback, TrainerControl, TrainerState, TrainingArguments
+from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR
+from colorama import Fore, Style
+from typing import Dict, List, Optional
+
+class TrainingBudgetCallback(TrainerCallback):
+    """
+    Stop the training once a step or wall-clock budget is spent, even in the middle of an epoch.
+
+    The last step is evaluated and saved like the end of an epoch, so that the best model is still selected among all the evaluations.
+    The wall-clock budget is counted from the start of the current run (a resumed run gets a new budget).
+    """
+
+    def __init__(self, max_steps: Optional[int] = None, max_train_minutes: Optional[float] = None) -> None:
+        self.max_steps = max_steps
+        self.max_train_minutes = max_train_minutes
+        self.start_time: Optional[float] = None
+        self.stop_reason: Optional[str] = None
+
+    def on_train_begin(self, args: TrainingArguments, state: TrainerState, control: TrainerControl, **kwargs):
+        self.start_time = time.perf_counter()
+
+    def on_step_end(self, args: TrainingArguments, state: TrainerState, control: TrainerControl, **kwargs):
+        if self.max_steps is not None and state.global_step >= self.max_steps:
+            self.stop_reason = f"step budget of {self.max_steps} steps spent"
+        elif self.max_train_minutes is not None and time.perf_counter() - self.start_time >= 60 * self.max_train_minutes:
+            self.stop_reason = f"wall-clock budget of {self.max_train_minutes} min spent"
+        if self.stop_reason is not None:
+            control.should_training_stop = True
+            control.should_evaluate = True
+            control.should_save = True
+        return control
+
+    def on_epoch_end(self, args: TrainingArguments, state: TrainerState, control: TrainerControl, **kwargs):
+        # The last step was already evaluated and saved when the budget was spent
+        if self.stop_reason is not None:
+            control.should_evaluate = False
+            control.should_save = False
+        return control
+
+class KeepBestCheckpointsCallback(TrainerCallback):
+    """
+    Only keep the keep_best checkpoints with the best metric_for_best_model, plus the latest one (needed to resume an interrupted run).
+
+    Unlike save_total_limit, which keeps the most recent checkpoints, the checkpoints kept are the best ones of the run.
+    """
+
+    def __init__(self, keep_best: int) -> None:
+        self.keep_best = keep_best
+
+    def on_save(self, args: TrainingArguments, state: TrainerState, control: TrainerControl, **kwargs):
+        if not state.is_world_process_zero:
+            return
+        metric_key = args.metric_for_best_model if args.metric_for_best_model.startswith("eval_") else f"eval_{args.metric_for_best_model}"
+        metrics = {log["step"]: log[metric_key] for log in state.log_history if metric_key in log}
+        steps = sorted(int(match.group(1)) for match in (re.fullmatch(rf"{PREFIX_CHECKPOINT_DIR}-(\d+)", name) for name in os.listdir(args.output_dir))
+                       if match is not None)
+        # Ranked by metric (earliest checkpoint first on ties), checkpoints without evaluation last
+        ranked = sorted((step for step in steps if step in metrics),
+                        key=lambda step: (-metrics[step] if args.greater_is_better else metrics[step], step))
+        kept = set(ranked[:self.keep_best]) | {steps[-1]} if steps else set()
+        for step in steps:
+            if step not in kept:
+                shutil.rmtree(os.path.join(args.output_dir, f"{PREFIX_CHECKPOINT_DIR}-{step}"), ignore_errors=True)
+                print(f"{Fore.CYAN}Removed checkpoint {PREFIX_CHECKPOINT_DIR}-{step} (not among the {self.keep_best} best).{Style.RESET_ALL}")
+
+class TrialPruningCallback(TrainerCallback):
+    """
+    Median pruning of the trials of a hyperparameter sweep, run concurrently in separate processes.
+
+    After each evaluation, a trial records its validation accuracy in its progress file, and stops if its accuracy is below the median
+    accuracy of the other trials at the same epoch (once it ran grace_epochs epochs and min_trials other trials reached that epoch).
+    """
+
+    def __init__(self, progress_path: str, other_progress_paths: List[str], grace_epochs: int, min_trials: int, enabled: bool = True) -> None:
+        self.progress_path = progress_path
+        self.other_progress_paths = other_progress_paths
+        self.grace_epochs = grace_epochs
+        self.min_trials = min_trials
+        self.enabled = enabled
+        self.accuracies: List[float] = []
+        self.pruned = False
+
+    def _save_progress(self) -> None:
+        # Replaced atomically: the other trials never read a partial file
+        tmp_path = f"{self.progress_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"accuracies": self.accuracies, "pruned": self.pruned}, file)
+        os.replace(tmp_path, self.progress_path)
+
+    def _other_accuracies(self, epoch: int) -> List[float]:
+        accuracies = []
+        for progress_path in self.other_progress_paths:
+            try:
+                with open(progress_path, "r", encoding="utf-8") as file:
+                    progress = json.load(file)
+            except FileNotFoundError: # Trial not started yet
+                continue
+            if len(progress["accuracies"]) >= epoch:
+                accuracies.append(progress["accuracies"][epoch - 1])
+        return accuracies
+
+    def on_evaluate(self, args: TrainingArguments, state: TrainerState, control: TrainerControl, metrics: Dict[str, float] = None, **kwargs):
+        metric_key = args.metric_for_best_model if args.metric_for_best_model.startswith("eval_") else f"eval_{args.metric_for_best_model}"
+        self.accuracies.append(metrics[metric_key])
+        epoch = len(self.accuracies)
+        if self.enabled and epoch >= self.grace_epochs:
+            other_accuracies = self._other_accuracies(epoch)
+            if len(other_accuracies) >= self.min_trials and self.accuracies[-1] < float(np.median(other_accuracies)):
+                print(f"{Fore.RED}Trial pruned at epoch {epoch}: validation accuracy {self.accuracies[-1]:.4f} below the median {np.median(other_accuracies):.4f} of {len(other_accuracies)} other trials.{Style.RESET_ALL}")
+                self.pruned = True
+                control.should_training_stop = True
+        self._save_progress()
+        return control
@@ -1,42 +1,86 @@
 from src.config_loaders.preprocessing_config_loader import PreprocessingConfig
 from src.base_pipeline import BasePipeline
 from colorama import Fore, Style
-from src.utils.toolbox import load_csv_data
+from src.utils.toolbox import load_data, iter_data_chunks, save_data, DataWriter
 from src.utils.schema import DataSchema
-from sklearn.model_selection import train_test_split 
+import numpy as np
+import pandas as pd
 
 class PreprocessingPipeline(BasePipeline):
     def __init__(self, config: PreprocessingConfig):
         super().__init__(config)
-    
-    def run(self):
 
-        print(f"{Fore.GREEN}Starting preprocessing pipeline...{Style.RESET_ALL}")
+    def _assign_splits(self, reviews: pd.Series) -> np.ndarray:
+        # Stable hash of the review mapped to [0, 1): the same review always lands in the same split, without a global shuffle
+        positions = pd.util.hash_pandas_object(reviews, index=False).to_numpy() / np.float64(2**64)
+        validation_threshold = self.config.test_size + (1 - self.config.test_size) * self.config.validation_size
+        return np.where(positions < self.config.test_size, "test", np.where(positions < validation_threshold, "validation", "train"))
+
+    def _run_streaming(self) -> None:
+        label_mapping_dict = self.config.label_mapping_dict
+        split_writers = {"train": DataWriter(data_path=self.config.training_data_path),
+                         "validation": DataWriter(data_path=self.config.validation_data_path),
+                         "test": DataWriter(data_path=self.config.test_data_path)}
+        seen_labels = set()
+
+        self.profiler.start_stage("stream")
+        print(f"{Fore.YELLOW}Processing data from {self.config.url_data} by chunks of {self.config.chunk_size} rows...{Style.RESET_ALL}")
+        try:
+            for chunk in iter_data_chunks(data_source=self.config.url_data, chunk_size=self.config.chunk_size):
+                # Validate the label mapping incrementally
+                chunk_labels = set(chunk[DataSchema.SENTIMENT].unique())
+                unknown_labels = chunk_labels - set(label_mapping_dict.keys())
+                assert len(unknown_labels) == 0, f"Label mapping dict should match the unique sentiment values in the data. Found unknown values {list(unknown_labels)}, expected {list(label_mapping_dict.keys())}."
+                seen_labels |= chunk_labels
+                chunk[DataSchema.LABEL] = chunk[DataSchema.SENTIMENT].map(label_mapping_dict).astype(int)
+
+                # Write each split as it goes
+                splits = self._assign_splits(chunk[DataSchema.REVIEW])
+                for split, writer in split_writers.items():
+                    writer.write(chunk[splits == split])
+        finally:
+            for writer in split_writers.values():
+                writer.close()
+
+        assert seen_labels == set(label_mapping_dict.keys()), f"Label mapping dict should match the unique sentiment values in the data: {list(seen_labels)}. Got {list(label_mapping_dict.keys())} instead."
+        print(f"{Fore.CYAN}Data sizes after splitting - Train: {split_writers['train'].num_rows}, Validation: {split_writers['validation'].num_rows}, Test: {split_writers['test'].num_rows}{Style.RESET_ALL}")
 
+    def _run_in_memory(self) -> None:
         # Load the input data
+        self.profiler.start_stage("load")
         print(f"{Fore.YELLOW}Loading data from: {self.config.url_data}{Style.RESET_ALL}")
-        data = load_csv_data(data_source=self.config.url_data)
+        data = load_data(data_source=self.config.url_data)
         print(f"{Fore.CYAN}Data shape before preprocessing: {data.shape}{Style.RESET_ALL}")
 
         # Process the data
+        self.profiler.start_stage("process")
         print(f"{Fore.YELLOW}Cleaning data...{Style.RESET_ALL}")
         label_mapping_dict = self.config.label_mapping_dict
         assert set(label_mapping_dict.keys()) == set(data[DataSchema.SENTIMENT].unique()), f"Label mapping dict should match the unique sentiment values in the data: {data[DataSchema.SENTIMENT].unique()}. Got {list(label_mapping_dict.keys())} instead."
         data[DataSchema.LABEL] = data[DataSchema.SENTIMENT].map(label_mapping_dict).astype(int)
 
         # Split the data into training, validation, and test sets
+        self.profiler.start_stage("split")
         print(f"{Fore.YELLOW}Splitting data into training, validation, and test sets...{Style.RESET_ALL}")
+        from sklearn.model_selection import train_test_split # Only needed by the in-memory split
         train_data, test_data = train_test_split(data, test_size=self.config.test_size, random_state=42)
         train_data, val_data = train_test_split(train_data, test_size=self.config.validation_size, random_state=42)
         print(f"{Fore.CYAN}Data shapes after splitting - Train: {train_data.shape}, Validation: {val_data.shape}, Test: {test_data.shape}{Style.RESET_ALL}")
 
         # Save the split data to the specified paths
+        self.profiler.start_stage("save")
         print(f"{Fore.YELLOW}Saving data to specified paths...{Style.RESET_ALL}")
-        train_data.to_csv(self.config.training_data_path, index=False)
-        val_data.to_csv(self.config.validation_data_path, index=False)
-        test_data.to_csv(self.config.test_data_path, index=False)
+        save_data(train_data, self.config.training_data_path)
+        save_data(val_data, self.config.validation_data_path)
+        save_data(test_data, self.config.test_data_path)
 
-        print(f"{Fore.GREEN}Preprocessing pipeline completed successfully!{Style.RESET_ALL}")
+    def _run(self):
+
+        print(f"{Fore.GREEN}Starting preprocessing pipeline...{Style.RESET_ALL}")
 
-        
-        
\ No newline at end of file
+        if self.config.streaming:
+            self._run_streaming()
+        else:
+            self._run_in_memory()
+
+        print(f"{Fore.GREEN}Preprocessing pipeline completed successfully!{Style.RESET_ALL}")
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import glob
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, ALL_COMPLETED, wait
+import pandas as pd
+import torch
+from colorama import Fore, Style
+from src.config_loaders.scoring_config_loader import ScoringConfig
+from src.base_pipeline import BasePipeline
+from src.modeling.batch_predictor import BatchPredictor
+from src.utils.toolbox import iter_data_chunks, read_arrow_table, save_data, DataWriter
+from src.utils.schema import DataSchema, ScoringSchema
+from typing import Dict, Optional, Set
+
+# Model of a worker process, loaded once by _init_worker and reused for all its shards
+_worker_predictor: Optional[BatchPredictor] = None
+
+def _init_worker(predictor_kwargs: Dict, n_threads: int) -> None:
+    global _worker_predictor
+    # The workers share the cores: each one only uses its own threads
+    torch.set_num_threads(n_threads)
+    torch.set_num_interop_threads(1)
+    _worker_predictor = BatchPredictor(**predictor_kwargs)
+
+def _score_shard(data: pd.DataFrame, part_path: str) -> int:
+    predictions = _worker_predictor.predict(data[DataSchema.REVIEW].fillna("").astype(str).tolist())
+    data[ScoringSchema.PREDICTED_SENTIMENT] = [prediction["label"] for prediction in predictions]
+    data[ScoringSchema.SCORE] = [prediction["score"] for prediction in predictions]
+    # Written under a temporary name then renamed: a part file is either complete or absent, even if the job is killed
+    tmp_path = os.path.join(os.path.dirname(part_path), f"tmp-{os.path.basename(part_path)}")
+    save_data(data, tmp_path)
+    os.replace(tmp_path, part_path)
+    return len(data)
+
+class ScoringPipeline(BasePipeline):
+    """
+    Bulk offline scoring of unlabeled reviews.
+
+    The input file is streamed by shards of chunk_size rows, scored by a pool of worker processes (one model copy and
+    threads_per_worker torch threads each) and each scored shard is saved as a part file as soon as it is done.
+    The completed part files are the checkpoint: an interrupted job only scores the missing shards when run again.
+    The part files are finally merged in the input order into the output file.
+    """
+
+    def __init__(self, config: ScoringConfig):
+        super().__init__(config)
+        self.parts_dir = f"{config.output_data_path}.parts"
+        self.n_workers = config.n_workers or max(1, (os.cpu_count() or 1) // config.threads_per_worker)
+
+    def _part_path(self, shard_index: int) -> str:
+        return os.path.join(self.parts_dir, ScoringSchema.PART_FILE_FORMAT.format(shard_index))
+
+    def _job(self) -> Dict:
+        # Identity of the job: the part files of another job can not be reused
+        return {"input_data_path": self.config.input_data_path,
+                "chunk_size": self.config.chunk_size,
+                "model_path": self.config.model_path,
+                "backend": self.config.backend,
+                "max_input_length": self.config.max_input_length,
+                "sliding_window": self.config.sliding_window.model_dump()}
+
+    def _prepare_parts_dir(self) -> None:
+        job_path = os.path.join(self.parts_dir, ScoringSchema.JOB_FILE)
+        if self.config.resume and os.path.exists(job_path):
+            with open(job_path, "r", encoding="utf-8") as file:
+                previous_job = json.load(file)
+            if previous_job == self._job():
+                for tmp_path in glob.glob(os.path.join(self.parts_dir, "tmp-*")):
+                    os.remove(tmp_path)
+                n_completed_shards = len(glob.glob(os.path.join(self.parts_dir, "part-*")))
+                print(f"{Fore.CYAN}Resuming the interrupted job: {n_completed_shards} shard(s) already scored.{Style.RESET_ALL}")
+                return
+            print(f"{Fore.RED}Part files of a different job found in {self.parts_dir}. Restarting from scratch...{Style.RESET_ALL}")
+
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        os.makedirs(self.parts_dir)
+        with open(job_path, "w", encoding="utf-8") as file:
+            json.dump(self._job(), file, indent=2)
+
+    def _score(self) -> int:
+        predictor_kwargs = {"model_path": self.config.model_path,
+                            "batch_size": self.config.batch_size,
+                            "max_length": self.config.max_input_length,
+                            "backend": self.config.backend,
+                            "sliding_window": self.config.sliding_window.enabled,
+                            "window_overlap": self.config.sliding_window.window_overlap,
+                            "aggregation": self.config.sliding_window.aggregation,
+                            "num_threads": self.config.threads_per_worker}
+        # Inherited by the workers: no extra OpenMP or tokenizer threads competing for the cores of the other workers
+        os.environ["OMP_NUM_THREADS"] = str(self.config.threads_per_worker)
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+        # Spawned (not forked) workers: a fresh interpreter avoids inheriting the torch and tokenizers thread pools of the parent
+        executor = ProcessPoolExecutor(max_workers=self.n_workers,
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker,
+                                       initargs=(predictor_kwargs, self.config.threads_per_worker))
+        # At most two shards per worker are read ahead, so that memory does not grow with the input size
+        max_pending_shards = 2 * self.n_workers
+        pending: Set[Future] = set()
+        n_shards, n_scored_rows = 0, 0
+        start_time = time.perf_counter()
+
+        def collect(return_when: str) -> None:
+            nonlocal pending, n_scored_rows
+            finished, pending = wait(pending, return_when=return_when)
+            for future in finished:
+                n_scored_rows += future.result()
+            print(f"{Fore.CYAN}{n_scored_rows} reviews scored ({n_scored_rows / (time.perf_counter() - start_time):.1f} reviews/s){Style.RESET_ALL}")
+
+        try:
+            for shard_index, data in enumerate(iter_data_chunks(self.config.input_data_path, chunk_size=self.config.chunk_size)):
+                n_shards += 1
+                if os.path.exists(self._part_path(shard_index)):
+                    continue
+                assert DataSchema.REVIEW in data.columns, f"Column {DataSchema.REVIEW} not found in {self.config.input_data_path}."
+                if len(pending) >= max_pending_shards:
+                    collect(return_when=FIRST_COMPLETED)
+                pending.add(executor.submit(_score_shard, data, self._part_path(shard_index)))
+            if pending:
+                collect(return_when=ALL_COMPLETED)
+        finally:
+            # On failure or interruption, the shards not started are dropped: the completed ones are kept for the next run
+            executor.shutdown(wait=True, cancel_futures=True)
+        return n_shards
+
+    def _merge_parts(self, n_shards: int) -> int:
+        os.makedirs(os.path.dirname(self.config.output_data_path) or ".", exist_ok=True)
+        with DataWriter(data_path=self.config.output_data_path) as writer:
+            for shard_index in range(n_shards):
+                writer.write(read_arrow_table(self._part_path(shard_index)).to_pandas())
+        return writer.num_rows
+
+    def _run(self):
+
+        print(f"{Fore.GREEN}Starting scoring pipeline...{Style.RESET_ALL}")
+
+        # Find the shards already scored by an interrupted run of the same job
+        self.profiler.start_stage("checkpoint")
+        self._prepare_parts_dir()
+
+        # Score the missing shards in parallel
+        self.profiler.start_stage("score")
+        print(f"{Fore.YELLOW}Scoring {self.config.input_data_path} by shards of {self.config.chunk_size} rows with {self.n_workers} worker(s) of {self.config.threads_per_worker} thread(s)...{Style.RESET_ALL}")
+        n_shards = self._score()
+
+        # Merge the part files in the input order
+        self.profiler.start_stage("merge")
+        print(f"{Fore.YELLOW}Merging {n_shards} scored shard(s)...{Style.RESET_ALL}")
+        n_rows = self._merge_parts(n_shards=n_shards)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        print(Fore.MAGENTA + f"{n_rows} scored reviews saved at {self.config.output_data_path}." + Style.RESET_ALL)
+
+        print(f"{Fore.GREEN}Scoring pipeline completed successfully!{Style.RESET_ALL}")
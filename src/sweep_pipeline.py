@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import shutil
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import torch
+from colorama import Fore, Style
+from transformers import AutoTokenizer, TrainingArguments, Trainer, DataCollatorWithPadding
+from src.config_loaders.sweep_config_loader import SweepConfig
+from src.config_loaders.training_config_loader import training_config_loader, ModelConfig, TrainingConfig
+from src.base_pipeline import BasePipeline
+from src.modeling.model import ModelBuilder
+from src.modeling.training_callbacks import TrialPruningCallback
+from src.evaluators.accuracy import compute_accuracy
+from src.utils.tokenized_cache import load_tokenized_dataset
+from src.utils.toolbox import load_data
+from src.utils.schema import DataSchema, MetricSchema, SweepSchema
+from typing import Any, Dict, List
+
+def _init_worker(n_threads: int) -> None:
+    # The trials share the cores: each one only uses its own threads
+    torch.set_num_threads(n_threads)
+    torch.set_num_interop_threads(1)
+
+def _run_trial(trial_index: int, model_config: ModelConfig, training_config: TrainingConfig, tokenized_cache_dir: str,
+               id2label: Dict[int, str], n_epochs: int, seed: int, pruning: Dict[str, Any], progress_paths: List[str], trial_dir: str) -> Dict[str, Any]:
+    start_time = time.perf_counter()
+    model_builder = ModelBuilder(model_name=model_config.model_name,
+                                 num_labels=len(id2label),
+                                 id2label=id2label,
+                                 label2id={label: idx for idx, label in id2label.items()},
+                                 tokenizer_pretrained_model=model_config.tokenizer_pretrained_model,
+                                 learning_rate=model_config.learning_rate,
+                                 freeze_backbone=model_config.freeze_backbone,
+                                 dropout_rate=model_config.dropout_rate)
+    model, tokenizer = model_builder.initialize()
+
+    # Memory-mapped from the cache filled by the parent process: the trials never tokenize
+    datasets = [load_tokenized_dataset(data_path=data_path,
+                                       tokenizer=tokenizer,
+                                       tokenizer_name=model_config.tokenizer_pretrained_model,
+                                       max_length=model_config.max_input_length,
+                                       cache_dir=tokenized_cache_dir)
+                for data_path in (training_config.training_data_path, training_config.validation_data_path)]
+
+    pruning_callback = TrialPruningCallback(progress_path=progress_paths[trial_index],
+                                            other_progress_paths=[path for idx, path in enumerate(progress_paths) if idx != trial_index],
+                                            **pruning)
+    # No checkpoints: a trial is only evaluated, the best configuration is trained again by the training pipeline
+    args = TrainingArguments(output_dir=trial_dir,
+                             num_train_epochs=n_epochs,
+                             learning_rate=model_config.learning_rate,
+                             lr_scheduler_type='constant',
+                             per_device_train_batch_size=model_config.batch_size,
+                             per_device_eval_batch_size=model_config.batch_size,
+                             eval_strategy='epoch',
+                             logging_strategy='epoch',
+                             save_strategy="no",
+                             metric_for_best_model=MetricSchema.ACCURACY,
+                             group_by_length=True,
+                             seed=seed,
+                             report_to=[],
+                             disable_tqdm=True)
+    trainer = Trainer(model=model,
+                      args=args,
+                      train_dataset=datasets[0],
+                      eval_dataset=datasets[1],
+                      compute_metrics=compute_accuracy,
+                      tokenizer=tokenizer,
+                      data_collator=DataCollatorWithPadding(tokenizer=tokenizer),
+                      callbacks=[pruning_callback])
+    trainer.train()
+
+    accuracies = pruning_callback.accuracies
+    return {"status": SweepSchema.PRUNED if pruning_callback.pruned else SweepSchema.COMPLETED,
+            f"best_{MetricSchema.ACCURACY}": max(accuracies),
+            "best_epoch": int(np.argmax(accuracies)) + 1,
+            "n_epochs_run": len(accuracies),
+            "train_time_s": round(time.perf_counter() - start_time, 1)}
+
+class SweepPipeline(BasePipeline):
+    """
+    Hyperparameter sweep over the model parameters of the training config.
+
+    The training and validation sets are tokenized once per tokenizer and max_input_length and cached on disk, then the trials are
+    trained concurrently by a pool of worker processes (threads_per_worker torch threads each), memory-mapping the cached datasets.
+    Hopeless trials are stopped early by median pruning on the validation accuracy of each epoch. The trials are ranked in a leaderboard.
+    """
+
+    def __init__(self, config: SweepConfig):
+        super().__init__(config)
+        unknown_parameters = set(config.search_space) - set(ModelConfig.model_fields)
+        assert len(unknown_parameters) == 0, f"Unknown model parameters in the search space: {unknown_parameters}. Expected fields of {list(ModelConfig.model_fields)}."
+        self.training_config = training_config_loader(config_path=config.training_config_path)
+        self.n_workers = config.n_workers or max(1, (os.cpu_count() or 1) // config.threads_per_worker)
+
+    def _trial_params(self) -> List[Dict[str, Any]]:
+        names = list(self.config.search_space)
+        combinations = [dict(zip(names, values)) for values in itertools.product(*(self.config.search_space[name] for name in names))]
+        if self.config.search == "random" and self.config.n_trials is not None and self.config.n_trials < len(combinations):
+            indices = np.random.default_rng(self.config.seed).choice(len(combinations), size=self.config.n_trials, replace=False)
+            combinations = [combinations[idx] for idx in sorted(indices)]
+        return combinations
+
+    def _run(self):
+
+        print(f"{Fore.GREEN}Starting sweep pipeline...{Style.RESET_ALL}")
+
+        # Build the trials
+        self.profiler.start_stage("load")
+        trial_params = self._trial_params()
+        model_configs = [self.training_config.model.model_copy(update=params) for params in trial_params]
+        train_data = load_data(data_source=self.training_config.training_data_path, columns=[DataSchema.SENTIMENT])
+        id2label = dict(enumerate(sorted(train_data[DataSchema.SENTIMENT].unique())))
+        shutil.rmtree(self.config.sweep_dir, ignore_errors=True)
+        os.makedirs(self.config.sweep_dir)
+        print(f"{Fore.CYAN}{len(trial_params)} trial(s) over {', '.join(self.config.search_space)}.{Style.RESET_ALL}")
+
+        # Tokenize once per tokenizer and maximum length, shared by all the trials through the on-disk cache
+        self.profiler.start_stage("tokenize")
+        tokenized_cache_dir = self.training_config.tokenized_cache_dir or os.path.join(self.config.sweep_dir, "tokenized_cache")
+        for tokenizer_name, max_length in sorted({(config.tokenizer_pretrained_model, config.max_input_length) for config in model_configs}, key=str):
+            print(f"{Fore.YELLOW}Tokenizing the datasets with {tokenizer_name} (max_input_length {max_length})...{Style.RESET_ALL}")
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, use_fast=True)
+            for data_path in (self.training_config.training_data_path, self.training_config.validation_data_path):
+                load_tokenized_dataset(data_path=data_path, tokenizer=tokenizer, tokenizer_name=tokenizer_name, max_length=max_length, cache_dir=tokenized_cache_dir)
+
+        # Train the trials concurrently
+        self.profiler.start_stage("trials")
+        n_epochs = self.config.n_epochs or self.training_config.n_epochs
+        trial_dirs = [os.path.join(self.config.sweep_dir, SweepSchema.TRIAL_DIR_FORMAT.format(idx)) for idx in range(len(trial_params))]
+        progress_paths = [os.path.join(trial_dir, SweepSchema.PROGRESS_FILE) for trial_dir in trial_dirs]
+        for trial_dir in trial_dirs:
+            os.makedirs(trial_dir)
+        pruning = {"enabled": self.config.trial_pruning.enabled,
+                   "grace_epochs": self.config.trial_pruning.grace_epochs,
+                   "min_trials": self.config.trial_pruning.min_trials}
+        print(f"{Fore.YELLOW}Training {len(trial_params)} trial(s) of at most {n_epochs} epoch(s) with {self.n_workers} worker(s) of {self.config.threads_per_worker} thread(s)...{Style.RESET_ALL}")
+        # Inherited by the workers: no extra OpenMP or tokenizer threads competing for the cores of the other trials
+        os.environ["OMP_NUM_THREADS"] = str(self.config.threads_per_worker)
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        results = []
+        with ProcessPoolExecutor(max_workers=self.n_workers,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(self.config.threads_per_worker,)) as executor:
+            futures = {executor.submit(_run_trial, idx, model_configs[idx], self.training_config, tokenized_cache_dir, id2label,
+                                       n_epochs, self.config.seed, pruning, progress_paths, trial_dirs[idx]): idx
+                       for idx in range(len(trial_params))}
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    result = future.result()
+                except Exception as error:
+                    # A failed trial (e.g. out of memory with a large batch size) does not stop the sweep
+                    print(f"{Fore.RED}Trial {idx} failed: {error}{Style.RESET_ALL}")
+                    # Same columns as a completed trial: the leaderboard is still written when every trial fails
+                    result = {"status": SweepSchema.FAILED, f"best_{MetricSchema.ACCURACY}": None, "best_epoch": None, "n_epochs_run": None, "train_time_s": None}
+                results.append({"trial": idx, **trial_params[idx], **result})
+                if result["status"] != SweepSchema.FAILED:
+                    print(f"{Fore.CYAN}Trial {idx} {result['status']} ({len(results)}/{len(trial_params)}): {trial_params[idx]}, "
+                          f"best validation accuracy {result[f'best_{MetricSchema.ACCURACY}']:.4f} at epoch {result['best_epoch']}{Style.RESET_ALL}")
+
+        # Rank the trials
+        self.profiler.start_stage("leaderboard")
+        leaderboard = pd.DataFrame(results).sort_values(by=[f"best_{MetricSchema.ACCURACY}", "trial"], ascending=[False, True], na_position="last")
+        os.makedirs(os.path.dirname(self.config.leaderboard_output_file) or ".", exist_ok=True)
+        leaderboard.to_csv(self.config.leaderboard_output_file, index=False)
+        print(Fore.MAGENTA + f"CSV file with the leaderboard of the trials saved at {self.config.leaderboard_output_file}." + Style.RESET_ALL)
+        best_trial = leaderboard.iloc[0]
+        if best_trial["status"] != SweepSchema.FAILED:
+            best_params = {name: trial_params[int(best_trial["trial"])][name] for name in self.config.search_space}
+            print(f"{Fore.GREEN}Best trial {int(best_trial['trial'])}: {json.dumps(best_params)} (validation accuracy {best_trial[f'best_{MetricSchema.ACCURACY}']:.4f}){Style.RESET_ALL}")
+
+        print(f"{Fore.GREEN}Sweep pipeline completed successfully!{Style.RESET_ALL}")
@@ -1,66 +1,151 @@
 from src.config_loaders.testing_config_loader import TestingConfig
+import os
+import time
+import numpy as np
+import pandas as pd
 from colorama import Fore, Style
 from src.base_pipeline import BasePipeline
-from src.utils.toolbox import load_csv_data
-from src.utils.schema import DataSchema, MetricSchema
-from transformers import pipeline
+from src.utils.toolbox import load_data, get_directory_size_mb
+from src.utils.schema import DataSchema, MetricSchema, BackendSchema, ExportSchema
+from src.modeling.batch_predictor import BatchPredictor, softmax
+from src.modeling.quantization import quantize_model
 from src.evaluators.testing_metrics import MetricsCalculator
 from src.aws_services.s3_service import S3Manager
+from typing import Dict, Tuple
 
-class TestingPipeline(BasePipeline):    
+class TestingPipeline(BasePipeline):
     def __init__(self, config: TestingConfig):
         super().__init__(config)
-    
-    def run(self):
-
-        print(f"{Fore.GREEN}Starting testing pipeline...{Style.RESET_ALL}")
-
-        # Load the data
-        print(f"{Fore.YELLOW}Loading data from specified path...{Style.RESET_ALL}")
-        test_data = load_csv_data(data_source=self.config.test_data_path)
 
+    def _evaluate_model(self, model_path: str, backend: str, test_data: pd.DataFrame, metrics_output_file: str, variant: str) -> Tuple[Dict[str, float], float]:
         # Load the model
-        print(f"{Fore.YELLOW}Loading trained model from {self.config.trained_model_path}{Style.RESET_ALL}")
+        self.profiler.start_stage(f"{variant}.load_model")
+        print(f"{Fore.YELLOW}Loading trained model from {model_path}{Style.RESET_ALL}")
         try:
-            classifier = pipeline("text-classification", model=self.config.trained_model_path)
-            print(Fore.MAGENTA + f"Model and Configuration loaded from {self.config.trained_model_path}." + Style.RESET_ALL)
+            classifier = BatchPredictor(model_path=model_path,
+                                        batch_size=self.config.batch_size,
+                                        max_batch_tokens=self.config.max_batch_tokens,
+                                        max_length=self.config.max_input_length,
+                                        backend=backend,
+                                        sliding_window=self.config.sliding_window.enabled,
+                                        window_overlap=self.config.sliding_window.window_overlap,
+                                        aggregation=self.config.sliding_window.aggregation)
+            print(Fore.MAGENTA + f"Model and Configuration loaded from {model_path} ({backend} backend)." + Style.RESET_ALL)
 
-        except FileNotFoundError:
-            raise FileNotFoundError(Fore.RED + f"Could not find the model at {self.config.trained_model_path}. Please check the path and try again." + Style.RESET_ALL)
-        
-        # Make predictions on the test data
-        predictions = classifier(test_data[DataSchema.REVIEW].tolist(), truncation=True, max_length=512)
+        except (FileNotFoundError, OSError):
+            raise FileNotFoundError(Fore.RED + f"Could not find the model at {model_path}. Please check the path and try again." + Style.RESET_ALL)
+
+        # Labels encoded as the ids of the model
+        labels = [classifier.id2label[idx] for idx in range(len(classifier.id2label))]
+        unknown_labels = set(test_data[DataSchema.SENTIMENT].unique()) - set(labels)
+        assert len(unknown_labels) == 0, f"Labels {unknown_labels} of the test data are not labels of the model: {labels}."
+        true_ids = test_data[DataSchema.SENTIMENT].map({label: idx for idx, label in enumerate(labels)}).to_numpy(dtype=np.int64)
+        metrics_calculator = MetricsCalculator(labels=labels,
+                                               output_csv_path=metrics_output_file,
+                                               positive_label=self.config.metrics.positive_label)
+
+        # Make predictions on the test data by chunks (length-bucketed batches within a chunk), accumulating the metrics as they come
+        self.profiler.start_stage(f"{variant}.predict")
+        token_budget = f" and {self.config.max_batch_tokens} tokens per batch" if self.config.max_batch_tokens is not None else ""
+        print(f"{Fore.YELLOW}Predicting on {len(test_data)} reviews with batch size {self.config.batch_size}{token_budget}...{Style.RESET_ALL}")
+        start_time = time.perf_counter()
+        reviews = test_data[DataSchema.REVIEW].tolist()
+        for start in range(0, len(reviews), self.config.prediction_chunk_size):
+            end = start + self.config.prediction_chunk_size
+            probabilities = softmax(classifier.predict_logits(reviews[start:end]))
+            metrics_calculator.update(true_ids=true_ids[start:end], pred_ids=probabilities.argmax(axis=-1), probabilities=probabilities)
+        latency_ms = (time.perf_counter() - start_time) * 1000 / max(len(test_data), 1)
 
         # Evaluate the model
-        pred_labels = [pred[DataSchema.LABEL] for pred in predictions]
-        true_labels = test_data[DataSchema.SENTIMENT].tolist()
-        
-        metrics_calculator = MetricsCalculator(true_labels=true_labels, 
-                                               pred_labels=pred_labels,
-                                               output_csv_path=self.config.metrics_output_file)
+        self.profiler.start_stage(f"{variant}.metrics")
         metrics = metrics_calculator.calculate_metrics()
+        if self.config.metrics.threshold_sweep and self.config.metrics.positive_label is not None:
+            # Operating point chosen from the kept probabilities, without predicting again
+            thresholds = np.linspace(0.0, 1.0, self.config.metrics.n_thresholds + 2)[1:-1]
+            sweep = metrics_calculator.threshold_sweep(thresholds=thresholds)
+            sweep_output_file = f"{os.path.splitext(metrics_output_file)[0]}_threshold_sweep.csv"
+            sweep.to_csv(sweep_output_file, index=False)
+            best = sweep.loc[sweep[MetricSchema.F1_SCORE].idxmax()]
+            print(f"{Fore.CYAN}Best F1 score of {self.config.metrics.positive_label} over the threshold sweep: {best[MetricSchema.F1_SCORE]:.4f} at threshold {best['threshold']:.2f} (precision {best[MetricSchema.PRECISION]:.4f}, recall {best[MetricSchema.RECALL]:.4f}){Style.RESET_ALL}")
+            print(Fore.MAGENTA + f"CSV file with the metrics of each decision threshold saved at {sweep_output_file}." + Style.RESET_ALL)
         print(f"{Fore.CYAN}Model Evaluation Metrics: Accuracy: {metrics[MetricSchema.ACCURACY]:.4f}, Precision: {metrics[MetricSchema.PRECISION]:.4f}, Recall: {metrics[MetricSchema.RECALL]:.4f}, F1 Score: {metrics[MetricSchema.F1_SCORE]:.4f}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Average prediction latency: {latency_ms:.2f} ms per review{Style.RESET_ALL}")
+        return metrics, latency_ms
+
+    def _validate_model(self, metrics: Dict[str, float]) -> bool:
+        for condition in self.config.push_model_s3.conditions:
+            assert condition.metric in metrics, f"Metric {condition.metric} not found in the metrics dictionary."
+            if metrics[condition.metric] < condition.threshold :
+                print(f"{Fore.RED}Metric {condition.metric} ({metrics[condition.metric]}) does not meet the threshold of {condition.threshold}. Model will not be pushed to S3 bucket...{Style.RESET_ALL}")
+                return False
+        return True
+
+    def _run(self):
+
+        print(f"{Fore.GREEN}Starting testing pipeline...{Style.RESET_ALL}")
+
+        # Load the data
+        self.profiler.start_stage("load")
+        print(f"{Fore.YELLOW}Loading data from specified path...{Style.RESET_ALL}")
+        test_data = load_data(data_source=self.config.test_data_path, columns=[DataSchema.REVIEW, DataSchema.SENTIMENT])
+
+        # Evaluate the trained model
+        metrics, latency_ms = self._evaluate_model(model_path=self.config.trained_model_path,
+                                                   backend=self.config.backend,
+                                                   test_data=test_data,
+                                                   metrics_output_file=self.config.metrics_output_file,
+                                                   variant=self.config.backend)
+
+        # Quantize the trained model to int8 and evaluate it the same way
+        quantization_config = self.config.quantization
+        if quantization_config and quantization_config.enabled:
+            self.profiler.start_stage("int8.quantize")
+            print(f"{Fore.YELLOW}Quantizing the Linear layers of the trained model to int8...{Style.RESET_ALL}")
+            parity = quantize_model(model_path=self.config.trained_model_path, output_path=quantization_config.output_path,
+                                    parity_max_length=self.config.max_input_length)
+            print(f"{Fore.CYAN}Parity check (int8 torchscript vs eager int8), max absolute logit difference: "
+                  f"{', '.join(f'{max_abs_diff:.2e} at {length} tokens' for length, max_abs_diff in parity.items())}{Style.RESET_ALL}")
+            int8_parity_passed = max(parity.values()) <= quantization_config.parity_tolerance
+            if not int8_parity_passed:
+                print(f"{Fore.RED}The int8 graph exceeds the parity tolerance of {quantization_config.parity_tolerance}: it will not be pushed to S3.{Style.RESET_ALL}")
+            int8_metrics, int8_latency_ms = self._evaluate_model(model_path=quantization_config.output_path,
+                                                                 backend=BackendSchema.TORCHSCRIPT,
+                                                                 test_data=test_data,
+                                                                 metrics_output_file=quantization_config.metrics_output_file,
+                                                                 variant="int8")
+
+            # Record the size and the latency of both versions. The ONNX and TorchScript exports saved next to the fp32 weights
+            # are other copies of the same model: they are not counted in its size
+            fp32_size_mb = get_directory_size_mb(self.config.trained_model_path, exclude=[ExportSchema.ONNX_MODEL_FILE, ExportSchema.TORCHSCRIPT_MODEL_FILE])
+            report = pd.DataFrame([{"model": "fp32", "backend": self.config.backend, "path": self.config.trained_model_path, "size_mb": round(fp32_size_mb, 2), "latency_ms_per_review": round(latency_ms, 3), **metrics},
+                                   {"model": "int8", "backend": BackendSchema.TORCHSCRIPT, "path": quantization_config.output_path, "size_mb": round(get_directory_size_mb(quantization_config.output_path), 2), "latency_ms_per_review": round(int8_latency_ms, 3), **int8_metrics}])
+            report.to_csv(quantization_config.report_output_file, index=False)
+            print(Fore.MAGENTA + f"CSV file with the size and latency of the fp32 and int8 models saved at {quantization_config.report_output_file}." + Style.RESET_ALL)
 
         # Push the model to S3 Bucket if it reaches the required performances
+        self.profiler.start_stage("s3_push")
         if self.config.push_model_s3:
             push_model_s3_config = self.config.push_model_s3
             if push_model_s3_config.enabled:
                 if len(push_model_s3_config.conditions)>0:
                     print(f"{Fore.YELLOW}Verifying conditions to push model to S3 bucket...{Style.RESET_ALL}")
-                    model_valid = True
-                    for condition in push_model_s3_config.conditions:
-                        assert condition.metric in metrics, f"Metric {condition.metric} not found in the metrics dictionary."
-                        if metrics[condition.metric] < condition.threshold :
-                            model_valid = False
-                            print(f"{Fore.RED}Metric {condition.metric} ({metrics[condition.metric]}) does not meet the threshold of {condition.threshold}. Model will not be pushed to S3 bucket...{Style.RESET_ALL}")
-                            break
-                    
-                    if model_valid:
+                    if self._validate_model(metrics=metrics):
                         print(f"{Fore.GREEN}Model validation passed. Pushing model to S3 bucket...{Style.RESET_ALL}")
                         s3_manager = S3Manager(bucket_name=push_model_s3_config.bucket_name)
                         s3_manager.create_bucket_if_not_exists()
-                        s3_manager.upload_directory(local_directory_path=self.config.trained_model_path, 
-                                                    s3_prefix=push_model_s3_config.prefix)
+                        etags = s3_manager.upload_directory(local_directory_path=self.config.trained_model_path,
+                                                            s3_prefix=push_model_s3_config.prefix)
+                        # Written last: the inference service swaps in the new model once its manifest is there
+                        s3_manager.write_promotion_manifest(s3_prefix=push_model_s3_config.prefix, etags=etags, metadata={"metrics": metrics})
+
+                        # The int8 model is promoted along with the fp32 model if it satisfies the same conditions (and matches its eager model)
+                        if quantization_config and quantization_config.enabled and int8_parity_passed:
+                            print(f"{Fore.YELLOW}Verifying conditions to push int8 model to S3 bucket...{Style.RESET_ALL}")
+                            if self._validate_model(metrics=int8_metrics):
+                                print(f"{Fore.GREEN}Int8 model validation passed. Pushing int8 model to S3 bucket...{Style.RESET_ALL}")
+                                int8_etags = s3_manager.upload_directory(local_directory_path=quantization_config.output_path,
+                                                                         s3_prefix=quantization_config.s3_prefix)
+                                s3_manager.write_promotion_manifest(s3_prefix=quantization_config.s3_prefix, etags=int8_etags, metadata={"metrics": int8_metrics})
 
                 else:
                     print(f"{Fore.RED}No conditions specified for pushing model to S3 bucket. Skipping the push operation...{Style.RESET_ALL}")
@@ -69,6 +154,5 @@ class TestingPipeline(BasePipeline):
         else:
             print(f"{Fore.RED}Pushing model to S3 bucket is not configured. Skipping the push operation...{Style.RESET_ALL}")
 
-        
+
         print(f"{Fore.GREEN}Testing pipeline completed successfully!{Style.RESET_ALL}")
-            
\ No newline at end of file
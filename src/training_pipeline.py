@@ -1,90 +1,372 @@
+import os
+import copy
+import numpy as np
+import pandas as pd
+import torch
 from src.config_loaders.training_config_loader import TrainingConfig
 from colorama import Fore, Style
 from src.base_pipeline import BasePipeline
-from src.utils.toolbox import load_csv_data, plot_training_and_validation_curves, clean_checkpoints
-from datasets import Dataset
+from src.utils.toolbox import load_data, save_data, plot_training_and_validation_curves, clean_checkpoints, count_parameters, compute_model_files_hash, get_resumable_checkpoint
+from src.utils.training_manifest import compute_row_hashes, load_trained_row_hashes, save_training_manifest
+from src.aws_services.s3_service import S3Manager
+from src.utils.tokenized_cache import load_tokenized_dataset, tokenized_cache_key
 from src.modeling.model import ModelBuilder
-from src.utils.schema import DataSchema, MetricSchema
-from transformers import TrainingArguments, Trainer
+from src.modeling.frozen_features import FrozenTailModel, FrozenFeatureDataset, compute_frozen_features, frozen_features_cache_key, collate_frozen_features
+from src.utils.schema import DataSchema, MetricSchema, BackendSchema
+from transformers import AutoModelForSequenceClassification, TrainingArguments, Trainer, DataCollatorWithPadding, EarlyStoppingCallback
+from transformers.utils import is_torch_bf16_cpu_available
+from src.modeling.pruning import compute_importance, prune_model, evaluate_model, count_heads
 from src.evaluators.accuracy import compute_accuracy
+from src.modeling.export import export_model, check_parity, exported_model_path
+from src.modeling.training_callbacks import TrainingBudgetCallback, KeepBestCheckpointsCallback
+from src.modeling.distillation import DistillationTrainer, TEACHER_LOGITS_COLUMN, build_student_model, compute_teacher_logits, teacher_logits_cache_key
+from src.modeling.cpu_tuning import calibrate_cpu_settings
+from typing import Optional
 
 class TrainingPipeline(BasePipeline):    
     def __init__(self, config: TrainingConfig):
         super().__init__(config)
+
+    def _load_frozen_features(self, model, dataset, data_path: str, model_key: str) -> FrozenFeatureDataset:
+        dataset_key = tokenized_cache_key(data_path=data_path,
+                                          tokenizer_name=self.config.model.tokenizer_pretrained_model,
+                                          max_length=self.config.model.max_input_length)
+        cache_key = frozen_features_cache_key(model_name=model_key,
+                                              first_trainable_layer=ModelBuilder.FIRST_TRAINABLE_LAYER,
+                                              dataset_key=dataset_key)
+        cache_path = os.path.join(self.config.frozen_features_cache_dir, f"{os.path.splitext(os.path.basename(data_path))[0]}_{cache_key}")
+        return compute_frozen_features(model=model,
+                                       dataset=dataset,
+                                       first_trainable_layer=ModelBuilder.FIRST_TRAINABLE_LAYER,
+                                       cache_path=cache_path,
+                                       batch_size=self.config.model.batch_size)
+
+    def _load_teacher_logits(self, dataset, data_path: str) -> np.ndarray:
+        distillation_config = self.config.distillation
+        cache_path = None
+        if distillation_config.teacher_logits_cache_dir is not None:
+            dataset_key = tokenized_cache_key(data_path=data_path,
+                                              tokenizer_name=self.config.model.tokenizer_pretrained_model,
+                                              max_length=self.config.model.max_input_length)
+            cache_key = teacher_logits_cache_key(teacher_model_path=distillation_config.teacher_model_path, dataset_key=dataset_key)
+            cache_path = os.path.join(distillation_config.teacher_logits_cache_dir, f"{os.path.splitext(os.path.basename(data_path))[0]}_{cache_key}.npy")
+        return compute_teacher_logits(teacher_model_path=distillation_config.teacher_model_path,
+                                      dataset=dataset,
+                                      batch_size=self.config.model.batch_size,
+                                      cache_path=cache_path)
     
-    def run(self):
+    def _prepare_incremental_data(self, train_data: pd.DataFrame, row_hashes: np.ndarray, base_model_hash: Optional[str]) -> Optional[str]:
+        # Training rows of the incremental run: the rows the base model was not trained on, plus a replay sample of the rows it was trained on
+        incremental_config = self.config.incremental
+        if base_model_hash is None:
+            print(f"{Fore.CYAN}No previous run to start from: training on all the {len(train_data)} rows.{Style.RESET_ALL}")
+            return self.config.training_data_path
+        trained_row_hashes = load_trained_row_hashes(manifest_path=incremental_config.manifest_path, model_hash=base_model_hash)
+        if trained_row_hashes is None:
+            print(f"{Fore.CYAN}The rows the promoted model was trained on are not in the training manifest: training it on all the {len(train_data)} rows.{Style.RESET_ALL}")
+            return self.config.training_data_path
+        is_new = ~np.isin(row_hashes, trained_row_hashes)
+        n_new_rows = int(is_new.sum())
+        if n_new_rows == len(train_data):
+            print(f"{Fore.CYAN}No row trained on by the promoted model: training on all the {len(train_data)} rows.{Style.RESET_ALL}")
+            return self.config.training_data_path
+        if n_new_rows == 0:
+            return None
+
+        old_indices = np.flatnonzero(~is_new)
+        n_replay_rows = min(len(old_indices), int(round(incremental_config.replay_ratio * n_new_rows)))
+        replay_indices = np.random.default_rng(incremental_config.seed).choice(old_indices, size=n_replay_rows, replace=False)
+        selected_indices = np.sort(np.concatenate([np.flatnonzero(is_new), replay_indices]))
+        data_path = os.path.join(self.config.train_dir, "incremental_train.arrow")
+        os.makedirs(self.config.train_dir, exist_ok=True)
+        save_data(train_data.iloc[selected_indices], data_path)
+        print(f"{Fore.CYAN}Incremental run on {n_new_rows} new rows and {n_replay_rows} replayed rows (out of {len(old_indices)} already trained on).{Style.RESET_ALL}")
+        return data_path
+
+    def _prune(self, train_dataset, validation_dataset, tokenizer) -> None:
+        pruning_config = self.config.pruning
+        output_path = pruning_config.output_path
+        model = AutoModelForSequenceClassification.from_pretrained(self.config.best_model_path)
+        n_samples = min(pruning_config.n_validation_samples, len(validation_dataset))
+        input_ids = validation_dataset["input_ids"][:n_samples]
+        labels = np.asarray(validation_dataset[DataSchema.LABEL][:n_samples])
+        n_original_heads, original_intermediate_size = count_heads(model), model.config.intermediate_size
+        batch_size = self.config.model.batch_size
+
+        def record(step: str, sparsity: float) -> float:
+            accuracy, latency_ms = evaluate_model(model=model, input_ids=input_ids, labels=labels, batch_size=batch_size)
+            report.append({"step": step, "sparsity": round(sparsity, 4), "n_heads": count_heads(model), "intermediate_size": model.config.intermediate_size,
+                           "n_parameters": count_parameters(model), MetricSchema.ACCURACY: round(accuracy, 4), "latency_ms_per_review": round(latency_ms, 3)})
+            print(f"{Fore.CYAN}Pruning step {step} (sparsity {sparsity:.0%}): {count_heads(model)} heads, intermediate size {model.config.intermediate_size}, "
+                  f"{count_parameters(model):,} parameters, accuracy {accuracy:.4f}, latency {latency_ms:.2f} ms per review{Style.RESET_ALL}")
+            return latency_ms
+
+        report = []
+        record(step="0", sparsity=0.0)
+        for step in range(1, pruning_config.n_steps + 1):
+            # Gradual pruning: the importance of the remaining heads and neurons is scored again after each step
+            sparsity = pruning_config.target_sparsity * step / pruning_config.n_steps
+            head_importance, neuron_importance = compute_importance(model=model, input_ids=input_ids, labels=labels, batch_size=batch_size)
+            prune_model(model=model, sparsity=sparsity, head_importance=head_importance, neuron_importance=neuron_importance,
+                        n_original_heads=n_original_heads, original_intermediate_size=original_intermediate_size)
+            latency_ms = record(step=str(step), sparsity=sparsity)
+            if pruning_config.latency_budget_ms is not None and latency_ms <= pruning_config.latency_budget_ms:
+                print(f"{Fore.GREEN}Latency budget of {pruning_config.latency_budget_ms} ms per review reached at sparsity {sparsity:.0%}.{Style.RESET_ALL}")
+                break
+        else:
+            if pruning_config.latency_budget_ms is not None:
+                print(f"{Fore.RED}Latency budget of {pruning_config.latency_budget_ms} ms per review not reached at the target sparsity of {pruning_config.target_sparsity:.0%}.{Style.RESET_ALL}")
+
+        # A short fine-tuning recovers part of the accuracy lost by pruning
+        if pruning_config.fine_tune_epochs > 0:
+            print(f"{Fore.YELLOW}Fine-tuning the pruned model for {pruning_config.fine_tune_epochs} epoch(s)...{Style.RESET_ALL}")
+            for param in model.parameters():
+                param.requires_grad = True
+            args = TrainingArguments(output_dir=os.path.join(self.config.train_dir, "pruning"),
+                                     num_train_epochs=pruning_config.fine_tune_epochs,
+                                     learning_rate=self.config.model.learning_rate,
+                                     lr_scheduler_type='constant',
+                                     per_device_train_batch_size=batch_size,
+                                     save_strategy="no",
+                                     logging_strategy="epoch",
+                                     group_by_length=True)
+            Trainer(model=model, args=args, train_dataset=train_dataset, tokenizer=tokenizer, data_collator=DataCollatorWithPadding(tokenizer=tokenizer)).train()
+            record(step="fine_tuned", sparsity=report[-1]["sparsity"])
+
+        # The pruned model is a regular, smaller Hugging Face model (pruned heads and intermediate size are stored in its config)
+        model.save_pretrained(output_path)
+        tokenizer.save_pretrained(output_path)
+        print(Fore.MAGENTA + f"Pruned model saved at {output_path}." + Style.RESET_ALL)
+        if pruning_config.replace_best_model:
+            model.save_pretrained(self.config.best_model_path)
+            tokenizer.save_pretrained(self.config.best_model_path)
+            print(f"{Fore.CYAN}The pruned model replaces the best model at {self.config.best_model_path}.{Style.RESET_ALL}")
+        os.makedirs(os.path.dirname(pruning_config.report_output_file) or ".", exist_ok=True)
+        pd.DataFrame(report).to_csv(pruning_config.report_output_file, index=False)
+        print(Fore.MAGENTA + f"CSV file with the accuracy and latency of each pruning step saved at {pruning_config.report_output_file}." + Style.RESET_ALL)
+    
+    def _run(self):
         
         print(f"{Fore.GREEN}Starting training pipeline...{Style.RESET_ALL}")
 
+        # Inter-op threads can only be set before the first parallel work of torch
+        compute_config = self.config.compute
+        if compute_config.num_interop_threads is not None:
+            torch.set_num_interop_threads(compute_config.num_interop_threads)
+
         # Load the data
+        self.profiler.start_stage("load")
         print(f"{Fore.YELLOW}Loading data from specified paths...{Style.RESET_ALL}")
-        train_data = load_csv_data(data_source=self.config.training_data_path)
-        validation_data = load_csv_data(data_source=self.config.validation_data_path)
+        incremental_config = self.config.incremental
+        use_incremental = incremental_config is not None and incremental_config.enabled
+        # The reviews are also needed to identify the new rows of an incremental run
+        train_data = load_data(data_source=self.config.training_data_path,
+                               columns=[DataSchema.REVIEW, DataSchema.SENTIMENT, DataSchema.LABEL] if use_incremental else [DataSchema.SENTIMENT, DataSchema.LABEL])
 
-        # Create the dataset objects
-        print(f"{Fore.YELLOW}Creating dataset objects...{Style.RESET_ALL}")
-        train_dataset = Dataset.from_pandas(train_data)
-        validation_dataset = Dataset.from_pandas(validation_data)
+        # Select the rows of an incremental run, which fine-tunes the last promoted model
+        training_data_path, n_epochs = self.config.training_data_path, self.config.n_epochs
+        if use_incremental:
+            self.profiler.start_stage("incremental")
+            if incremental_config.bucket_name and incremental_config.s3_prefix:
+                print(f"{Fore.YELLOW}Downloading the promoted model from s3://{incremental_config.bucket_name}/{incremental_config.s3_prefix}...{Style.RESET_ALL}")
+                s3_manager = S3Manager(bucket_name=incremental_config.bucket_name)
+                manifest = s3_manager.read_promotion_manifest(incremental_config.s3_prefix)
+                s3_manager.download_directory(s3_prefix=incremental_config.s3_prefix,
+                                              local_directory_path=incremental_config.base_model_path,
+                                              rel_paths=manifest["files"] if manifest is not None else None)
+            from_scratch = not os.path.isdir(incremental_config.base_model_path)
+            # The promoted model is identified by its content: the manifest only lists the rows of the models it knows
+            base_model_hash = None if from_scratch else compute_model_files_hash(incremental_config.base_model_path)
+            row_hashes = compute_row_hashes(train_data)
+            training_data_path = self._prepare_incremental_data(train_data=train_data, row_hashes=row_hashes, base_model_hash=base_model_hash)
+            if training_data_path is None:
+                print(f"{Fore.RED}No new rows since the last run. Skipping the training...{Style.RESET_ALL}")
+                return
+            if not from_scratch:
+                n_epochs = incremental_config.n_epochs or self.config.n_epochs
 
         # Create the model and the tokenizer
+        self.profiler.start_stage("build_model")
         print(f"{Fore.YELLOW}Creating model and tokenizer...{Style.RESET_ALL}")
         num_labels = train_data[DataSchema.LABEL].nunique() 
         label2id = {label: idx for idx, label in enumerate(sorted(train_data[DataSchema.SENTIMENT].unique()))}
         id2label = {idx: label for label, idx in label2id.items()}
-        model_builder = ModelBuilder(model_name=self.config.model.model_name,
+        distillation_config = self.config.distillation
+        use_distillation = distillation_config is not None and distillation_config.enabled
+        model_name = model_key = self.config.model.model_name
+        if use_distillation and distillation_config.student_model_name is not None:
+            model_name = model_key = distillation_config.student_model_name
+        elif use_incremental and not from_scratch:
+            print(f"{Fore.CYAN}Starting from the promoted model {incremental_config.base_model_path}.{Style.RESET_ALL}")
+            # The path of the promoted model does not change between runs: its cached features are keyed by its content
+            model_name, model_key = incremental_config.base_model_path, base_model_hash
+        model_builder = ModelBuilder(model_name=model_name,
                                      num_labels=num_labels,
                                      id2label=id2label,
                                      label2id=label2id,
                                      tokenizer_pretrained_model=self.config.model.tokenizer_pretrained_model,
                                      learning_rate=self.config.model.learning_rate,
-                                     freeze_backbone=self.config.model.freeze_backbone,
+                                     # The student is small and starts far from the teacher: all its layers are trained
+                                     freeze_backbone=self.config.model.freeze_backbone and not use_distillation,
                                      dropout_rate=self.config.model.dropout_rate)
-        model, tokenizer = model_builder.initialize()
-
-        train_dataset = train_dataset.map(
-                            lambda batch: tokenizer(batch[DataSchema.REVIEW], padding=True, truncation=True, max_length=self.config.model.max_input_length),
-                            batched=True,
-                            batch_size=None
-                        )
-        validation_dataset = validation_dataset.map(
-                            lambda batch: tokenizer(batch[DataSchema.REVIEW], padding=True, truncation=True, max_length=self.config.model.max_input_length),
-                            batched=True,
-                            batch_size=None
-                        )
-        
-        # Train the model
-        print(f"{Fore.YELLOW}Starting the training loop...{Style.RESET_ALL}")
-        args = TrainingArguments(
+        if use_distillation and distillation_config.student_model_name is None:
+            print(f"{Fore.YELLOW}Building a {distillation_config.student_num_layers}-layer student from the teacher {distillation_config.teacher_model_path}...{Style.RESET_ALL}")
+            model = build_student_model(teacher_model_path=distillation_config.teacher_model_path, num_layers=distillation_config.student_num_layers)
+            assert {int(idx): label for idx, label in model.config.id2label.items()} == id2label, f"The labels of the teacher ({model.config.id2label}) do not match the labels of the training data ({id2label})."
+            tokenizer = model_builder.build_tokenizer()
+        else:
+            model, tokenizer = model_builder.initialize()
+
+        # Create the tokenized (unpadded) dataset objects, memory-mapped from the cache when available
+        self.profiler.start_stage("tokenize")
+        print(f"{Fore.YELLOW}Creating tokenized dataset objects...{Style.RESET_ALL}")
+        train_dataset = load_tokenized_dataset(data_path=training_data_path,
+                                               tokenizer=tokenizer,
+                                               tokenizer_name=self.config.model.tokenizer_pretrained_model,
+                                               max_length=self.config.model.max_input_length,
+                                               cache_dir=self.config.tokenized_cache_dir)
+        validation_dataset = load_tokenized_dataset(data_path=self.config.validation_data_path,
+                                                    tokenizer=tokenizer,
+                                                    tokenizer_name=self.config.model.tokenizer_pretrained_model,
+                                                    max_length=self.config.model.max_input_length,
+                                                    cache_dir=self.config.tokenized_cache_dir)
+
+        tokenized_train_dataset, tokenized_validation_dataset = train_dataset, validation_dataset
+
+        # With a frozen backbone, run the frozen prefix of the network once and only train the unfrozen tail on its cached outputs
+        use_frozen_features = self.config.model.freeze_backbone and self.config.frozen_features_cache_dir is not None and not use_distillation
+        if use_frozen_features:
+            self.profiler.start_stage("frozen_features")
+            print(f"{Fore.YELLOW}Preparing frozen features for head-only training...{Style.RESET_ALL}")
+            train_dataset = self._load_frozen_features(model=model, dataset=train_dataset, data_path=training_data_path, model_key=model_key)
+            validation_dataset = self._load_frozen_features(model=model, dataset=validation_dataset, data_path=self.config.validation_data_path, model_key=model_key)
+            trained_model = FrozenTailModel(model=model, first_trainable_layer=ModelBuilder.FIRST_TRAINABLE_LAYER)
+            data_collator = collate_frozen_features
+        else:
+            trained_model = model
+            data_collator = DataCollatorWithPadding(tokenizer=tokenizer) # Pad each batch to its own longest review
+
+        # With distillation, the soft labels of the teacher are computed once and attached to the training reviews
+        if use_distillation:
+            self.profiler.start_stage("teacher_logits")
+            train_teacher_logits = self._load_teacher_logits(dataset=train_dataset, data_path=training_data_path)
+            validation_teacher_logits = self._load_teacher_logits(dataset=validation_dataset, data_path=self.config.validation_data_path)
+            teacher_accuracy = float((validation_teacher_logits.argmax(axis=-1) == np.asarray(validation_dataset[DataSchema.LABEL])).mean())
+            print(f"{Fore.CYAN}Teacher validation accuracy: {teacher_accuracy:.4f}. Student parameters: {count_parameters(model):,}{Style.RESET_ALL}")
+            # Only the model inputs are kept: the teacher logits are not an argument of the model and would be dropped by the Trainer
+            model_columns = [column for column in train_dataset.column_names if column in tokenizer.model_input_names or column == DataSchema.LABEL]
+            train_dataset = train_dataset.select_columns(model_columns).add_column(TEACHER_LOGITS_COLUMN, train_teacher_logits.tolist())
+            validation_dataset = validation_dataset.select_columns(model_columns)
+
+        # Train the model (all the cores by default, or the threads and workers chosen by the calibration below)
+        use_bf16 = compute_config.bf16
+        if use_bf16 and not torch.cuda.is_available() and not is_torch_bf16_cpu_available():
+            print(f"{Fore.RED}bf16 autocast is not supported on this CPU. Training in fp32...{Style.RESET_ALL}")
+            use_bf16 = False
+        training_args = dict(
                 output_dir=self.config.train_dir,
                 overwrite_output_dir=True,
-                num_train_epochs=self.config.n_epochs,
+                num_train_epochs=n_epochs,
                 learning_rate=self.config.model.learning_rate,
                 lr_scheduler_type='constant', # Disable learning rate warmup (can result to a fast overfitting)
                 per_device_train_batch_size=self.config.model.batch_size,
                 per_device_eval_batch_size=self.config.model.batch_size,
+                # Large effective batches without the memory of large batches
+                gradient_accumulation_steps=compute_config.gradient_accumulation_steps,
+                bf16=use_bf16,
+                dataloader_pin_memory=torch.cuda.is_available(), # Pinned memory only speeds up copies to a GPU
                 eval_strategy='epoch',
                 logging_strategy='epoch',
                 save_strategy="epoch",
                 load_best_model_at_end=True,
                 metric_for_best_model=MetricSchema.ACCURACY,
-                greater_is_better=True 
-            )
-        
-        trainer = Trainer(
-                model=model,
-                args=args,
-                train_dataset=train_dataset,
-                eval_dataset=validation_dataset,
-                compute_metrics=compute_accuracy,
-                tokenizer=tokenizer
+                greater_is_better=True,
+                group_by_length=not use_frozen_features, # Batch reviews of similar length together to reduce padding
+                remove_unused_columns=not use_distillation,
+                # The patience counter of early stopping is restored along with an interrupted run
+                restore_callback_states_from_checkpoint=True
             )
-        
-        if self.config.clean_train_dir_before_training:
+
+        def build_trainer(model: torch.nn.Module, n_workers: int, callbacks: list) -> Trainer:
+            # The number of dataloader workers is only known after the calibration
+            args = TrainingArguments(dataloader_num_workers=n_workers, dataloader_persistent_workers=n_workers > 0, **training_args)
+            trainer_kwargs = dict(model=model,
+                                  args=args,
+                                  train_dataset=train_dataset,
+                                  eval_dataset=validation_dataset,
+                                  compute_metrics=compute_accuracy,
+                                  tokenizer=tokenizer,
+                                  data_collator=data_collator,
+                                  callbacks=callbacks)
+            if use_distillation:
+                return DistillationTrainer(temperature=distillation_config.temperature, alpha=distillation_config.alpha, **trainer_kwargs)
+            return Trainer(**trainer_kwargs)
+
+        # Time a few training steps of a copy of the model with candidate thread and worker counts, and train with the fastest
+        n_threads = compute_config.num_threads or os.cpu_count() or 1
+        n_workers = compute_config.dataloader_num_workers or 0
+        calibration = None
+        if compute_config.calibrate and (compute_config.num_threads is None or compute_config.dataloader_num_workers is None):
+            self.profiler.start_stage("calibrate")
+            print(f"{Fore.YELLOW}Calibrating the torch threads and dataloader workers on {compute_config.calibration_steps} training steps per configuration...{Style.RESET_ALL}")
+            calibration_model = copy.deepcopy(trained_model)
+            n_threads, n_workers, calibration = calibrate_cpu_settings(build_trainer=lambda n_workers: build_trainer(model=calibration_model, n_workers=n_workers, callbacks=[]),
+                                                                       n_steps=compute_config.calibration_steps,
+                                                                       num_threads=compute_config.num_threads,
+                                                                       dataloader_num_workers=compute_config.dataloader_num_workers)
+            del calibration_model
+        torch.set_num_threads(n_threads)
+
+        callbacks = []
+        budget_callback = None
+        early_stopping_callback = None
+        early_stopping_config = self.config.early_stopping
+        if early_stopping_config is not None:
+            if early_stopping_config.enabled:
+                early_stopping_callback = EarlyStoppingCallback(early_stopping_patience=early_stopping_config.patience,
+                                                                early_stopping_threshold=early_stopping_config.min_delta)
+                callbacks.append(early_stopping_callback)
+            if early_stopping_config.max_steps is not None or early_stopping_config.max_train_minutes is not None:
+                budget_callback = TrainingBudgetCallback(max_steps=early_stopping_config.max_steps, max_train_minutes=early_stopping_config.max_train_minutes)
+                callbacks.append(budget_callback)
+            if early_stopping_config.keep_best_checkpoints is not None:
+                callbacks.append(KeepBestCheckpointsCallback(keep_best=early_stopping_config.keep_best_checkpoints))
+
+        # The Trainer reseeds the random number generators used by the calibration (dropout, data order): the run stays reproducible
+        trainer = build_trainer(model=trained_model, n_workers=n_workers, callbacks=callbacks)
+        compute_settings = {"bf16": use_bf16,
+                            "gradient_accumulation_steps": compute_config.gradient_accumulation_steps,
+                            "effective_batch_size": self.config.model.batch_size * compute_config.gradient_accumulation_steps,
+                            "n_cores": os.cpu_count(),
+                            "num_threads": torch.get_num_threads(),
+                            "num_interop_threads": torch.get_num_interop_threads(),
+                            "dataloader_num_workers": trainer.args.dataloader_num_workers,
+                            "calibration": calibration}
+        self.profiler.annotate(compute=compute_settings)
+        print(f"{Fore.CYAN}Training with {compute_settings['num_threads']} thread(s) and {compute_settings['dataloader_num_workers']} dataloader worker(s) on {compute_settings['n_cores']} core(s), "
+              f"{'bf16 autocast' if use_bf16 else 'fp32'}, effective batch size {compute_settings['effective_batch_size']}.{Style.RESET_ALL}")
+
+        self.profiler.start_stage("train")
+        print(f"{Fore.YELLOW}Starting the training loop...{Style.RESET_ALL}")
+        # An interrupted run is resumed from its latest checkpoint (model, optimizer, scheduler, RNG states and position in the data)
+        resume_checkpoint = get_resumable_checkpoint(train_dir=self.config.train_dir) if self.config.resume_from_checkpoint else None
+        if resume_checkpoint is not None:
+            print(f"{Fore.CYAN}Resuming the interrupted run from {resume_checkpoint}.{Style.RESET_ALL}")
+        elif self.config.clean_train_dir_before_training:
             clean_checkpoints(train_dir=self.config.train_dir)
 
-        trainer.train()
+        trainer.train(resume_from_checkpoint=resume_checkpoint)
+        if budget_callback is not None and budget_callback.stop_reason is not None:
+            print(f"{Fore.CYAN}Training stopped at epoch {trainer.state.epoch:.2f} of {n_epochs}: {budget_callback.stop_reason}.{Style.RESET_ALL}")
+        elif early_stopping_callback is not None and trainer.state.global_step < trainer.state.max_steps:
+            print(f"{Fore.CYAN}Training stopped early at epoch {trainer.state.epoch:.2f} of {n_epochs}: no improvement of the validation accuracy for {early_stopping_config.patience} evaluations.{Style.RESET_ALL}")
+        if trainer.state.best_metric is not None:
+            print(f"{Fore.CYAN}Best checkpoint: {trainer.state.best_model_checkpoint} (validation accuracy {trainer.state.best_metric:.4f}).{Style.RESET_ALL}")
+        else: # e.g. the training budget ended the run before the first evaluation
+            print(f"{Fore.RED}No evaluation before the end of the training: the model of the last step is kept.{Style.RESET_ALL}")
 
         # Save the training and validation curves (loss and accuracy)
+        self.profiler.start_stage("save")
         training_logs = trainer.state.log_history
         train_losses = [log["loss"] for log in training_logs if "loss" in log]
         val_losses = [log["eval_loss"] for log in training_logs if "eval_loss" in log]
@@ -94,8 +376,44 @@ class TrainingPipeline(BasePipeline):
                                             val_metrics=val_accuracies,
                                             save_path=self.config.training_curve_path)
         
-        # Save the best model for Testing and Inference
-        trainer.save_model(self.config.best_model_path)
+        # Save the best model for Testing and Inference (graphs exported from a previous model are removed)
+        for backend in (BackendSchema.ONNX, BackendSchema.TORCHSCRIPT):
+            if os.path.exists(exported_model_path(model_path=self.config.best_model_path, backend=backend)):
+                os.remove(exported_model_path(model_path=self.config.best_model_path, backend=backend))
+        if use_frozen_features:
+            # The best tail weights were loaded in place into the full model, which is saved as a regular Hugging Face model
+            model.save_pretrained(self.config.best_model_path)
+            tokenizer.save_pretrained(self.config.best_model_path)
+        else:
+            trainer.save_model(self.config.best_model_path)
+
+        # Prune the best model, scored and evaluated on the validation split
+        if self.config.pruning and self.config.pruning.enabled:
+            self.profiler.start_stage("prune")
+            print(f"{Fore.YELLOW}Pruning the attention heads and intermediate neurons of the best model...{Style.RESET_ALL}")
+            self._prune(train_dataset=tokenized_train_dataset, validation_dataset=tokenized_validation_dataset, tokenizer=tokenizer)
+
+        if use_incremental:
+            # All the rows of the training file are now trained on by this model (keyed by its final weights): once it is promoted,
+            # the next run only trains on the rows added after this one. If it is not promoted, the next run still trains on them
+            save_training_manifest(manifest_path=incremental_config.manifest_path, row_hashes=row_hashes, model_path=self.config.best_model_path)
+
+        # Export the best model to an optimized inference graph, checked against the eager model on the validation split
+        if self.config.export and self.config.export.enabled:
+            self.profiler.start_stage("export")
+            print(f"{Fore.YELLOW}Exporting the best model to {self.config.export.format}...{Style.RESET_ALL}")
+            backend = export_model(model_path=self.config.best_model_path, export_format=self.config.export.format)
+            validation_texts = load_data(data_source=self.config.validation_data_path, columns=[DataSchema.REVIEW])[DataSchema.REVIEW].tolist()[:self.config.export.parity_n_samples]
+            parity = check_parity(model_path=self.config.best_model_path,
+                                  backend=backend,
+                                  texts=validation_texts,
+                                  max_length=self.config.model.max_input_length,
+                                  batch_size=self.config.model.batch_size)
+            print(f"{Fore.CYAN}Parity check ({backend} vs eager) on {len(validation_texts)} validation reviews: max absolute logit difference: {parity['max_abs_diff']:.2e}, label agreement: {parity['label_agreement']:.4f}{Style.RESET_ALL}")
+            if parity["max_abs_diff"] > self.config.export.parity_tolerance:
+                # A graph that does not match the eager model must not be served
+                print(f"{Fore.RED}The exported graph exceeds the parity tolerance of {self.config.export.parity_tolerance}. Removing it, the model can only be served with the pytorch backend...{Style.RESET_ALL}")
+                os.remove(exported_model_path(model_path=self.config.best_model_path, backend=backend))
         
         print(f"{Fore.GREEN}Training pipeline completed successfully!{Style.RESET_ALL}")
 
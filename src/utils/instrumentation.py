@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from colorama import Fore, Style
+from src.config_loaders.instrumentation_config import InstrumentationConfig
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+def get_current_rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return round(int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def get_peak_rss_mb() -> Optional[float]:
+    # High-water mark of the resident memory since the last reset (Linux), or since the start of the process
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024, 1) # Bytes on macOS, kilobytes on Linux
+
+def reset_peak_rss() -> bool:
+    # Linux only: writing 5 to clear_refs resets the high-water mark, so that the peak of each stage is measured on its own
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+class StageProfiler:
+    """
+    Record the wall time, CPU time and peak resident memory of the named stages of a pipeline run.
+
+    Stages are sequential: starting a stage ends the previous one. Each stage can also be traced by the torch profiler.
+    Settings of the run (e.g. the thread configuration of the training) can be recorded with annotate.
+    At the end of the run, a summary is printed and a JSON report is saved in the report directory.
+    """
+
+    def __init__(self, pipeline_name: str, config: Optional[InstrumentationConfig]) -> None:
+        self.pipeline_name = pipeline_name
+        self.config = config
+        self.enabled = config is not None and config.enabled
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{pipeline_name}"
+        self.stages: List[Dict] = []
+        self.annotations: Dict = {}
+        self._current: Optional[Dict] = None
+        self._torch_profiler = None
+        self._run_peak_rss_mb = None
+        self._peak_resettable = False
+        self._started_at = datetime.now(timezone.utc).isoformat()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+
+    def start_stage(self, name: str) -> None:
+        if not self.enabled:
+            return
+        self.end_stage()
+
+        self._peak_resettable = reset_peak_rss()
+        self._current = {"name": name,
+                         "start_wall": time.perf_counter(),
+                         "start_cpu": time.process_time(),
+                         "rss_start_mb": get_current_rss_mb()}
+        if self.config.torch_profiler and (not self.config.torch_profiler_stages or name in self.config.torch_profiler_stages):
+            import torch
+            self._torch_profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self._torch_profiler.start()
+
+    def annotate(self, **values) -> None:
+        """Record settings or results of the run in its report (under annotations)."""
+        self.annotations.update(values)
+
+    def end_stage(self) -> None:
+        if self._current is None:
+            return
+        stage, self._current = self._current, None
+        wall_s = time.perf_counter() - stage.pop("start_wall")
+        cpu_s = time.process_time() - stage.pop("start_cpu")
+        peak_rss_mb = get_peak_rss_mb()
+        stage.update({"wall_s": round(wall_s, 4),
+                      "cpu_s": round(cpu_s, 4),
+                      # Above 1 when several threads work in parallel (e.g. torch intra-op threads)
+                      "cpu_utilization": round(cpu_s / wall_s, 3) if wall_s > 0 else None,
+                      "rss_end_mb": get_current_rss_mb(),
+                      "peak_rss_mb": peak_rss_mb,
+                      "peak_rss_scope": "stage" if self._peak_resettable else "process"})
+        if peak_rss_mb is not None:
+            self._run_peak_rss_mb = max(self._run_peak_rss_mb or 0.0, peak_rss_mb)
+
+        if self._torch_profiler is not None:
+            self._torch_profiler.stop()
+            os.makedirs(self.config.trace_dir, exist_ok=True)
+            trace_file = os.path.join(self.config.trace_dir, f"{self.run_id}_{stage['name']}.json")
+            self._torch_profiler.export_chrome_trace(trace_file)
+            stage["trace_file"] = trace_file
+            self._torch_profiler = None
+        self.stages.append(stage)
+
+    def report(self, status: str) -> Dict:
+        wall_s = time.perf_counter() - self._start_wall
+        return {"pipeline": self.pipeline_name,
+                "run_id": self.run_id,
+                "started_at": self._started_at,
+                "status": status,
+                "wall_s": round(wall_s, 4),
+                "cpu_s": round(time.process_time() - self._start_cpu, 4),
+                "peak_rss_mb": self._run_peak_rss_mb,
+                # Time spent outside the named stages (imports of lazy modules, prints, ...)
+                "unattributed_wall_s": round(wall_s - sum(stage["wall_s"] for stage in self.stages), 4),
+                "stages": self.stages,
+                "annotations": self.annotations}
+
+    def finish(self, status: str) -> Optional[str]:
+        """End the last stage, print the summary of the run and save its report. Returns the path of the report."""
+        if not self.enabled:
+            return None
+        self.end_stage()
+        report = self.report(status=status)
+
+        print(f"{Fore.CYAN}Stage timings of {self.pipeline_name} ({status}, {report['wall_s']:.2f} s):{Style.RESET_ALL}")
+        for stage in self.stages:
+            peak_rss = f"{stage['peak_rss_mb']:.0f} MB" if stage["peak_rss_mb"] is not None else "n/a"
+            print(f"{Fore.CYAN} - {stage['name']}: {stage['wall_s']:.2f} s wall, {stage['cpu_s']:.2f} s CPU, peak RSS {peak_rss}{Style.RESET_ALL}")
+
+        os.makedirs(self.config.report_dir, exist_ok=True)
+        report_file = os.path.join(self.config.report_dir, f"{self.run_id}.json")
+        with open(report_file, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(Fore.MAGENTA + f"Run report saved at {report_file}." + Style.RESET_ALL)
+        return report_file
+
+class Counters:
+    """Thread-safe counters of a long-running service (requests, batches, model time, ...)."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + value
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._values)
@@ -7,4 +7,36 @@ class MetricSchema:
     ACCURACY = "accuracy"
     PRECISION = "precision"
     RECALL = "recall"
-    F1_SCORE = "f1_score"
\ No newline at end of file
+    F1_SCORE = "f1_score"
+
+class BackendSchema:
+    PYTORCH = "pytorch"
+    ONNX = "onnx"
+    TORCHSCRIPT = "torchscript"
+
+class ExportSchema:
+    ONNX_MODEL_FILE = "model.onnx"
+    TORCHSCRIPT_MODEL_FILE = "model.pt"
+
+class DataFormatSchema:
+    CSV = ".csv"
+    PARQUET = ".parquet"
+    ARROW = ".arrow"
+    ALL = [CSV, PARQUET, ARROW]
+
+class AggregationSchema:
+    MEAN = "mean"
+    CONFIDENCE = "confidence"
+
+class ScoringSchema:
+    PREDICTED_SENTIMENT = "predicted_sentiment"
+    SCORE = "score"
+    PART_FILE_FORMAT = "part-{:06d}.arrow"
+    JOB_FILE = "job.json"
+
+class SweepSchema:
+    TRIAL_DIR_FORMAT = "trial-{:03d}"
+    PROGRESS_FILE = "progress.json"
+    COMPLETED = "completed"
+    PRUNED = "pruned"
+    FAILED = "failed"
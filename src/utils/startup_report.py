@@ -0,0 +1,43 @@
+import os
+import re
+import sys
+import subprocess
+from colorama import Fore, Style
+from typing import Dict, List
+
+# Line of the output of python -X importtime: "import time: <self us> | <cumulative us> | <indented module name>"
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def measure_import_times(modules: List[str]) -> List[Dict]:
+    """
+    Import the modules in a fresh interpreter with `python -X importtime` (nothing is cached by the current process).
+
+    Returns:
+        List[Dict]: Self and cumulative import time (s) and nesting depth of each imported module, in import order.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "; ".join(f"import {module}" for module in modules)],
+                            capture_output=True, text=True, cwd=os.getcwd())
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not import {modules}:\n{result.stderr[-2000:]}")
+    import_times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match is not None:
+            import_times.append({"module": match.group(4),
+                                 "self_s": int(match.group(1)) / 1e6,
+                                 "cumulative_s": int(match.group(2)) / 1e6,
+                                 "depth": (len(match.group(3)) - 1) // 2})
+    return import_times
+
+def print_import_report(modules: List[str], top: int = 15) -> None:
+    """Print the total import time of the modules and the slowest top-level packages they pull in."""
+    import_times = measure_import_times(modules)
+    total_s = sum(entry["cumulative_s"] for entry in import_times if entry["depth"] == 0)
+    print(f"{Fore.CYAN}Import time of {', '.join(modules)}: {total_s:.2f} s ({len(import_times)} modules){Style.RESET_ALL}")
+    # Top-level packages (e.g. torch, not torch.nn) so that the same time is not counted twice
+    packages: Dict[str, float] = {}
+    for entry in import_times:
+        if "." not in entry["module"]:
+            packages[entry["module"]] = packages.get(entry["module"], 0.0) + entry["cumulative_s"]
+    for package, cumulative_s in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{Fore.CYAN} - {package}: {cumulative_s:.3f} s{Style.RESET_ALL}")
@@ -0,0 +1,40 @@
+import random
+from typing import List, Tuple
+
+_SUBJECTS = ["The movie", "This film", "The plot", "The acting", "The director", "The soundtrack",
+             "The ending", "The cast", "The script", "The cinematography", "The main character", "The pacing"]
+_POSITIVE = ["brilliant", "moving", "wonderful", "gripping", "beautifully shot", "hilarious",
+             "unforgettable", "superb", "a real pleasure to watch", "far better than I expected"]
+_NEGATIVE = ["boring", "predictable", "awful", "painfully slow", "poorly written", "forgettable",
+             "terrible", "a complete mess", "a waste of two hours", "far worse than I expected"]
+_FILLERS = ["I watched it last weekend with a couple of friends.",
+            "It reminded me of the classics from the seventies.",
+            "<br /><br />",
+            "Some scenes were shot in a small town I used to visit as a kid.",
+            "My wife and I had read the book before seeing it.",
+            "The theater was almost empty that night.",
+            "I had high hopes after reading the reviews on this site."]
+_PUNCTUATION = [".", "!", "...", ". Really."]
+
+def generate_synthetic_reviews(n_reviews: int, n_words: int, seed: int = 42) -> Tuple[List[str], List[str]]:
+    """
+    Generate IMDB-like reviews of a given length (in words), half of them positive and half negative.
+
+    Returns:
+        Tuple[List[str], List[str]]: The reviews and their sentiment ("positive" or "negative").
+    """
+    rng = random.Random(seed)
+    reviews, sentiments = [], []
+    for idx in range(n_reviews):
+        sentiment = "positive" if idx % 2 == 0 else "negative"
+        adjectives = _POSITIVE if sentiment == "positive" else _NEGATIVE
+        words = []
+        while len(words) < n_words:
+            if rng.random() < 0.3:
+                sentence = rng.choice(_FILLERS)
+            else:
+                sentence = f"{rng.choice(_SUBJECTS)} was {rng.choice(adjectives)}{rng.choice(_PUNCTUATION)}"
+            words.extend(sentence.split())
+        reviews.append(" ".join(words[:n_words]))
+        sentiments.append(sentiment)
+    return reviews, sentiments
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import shutil
+from datasets import Dataset, load_from_disk
+from transformers import PreTrainedTokenizerBase
+from colorama import Fore, Style
+from typing import Optional
+from src.utils.toolbox import load_dataset, compute_file_hash
+from src.utils.schema import DataSchema
+
+def tokenized_cache_key(data_path: str, tokenizer_name: str, max_length: Optional[int]) -> str:
+    """Cache key of a tokenized dataset: tokenizer name, maximum length and content hash of the data file."""
+    key = f"{tokenizer_name}|{max_length}|{compute_file_hash(data_path)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+def tokenize_dataset(dataset: Dataset, tokenizer: PreTrainedTokenizerBase, max_length: Optional[int]) -> Dataset:
+    # No padding here: batches are padded on the fly to their own longest review by the data collator
+    return dataset.map(
+                lambda batch: tokenizer(batch[DataSchema.REVIEW], truncation=True, max_length=max_length),
+                batched=True,
+                # Results stay in memory: a memory-mapped source file must not get cache files written next to it
+                keep_in_memory=True
+            )
+
+def load_tokenized_dataset(data_path: str,
+                           tokenizer: PreTrainedTokenizerBase,
+                           tokenizer_name: str,
+                           max_length: Optional[int],
+                           cache_dir: Optional[str] = None) -> Dataset:
+    """
+    Load a data file as a tokenized (unpadded) dataset.
+
+    If a cache directory is given, the tokenized Arrow dataset is saved on disk under a key built from the tokenizer name,
+    the maximum length and the content hash of the data file. Later runs memory-map the cached dataset instead of re-tokenizing.
+
+    Args:
+        data_path (str): Path of the data file to tokenize.
+        tokenizer (PreTrainedTokenizerBase): Tokenizer used to encode the reviews.
+        tokenizer_name (str): Name of the tokenizer (part of the cache key).
+        max_length (Optional[int]): Maximum number of tokens per review.
+        cache_dir (Optional[str]): Directory of the tokenized datasets cache. No caching if None.
+
+    Returns:
+        Dataset: Dataset with the original columns plus the tokenizer outputs.
+    """
+    if cache_dir is None:
+        return tokenize_dataset(load_dataset(data_path=data_path), tokenizer, max_length)
+
+    cache_path = os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(data_path))[0]}_{tokenized_cache_key(data_path, tokenizer_name, max_length)}")
+    if os.path.isdir(cache_path):
+        print(Fore.MAGENTA + f"Loading tokenized dataset from cache {cache_path}." + Style.RESET_ALL)
+        return load_from_disk(cache_path)
+
+    dataset = tokenize_dataset(load_dataset(data_path=data_path), tokenizer, max_length)
+
+    # Write to a temporary directory first so that an interrupted run never leaves a partial cache entry
+    tmp_path = f"{cache_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    dataset.save_to_disk(tmp_path)
+    os.replace(tmp_path, cache_path)
+    print(Fore.MAGENTA + f"Tokenized dataset cached at {cache_path}." + Style.RESET_ALL)
+    return load_from_disk(cache_path)
@@ -1,9 +1,54 @@
 import pandas as pd
 from colorama import Fore, Style
-import matplotlib.pyplot as plt
 import os
 import shutil
+import hashlib
+import json
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional
+from src.utils.schema import DataSchema, DataFormatSchema
+
+# datasets, transformers, matplotlib and pyarrow are only imported by the functions using them: they are slow to import
+# and most pipelines (and the inference service) do not need them
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from datasets import Dataset
+
+# Typed columns of the data files (other columns keep the type inferred from the data), as pyarrow type aliases
+COLUMN_TYPES = {DataSchema.REVIEW: "string",
+                DataSchema.SENTIMENT: "string",
+                DataSchema.LABEL: "int64"}
+
+def get_data_format(data_path: str) -> str:
+    data_format = os.path.splitext(data_path.split("?")[0])[1].lower()
+    assert data_format in DataFormatSchema.ALL, f"Unsupported data file extension '{data_format}' for {data_path}. Expected one of {DataFormatSchema.ALL}."
+    return data_format
+
+def to_arrow_table(data: pd.DataFrame) -> "pa.Table":
+    import pyarrow as pa
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    schema = pa.schema([pa.field(name, pa.type_for_alias(COLUMN_TYPES[name]) if name in COLUMN_TYPES else table.schema.field(name).type)
+                        for name in table.column_names])
+    return table.cast(schema)
+
+def read_arrow_table(data_path: str, columns: Optional[List[str]] = None) -> "pa.Table":
+    import pyarrow as pa
+    # Arrow IPC stream files are memory-mapped: the columns are read without copy
+    table = pa.ipc.open_stream(pa.memory_map(data_path)).read_all()
+    return table.select(columns) if columns is not None else table
+
+def load_data(data_source: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a CSV, Parquet or Arrow IPC stream file (format given by the file extension), optionally only some of its columns."""
+    data_format = get_data_format(data_source)
+    try :
+        if data_format == DataFormatSchema.PARQUET:
+            return pd.read_parquet(data_source, columns=columns)
+        if data_format == DataFormatSchema.ARROW:
+            return read_arrow_table(data_source, columns=columns).to_pandas()
+        return pd.read_csv(data_source, usecols=columns)
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            Fore.RED + f"Could not find the data file at {data_source}. Please check the path/URL and try again." + Style.RESET_ALL)
 
 def load_csv_data(data_source: str) -> pd.DataFrame:
     try :
@@ -13,11 +58,117 @@ def load_csv_data(data_source: str) -> pd.DataFrame:
         raise FileNotFoundError(
             Fore.RED + f"Could not find the CSV file at {data_source}. Please check the path/URL and try again." + Style.RESET_ALL)
 
+def iter_data_chunks(data_source: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    data_format = get_data_format(data_source)
+    try :
+        if data_format == DataFormatSchema.PARQUET:
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(data_source).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        elif data_format == DataFormatSchema.ARROW:
+            for batch in read_arrow_table(data_source).to_batches(max_chunksize=chunk_size):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(data_source, chunksize=chunk_size)
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            Fore.RED + f"Could not find the data file at {data_source}. Please check the path/URL and try again." + Style.RESET_ALL)
+
+def save_data(data: pd.DataFrame, data_path: str) -> None:
+    """Save a DataFrame as a CSV, Parquet or Arrow IPC stream file (format given by the file extension)."""
+    with DataWriter(data_path=data_path) as writer:
+        writer.write(data)
+
+class DataWriter:
+    """Incremental writer of a CSV, Parquet or Arrow IPC stream file, chunk by chunk (format given by the file extension)."""
+
+    def __init__(self, data_path: str) -> None:
+        self.data_path = data_path
+        self.data_format = get_data_format(data_path)
+        self.num_rows = 0
+        self._started = False
+        self._sink = None
+        self._writer = None
+
+    def write(self, data: pd.DataFrame) -> None:
+        if self.data_format == DataFormatSchema.CSV:
+            # Header only with the first rows of the file
+            data.to_csv(self.data_path, mode="a" if self._started else "w", header=not self._started, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = to_arrow_table(data)
+            if self._writer is None:
+                if self.data_format == DataFormatSchema.PARQUET:
+                    self._writer = pq.ParquetWriter(self.data_path, table.schema)
+                else:
+                    self._sink = pa.OSFile(self.data_path, "wb")
+                    self._writer = pa.ipc.new_stream(self._sink, table.schema)
+            self._writer.write_table(table)
+        self._started = True
+        self.num_rows += len(data)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+    def __enter__(self) -> "DataWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def load_dataset(data_path: str) -> "Dataset":
+    """
+    Load a data file as a datasets.Dataset.
+
+    Arrow IPC stream files are memory-mapped (zero copy) and Parquet files are read straight into an Arrow table,
+    CSV files go through pandas.
+    """
+    from datasets import Dataset
+    from datasets.table import InMemoryTable
+    data_format = get_data_format(data_path)
+    if not os.path.isfile(data_path):
+        raise FileNotFoundError(Fore.RED + f"Could not find the data file at {data_path}. Please check the path and try again." + Style.RESET_ALL)
+    if data_format == DataFormatSchema.ARROW:
+        return Dataset.from_file(data_path)
+    if data_format == DataFormatSchema.PARQUET:
+        import pyarrow.parquet as pq
+        return Dataset(InMemoryTable(pq.read_table(data_path)))
+    return Dataset.from_pandas(load_csv_data(data_source=data_path))
+
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def compute_model_files_hash(model_path: str) -> str:
+    """Content hash of the config and weights files of a model directory (identity of a model whose path does not change)."""
+    sha256 = hashlib.sha256()
+    for file_name in sorted(os.listdir(model_path)):
+        if file_name == "config.json" or file_name.endswith((".safetensors", ".bin")):
+            sha256.update(f"{file_name}:{compute_file_hash(os.path.join(model_path, file_name))}".encode("utf-8"))
+    return sha256.hexdigest()
+
+def get_directory_size_mb(directory_path: str, exclude: Optional[List[str]] = None) -> float:
+    """Total size of the files of a directory (in MB), without the files named in exclude."""
+    exclude = set(exclude or [])
+    size = sum(path.stat().st_size for path in Path(directory_path).rglob("*") if path.is_file() and path.name not in exclude)
+    return size / (1024 * 1024)
+
+def count_parameters(model) -> int:
+    return sum(param.numel() for param in model.parameters())
+
 def plot_training_and_validation_curves(train_losses: list, 
                                         val_losses: list,
                                         val_metrics: list,
                                         save_path: str) -> None:
-    
+    import matplotlib.pyplot as plt
+
     _, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
 
     # loss plot
@@ -49,4 +200,18 @@ def clean_checkpoints(train_dir: str) -> None:
         print(f"Removing old checkpoint: {path}")
         shutil.rmtree(path, ignore_errors=True)
 
-    print(Fore.MAGENTA + f"Old checkpoints in {train_dir} removed." + Style.RESET_ALL)
\ No newline at end of file
+    print(Fore.MAGENTA + f"Old checkpoints in {train_dir} removed." + Style.RESET_ALL)
+
+def get_resumable_checkpoint(train_dir: str) -> Optional[str]:
+    """Latest checkpoint of an interrupted training run in train_dir (None if there is none, or if the last run completed)."""
+    if not os.path.isdir(train_dir):
+        return None
+    from transformers.trainer_utils import get_last_checkpoint
+    checkpoint_path = get_last_checkpoint(train_dir)
+    if checkpoint_path is None:
+        return None
+    with open(os.path.join(checkpoint_path, "trainer_state.json"), "r", encoding="utf-8") as file:
+        trainer_state = json.load(file)
+    # A run stopped early (patience or budget) is complete as well: its control state was saved with the stop flag
+    stopped = trainer_state.get("stateful_callbacks", {}).get("TrainerControl", {}).get("args", {}).get("should_training_stop", False)
+    return checkpoint_path if trainer_state["global_step"] < trainer_state["max_steps"] and not stopped else None
@@ -0,0 +1,53 @@
+import json
+import os
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from colorama import Fore, Style
+from typing import Optional
+from src.utils.schema import DataSchema
+from src.utils.toolbox import compute_model_files_hash
+
+# Number of trained models whose rows are kept in the manifest: the promoted model may be older than the last trained one
+MAX_MANIFEST_MODELS = 5
+
+def compute_row_hashes(data: pd.DataFrame) -> np.ndarray:
+    """Content hash (uint64) of each labeled review: the same review with the same sentiment always gets the same hash, wherever it is in the file."""
+    return pd.util.hash_pandas_object(data[[DataSchema.REVIEW, DataSchema.SENTIMENT]], index=False).to_numpy()
+
+def _load_manifest(manifest_path: str) -> dict:
+    if not os.path.exists(manifest_path):
+        return {"models": {}}
+    with open(manifest_path, "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    # Manifests not keyed by model (single row set) do not tell which model learned the rows
+    return manifest if "models" in manifest else {"models": {}}
+
+def load_trained_row_hashes(manifest_path: str, model_hash: str) -> Optional[np.ndarray]:
+    """Content hashes of the rows the model with this content hash (see compute_model_files_hash) was trained on (None if unknown)."""
+    entry = _load_manifest(manifest_path)["models"].get(model_hash)
+    if entry is None:
+        return None
+    return np.array([int(row_hash, 16) for row_hash in entry["row_hashes"]], dtype=np.uint64)
+
+def save_training_manifest(manifest_path: str, row_hashes: np.ndarray, model_path: str) -> None:
+    """
+    Save the content hashes of the rows the model at model_path was trained on, keyed by the content hash of the model.
+
+    The rows only count as trained for this model: a model rejected by the testing gate is never the base of an incremental run,
+    so the next run, starting from the promoted model, still trains on them.
+    """
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    manifest = _load_manifest(manifest_path)
+    manifest["models"][compute_model_files_hash(model_path)] = {"updated_at": datetime.now(timezone.utc).isoformat(),
+                                                                "model_path": model_path,
+                                                                "n_rows": len(row_hashes),
+                                                                "row_hashes": [f"{int(row_hash):016x}" for row_hash in np.unique(row_hashes)]}
+    recent_models = sorted(manifest["models"].items(), key=lambda item: item[1]["updated_at"], reverse=True)[:MAX_MANIFEST_MODELS]
+    manifest["models"] = dict(recent_models)
+    # Written to a temporary file first: an interrupted run keeps the previous manifest
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, manifest_path)
+    print(Fore.MAGENTA + f"Training manifest of {len(row_hashes)} rows saved at {manifest_path}." + Style.RESET_ALL)
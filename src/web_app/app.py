@@ -1,31 +1,69 @@
+import json
+import urllib.request
+import urllib.error
 import streamlit as st
-from transformers import pipeline
 
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
-from src.aws_services.s3_service import S3Manager
 from src.config_loaders.inference_config_loader import inference_config_loader
 
 @st.cache_resource
-def load_pipeline():
-    """Download model from S3 and load the HuggingFace pipeline."""
-
-    # Load configuration
+def load_service_url() -> str:
+    """Read the URL of the inference service (started by `python main.py inference`)."""
     config = inference_config_loader(config_path="config/inference_config.json")
-    s3_manager = S3Manager(bucket_name=config.bucket_name)
-    s3_manager.download_directory(s3_prefix=config.s3_model_prefix, local_directory_path=config.local_model_dir)
+    return config.server.url
+
+def service_status() -> dict:
+    """Status of the inference service: the model is loaded in the background once the service has started."""
+    try:
+        with urllib.request.urlopen(f"{load_service_url()}/health", timeout=5) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        # 503 with the status of the service while the model is loading (or if it could not be loaded). Other errors
+        # (e.g. 502/504 of a proxy) may not have a JSON body
+        if error.code == 503:
+            try:
+                return json.loads(error.read())
+            except ValueError:
+                pass
+        return {"status": "failed", "error": str(error)}
+    except urllib.error.URLError:
+        return {"status": "unreachable"}
 
-    # Build pipeline
-    return pipeline("text-classification", model=config.local_model_dir)
+def predict(text: str) -> dict:
+    """Send the review to the inference service and return its prediction."""
+    request = urllib.request.Request(f"{load_service_url()}/predict",
+                                     data=json.dumps({"text": text}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())["predictions"][0]
 
 # UI
 st.title("Sentiment Analysis Application")
-classifier = load_pipeline()
+
+# The page renders right away, whatever the state of the model
+status = service_status()
+if status["status"] == "loading":
+    st.info("The model is loading, predictions will be available in a few seconds.")
+elif status["status"] == "failed":
+    st.error(f"The inference service could not load the model: {status.get('error')}")
+elif status["status"] == "unreachable":
+    st.warning(f"The inference service is starting or not reachable at {load_service_url()}.")
 
 user_input = st.text_area("Enter your review:", "This movie was amazing!")
 if st.button("Predict"):
     with st.spinner("Analyzing sentiment..."):
-        prediction = classifier(user_input)
-        score = round(prediction[0]['score'] * 100, 2)
-        st.success(f"Prediction: {prediction[0]['label']} ({score}%)")  
\ No newline at end of file
+        try:
+            prediction = predict(user_input)
+            score = round(prediction['score'] * 100, 2)
+            st.success(f"Prediction: {prediction['label']} ({score}%)")
+        except urllib.error.HTTPError as error:
+            if error.code == 429: # Rejected by the admission control of the service
+                st.warning("The inference service is overloaded. Please try again in a few seconds.")
+            elif error.code == 503:
+                st.info("The model is still loading. Please try again in a few seconds.")
+            else:
+                raise
+        except urllib.error.URLError:
+            st.error(f"The inference service is not reachable at {load_service_url()}. Please start it with `python main.py inference`.")
@@ -0,0 +1,275 @@
+import time
+# Start of the process (interpreter start excluded), reference of the cold start report
+PROCESS_START_TIME = time.perf_counter()
+import asyncio
+from aiohttp import web
+from colorama import Fore, Style
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+from src.config_loaders.inference_config_loader import inference_config_loader, InferenceConfig
+from src.web_app.micro_batcher import MicroBatcher, QueueFullError
+from src.web_app.prediction_cache import PredictionCache
+from src.web_app.service_metrics import ServiceMetrics, CallbackMetric, CONTENT_TYPE
+from src.utils.instrumentation import Counters
+from typing import Dict, List, Optional, Tuple
+
+# The model manager (torch, transformers, boto3) is imported by the background model loading: the service listens before
+SERVER_IMPORTS_S = time.perf_counter() - PROCESS_START_TIME
+
+INFERENCE_CONFIG_PATH = "config/inference_config.json"
+# Rough number of characters per token, used to estimate the cost of a review without tokenizing it in the event loop
+CHARS_PER_TOKEN = 4
+# Special tokens added to each window of a review
+SPECIAL_TOKENS = 2
+
+class InferenceServer:
+    """
+    Async HTTP inference service. Concurrent requests are grouped into micro-batches run by one shared model worker.
+
+    Endpoints:
+        POST /predict: {"text": "..."} or {"texts": ["...", ...]} -> {"predictions": [{"label": ..., "score": ...}, ...]}
+        GET /health: {"status": "ok", "model_version": ..., "cache": {...}, "queue": {...}, "counters": {...}, "startup": {...}}
+            (status 503 with {"status": "loading"} or {"status": "failed"} until the model is ready)
+        GET /metrics: Prometheus text exposition format (requests, latencies, batch sizes, queue depth, token lengths, load times)
+        POST /rollback: serve the previous model version again -> {"model_version": ...}
+
+    New model versions promoted to S3 are swapped in without restart (see ModelManager).
+    The service listens as soon as it starts: the model is loaded in the background and /predict answers 503 until it is ready.
+    Under overload, the reviews the micro-batcher cannot serve within its latency SLO are rejected with 429 and a Retry-After header.
+    """
+
+    def __init__(self, config: InferenceConfig) -> None:
+        self.config = config
+        self.batcher = None
+        self.cache = None
+        self.model_manager = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+        self._load_task: Optional[asyncio.Task] = None
+        self.load_error: Optional[str] = None
+        # Cold start report: seconds spent in each startup step, and since the start of the process when listening and ready
+        self.startup: Dict[str, float] = {"server_imports_s": round(SERVER_IMPORTS_S, 3)}
+        self.counters = Counters()
+        self.metrics = ServiceMetrics()
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/predict", self.predict)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.export_metrics)
+        app.router.add_post("/rollback", self.rollback)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application) -> None:
+        self.startup["listening_s"] = round(time.perf_counter() - PROCESS_START_TIME, 3)
+        self._load_task = asyncio.create_task(self._load_model())
+        print(f"{Fore.CYAN}Inference service listening on {self.config.server.url}, loading the model in the background...{Style.RESET_ALL}")
+
+    def _create_model_manager(self) -> None:
+        # Run in a background thread: the slow imports, the S3 download and the warm-up do not block the event loop
+        start_time = time.perf_counter()
+        from src.web_app.model_manager import ModelManager
+        self.startup["model_imports_s"] = round(time.perf_counter() - start_time, 3)
+        model_manager = ModelManager(config=self.config, metrics=self.metrics)
+        model_manager.load_initial()
+        self.startup.update({name: round(seconds, 3) for name, seconds in model_manager.last_load_timings.items()})
+        self.model_manager = model_manager
+
+    async def _load_model(self) -> None:
+        print(f"{Fore.YELLOW}Loading model for the inference service...{Style.RESET_ALL}")
+        start_time = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._create_model_manager)
+        except Exception as error:
+            self.load_error = str(error)
+            print(f"{Fore.RED}Could not load the model: {error}{Style.RESET_ALL}")
+            return
+        self.counters.increment("model_load_s", time.perf_counter() - start_time)
+        self.metrics.registry.register(CallbackMetric("sentiment_model_info", "Version of the served model.", "gauge",
+                                                      callback=lambda: {(self.model_manager.model_version,): 1}, label_names=["model_version"]))
+        if self.config.cache.enabled:
+            self.cache = PredictionCache(model_version=self.model_manager.model_version,
+                                         max_size=self.config.cache.max_size,
+                                         ttl_seconds=self.config.cache.ttl_seconds,
+                                         disk_path=self.config.cache.disk_path,
+                                         disk_max_size=self.config.cache.disk_max_size)
+            self.metrics.registry.register(CallbackMetric("sentiment_prediction_cache_lookups_total", "Number of prediction cache lookups by result.", "counter",
+                                                          callback=self._cache_lookups, label_names=["result"]))
+        self.batcher = MicroBatcher(predict_fn=self._predict_batch,
+                                    max_batch_size=self.config.server.max_batch_size,
+                                    max_wait_ms=self.config.server.max_wait_ms,
+                                    counters=self.counters,
+                                    max_batch_tokens=self.config.server.max_batch_tokens,
+                                    latency_slo_ms=self.config.server.latency_slo_ms,
+                                    max_queue_size=self.config.server.max_queue_size,
+                                    metrics=self.metrics)
+        await self.batcher.start()
+        self.metrics.registry.register(CallbackMetric("sentiment_queue_depth", "Number of reviews waiting for a micro-batch.", "gauge",
+                                                      callback=lambda: {(): self.batcher.queue_depth}))
+        self.metrics.registry.register(CallbackMetric("sentiment_queued_tokens", "Estimated number of tokens of the reviews waiting for a micro-batch.", "gauge",
+                                                      callback=lambda: {(): self.batcher.queue_stats()["tokens"]}))
+        if self.config.hot_swap.enabled:
+            self._poll_task = asyncio.create_task(self._poll_model_updates())
+        self.startup["ready_s"] = round(time.perf_counter() - PROCESS_START_TIME, 3)
+        print(f"{Fore.GREEN}Inference service ready on {self.config.server.url}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Cold start (s): {', '.join(f'{name} {seconds}' for name, seconds in self.startup.items())}{Style.RESET_ALL}")
+
+    def _unavailable(self) -> web.Response:
+        # Until the model is loaded, clients (and load balancers) are asked to retry later
+        status = "failed" if self.load_error is not None else "loading"
+        return web.json_response({"status": status, "error": self.load_error, "startup": self.startup},
+                                 status=503, headers={"Retry-After": str(5)})
+
+    async def _on_cleanup(self, app: web.Application) -> None:
+        if self._load_task is not None:
+            self._load_task.cancel()
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+        if self.batcher is not None:
+            await self.batcher.stop()
+        if self.cache is not None:
+            self.cache.close()
+
+    async def _poll_model_updates(self) -> None:
+        # Download and warm-up run in a background thread: requests keep being served by the current model meanwhile
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.config.hot_swap.poll_interval_s)
+            try:
+                swapped = await loop.run_in_executor(None, self.model_manager.check_for_update)
+            except Exception as error:
+                print(f"{Fore.RED}Could not check for a new model version: {error}{Style.RESET_ALL}")
+                continue
+            if swapped:
+                self._on_model_swapped()
+
+    def _on_model_swapped(self) -> None:
+        if self.cache is not None:
+            self.cache.set_model_version(self.model_manager.model_version)
+
+    def _cache_lookups(self) -> Dict[Tuple[str, ...], float]:
+        stats = self.cache.stats()
+        return {("hit",): stats["hits"], ("disk_hit",): stats["disk_hits"], ("miss",): stats["misses"]}
+
+    def _predict_batch(self, texts: List[str]) -> List[Tuple[Dict[str, float], str]]:
+        # Run by the model worker of the micro-batcher. The whole batch runs on the model version active when it starts,
+        # returned with each prediction so that it is cached under the version that predicted it
+        start_time = time.perf_counter()
+        active = self.model_manager.active
+        predictor = active.predictor
+        input_ids, review_indices = predictor.tokenize_windows(texts)
+        for ids in input_ids:
+            self.metrics.input_tokens.observe(len(ids))
+        predictions = predictor.predictions_from_logits(predictor.logits_from_windows(input_ids, review_indices, len(texts)))
+        self.metrics.batch_size.observe(len(texts))
+        self.metrics.batch_latency.observe(time.perf_counter() - start_time)
+        return [(prediction, active.model_version) for prediction in predictions]
+
+    async def predict(self, request: web.Request) -> web.Response:
+        self.counters.increment("requests")
+        start_time = time.perf_counter()
+        try:
+            response = await self._handle_predict(request)
+        except Exception:
+            self.metrics.requests.inc(status="error")
+            raise
+        self.metrics.requests.inc(status={200: "ok", 503: "unavailable", 429: "rejected"}.get(response.status, "bad_request"))
+        self.metrics.request_latency.observe(time.perf_counter() - start_time)
+        return response
+
+    async def _handle_predict(self, request: web.Request) -> web.Response:
+        if self.batcher is None:
+            return self._unavailable()
+        try:
+            payload = await request.json()
+        except ValueError:
+            self.counters.increment("bad_requests")
+            return web.json_response({"error": "Request body must be a JSON object."}, status=400)
+
+        texts = payload.get("texts", [payload["text"]] if "text" in payload else None) if isinstance(payload, dict) else None
+        if not isinstance(texts, list) or len(texts) == 0 or not all(isinstance(text, str) for text in texts):
+            self.counters.increment("bad_requests")
+            return web.json_response({"error": "Expected a 'text' string or a non-empty 'texts' list of strings."}, status=400)
+
+        self.counters.increment("reviews", len(texts))
+        self.metrics.reviews.inc(len(texts))
+        start_time = time.perf_counter()
+        try:
+            predictions = await asyncio.gather(*[self._predict_one(text) for text in texts])
+        except QueueFullError as error:
+            # Backpressure: the client retries later instead of queuing beyond the latency SLO
+            self.counters.increment("rejected_requests")
+            return web.json_response({"error": f"Service overloaded: {error}"}, status=429, headers={"Retry-After": str(1)})
+        self.counters.increment("request_time_s", time.perf_counter() - start_time)
+        return web.json_response({"predictions": predictions})
+
+    def _estimate_tokens(self, text: str) -> int:
+        # Cost of the review in the micro-batcher, without tokenizing it in the event loop: truncated to max_input_length,
+        # or split into several windows of at most max_input_length tokens with sliding windows
+        n_tokens = len(text) // CHARS_PER_TOKEN + SPECIAL_TOKENS
+        if not self.config.sliding_window.enabled:
+            return min(n_tokens, self.config.max_input_length)
+        return n_tokens
+
+    async def _predict_one(self, text: str) -> Dict[str, float]:
+        if self.cache is None:
+            prediction, _ = await self.batcher.predict(text, n_tokens=self._estimate_tokens(text))
+            return prediction
+
+        # Cache hits are answered without a forward pass. The disk tier is looked up in a worker thread: SQLite (and its busy
+        # timeout when the database is shared by several processes) never blocks the event loop
+        if self.cache.has_disk:
+            prediction = await asyncio.get_running_loop().run_in_executor(None, self.cache.get, text)
+        else:
+            prediction = self.cache.get(text)
+        if prediction is not None:
+            return prediction
+
+        # Identical requests already in flight (e.g. retries) share the same forward pass
+        key = self.cache.key(text)
+        if key not in self._in_flight:
+            self._in_flight[key] = asyncio.ensure_future(self._predict_and_cache(text, key))
+        return await asyncio.shield(self._in_flight[key])
+
+    async def _predict_and_cache(self, text: str, key: str) -> Dict[str, float]:
+        try:
+            prediction, model_version = await self.batcher.predict(text, n_tokens=self._estimate_tokens(text))
+            # A batch that ran on the previous model during a swap or a rollback is not cached for the new one
+            self.cache.put(text, prediction, model_version=model_version)
+            return prediction
+        finally:
+            del self._in_flight[key]
+
+    async def health(self, request: web.Request) -> web.Response:
+        if self.batcher is None:
+            return self._unavailable()
+        return web.json_response({"status": "ok",
+                                  "model_version": self.model_manager.model_version,
+                                  "previous_model_version": self.model_manager.previous.model_version if self.model_manager.previous is not None else None,
+                                  "cache": self.cache.stats() if self.cache is not None else None,
+                                  "queue": self.batcher.queue_stats(),
+                                  "counters": self.counters.snapshot(),
+                                  "startup": self.startup})
+
+    async def rollback(self, request: web.Request) -> web.Response:
+        if self.batcher is None:
+            return self._unavailable()
+        model_version = await asyncio.get_running_loop().run_in_executor(None, self.model_manager.rollback)
+        if model_version is None:
+            return web.json_response({"error": "No previous model version to roll back to."}, status=409)
+        self._on_model_swapped()
+        return web.json_response({"model_version": model_version})
+
+    async def export_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+def run_server(config: InferenceConfig) -> None:
+    server = InferenceServer(config=config)
+    web.run_app(server.build_app(), host=config.server.host, port=config.server.port)
+
+if __name__ == "__main__":
+    run_server(inference_config_loader(config_path=INFERENCE_CONFIG_PATH))
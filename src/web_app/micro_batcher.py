@@ -0,0 +1,185 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Dict, NamedTuple, Optional
+from src.utils.instrumentation import Counters
+from src.web_app.service_metrics import ServiceMetrics
+
+class QueueFullError(Exception):
+    """Raised when a review is rejected by the admission control of the micro-batcher (the service is overloaded)."""
+
+class QueuedReview(NamedTuple):
+    text: str
+    n_tokens: int
+    queued_at: float
+    future: asyncio.Future
+
+class MicroBatcher:
+    """
+    Collect concurrent prediction requests into micro-batches run by a single shared model worker.
+
+    Batches are formed by token budget rather than by number of reviews: a batch holds at most max_batch_size reviews and
+    its padded size (number of reviews x longest review, in estimated tokens) stays within max_batch_tokens, so that one long review
+    does not pad a batch of short ones. A batch is run as soon as the waiting reviews fill it or when max_wait_ms elapsed since the
+    first one. While the model worker runs a batch, new requests keep queuing, so batches grow with the load.
+
+    Waiting reviews are scheduled shortest first, so that short requests are not stuck behind long ones. Reviews that already waited
+    for half of latency_slo_ms get every other batch (oldest first): long reviews are not starved under load, and a backlog of long
+    reviews delays the short ones by at most one batch.
+
+    Admission control: a review is rejected (QueueFullError) when max_queue_size reviews are already waiting, or when the reviews
+    scheduled before it would take longer than latency_slo_ms at the measured model throughput. Clients are expected to retry later.
+    """
+
+    def __init__(self, predict_fn: Callable[[List[str]], List[Any]], max_batch_size: int, max_wait_ms: float,
+                 counters: Optional[Counters] = None, max_batch_tokens: Optional[int] = None, latency_slo_ms: Optional[float] = None,
+                 max_queue_size: Optional[int] = None, metrics: Optional[ServiceMetrics] = None) -> None:
+        """
+        Args:
+            predict_fn (Callable[[List[str]], List[Any]]): Function predicting a list of reviews, one result per review (e.g. BatchPredictor.predict).
+            max_batch_size (int): Maximum number of reviews per batch.
+            max_wait_ms (float): Maximum time to wait for more requests after the first request of a batch (in milliseconds).
+            counters (Optional[Counters]): Counters updated with the number of batches, the number of batched reviews, the model time and the rejected reviews.
+            max_batch_tokens (Optional[int]): Maximum padded size of a batch in estimated tokens (batches only limited by max_batch_size if not specified).
+            latency_slo_ms (Optional[float]): Target queueing latency of a review (in milliseconds), used for the priority of the waiting reviews and the admission control.
+            max_queue_size (Optional[int]): Maximum number of waiting reviews (unbounded if not specified).
+            metrics (Optional[ServiceMetrics]): Service metrics updated with the queueing time of each review.
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_tokens = max_batch_tokens
+        self.latency_slo_ms = latency_slo_ms
+        self.max_queue_size = max_queue_size
+        self.counters = counters if counters is not None else Counters()
+        self.metrics = metrics
+        self._pending: List[QueuedReview] = []
+        self._queued_tokens = 0
+        self._last_batch_overdue = False
+        # Padded tokens per second of the model worker (moving average over the batches), unknown until the first batch
+        self.tokens_per_s: Optional[float] = None
+        self._has_requests: Optional[asyncio.Event] = None
+        self._worker_task: Optional[asyncio.Task] = None
+        # One thread: the model is shared by all requests and runs one batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-worker")
+
+    async def start(self) -> None:
+        self._has_requests = asyncio.Event()
+        self._worker_task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._worker_task is not None:
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=True)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def queue_stats(self) -> Dict[str, Optional[float]]:
+        """Number of waiting reviews and estimated tokens, and measured model throughput (reported by /health)."""
+        return {"depth": len(self._pending),
+                "tokens": self._queued_tokens,
+                "max_queue_size": self.max_queue_size,
+                "tokens_per_s": round(self.tokens_per_s, 1) if self.tokens_per_s is not None else None}
+
+    def _admit(self, n_tokens: int) -> None:
+        if self.max_queue_size is not None and len(self._pending) >= self.max_queue_size:
+            self.counters.increment("rejected_reviews")
+            raise QueueFullError(f"{len(self._pending)} reviews already waiting (max_queue_size {self.max_queue_size}).")
+        if self.latency_slo_ms is not None and self.tokens_per_s is not None:
+            # Shortest first: only the waiting reviews not longer than this one are scheduled before it
+            tokens_before = sum(review.n_tokens for review in self._pending if review.n_tokens <= n_tokens)
+            expected_wait_ms = 1000 * tokens_before / self.tokens_per_s
+            if expected_wait_ms > self.latency_slo_ms:
+                self.counters.increment("rejected_reviews")
+                raise QueueFullError(f"Expected queueing time of {expected_wait_ms:.0f} ms above the latency SLO of {self.latency_slo_ms:.0f} ms.")
+
+    async def predict(self, text: str, n_tokens: int = 1) -> Any:
+        """Queue one review of about n_tokens tokens and wait for its result from predict_fn (raises QueueFullError if the review is rejected)."""
+        self._admit(n_tokens)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(QueuedReview(text=text, n_tokens=n_tokens, queued_at=time.perf_counter(), future=future))
+        self._queued_tokens += n_tokens
+        self._has_requests.set()
+        return await future
+
+    def _is_full(self) -> bool:
+        return len(self._pending) >= self.max_batch_size or (self.max_batch_tokens is not None and self._queued_tokens >= self.max_batch_tokens)
+
+    def _select_batch(self) -> List[QueuedReview]:
+        now = time.perf_counter()
+        # Reviews that already waited for half of the SLO (the other half is left to run their batch) go first, oldest first,
+        # every other batch. Otherwise shortest first
+        overdue_s = self.latency_slo_ms / 2000 if self.latency_slo_ms is not None else float("inf")
+        overdue = [review for review in self._pending if now - review.queued_at >= overdue_s]
+        if len(overdue) > 0 and not self._last_batch_overdue:
+            candidates = sorted(overdue, key=lambda review: review.queued_at)
+            self._last_batch_overdue = True
+        else:
+            candidates = sorted(self._pending, key=lambda review: (review.n_tokens, review.queued_at))
+            self._last_batch_overdue = False
+        batch = [candidates[0]]
+        longest = candidates[0].n_tokens
+        for review in candidates[1:]:
+            longest = max(longest, review.n_tokens)
+            if len(batch) >= self.max_batch_size or (self.max_batch_tokens is not None and (len(batch) + 1) * longest > self.max_batch_tokens):
+                break
+            batch.append(review)
+        selected = {id(review) for review in batch}
+        self._pending = [review for review in self._pending if id(review) not in selected]
+        self._queued_tokens -= sum(review.n_tokens for review in batch)
+        return batch
+
+    async def _collect_batch(self) -> List[QueuedReview]:
+        loop = asyncio.get_running_loop()
+        while len(self._pending) == 0:
+            self._has_requests.clear()
+            await self._has_requests.wait()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while not self._is_full():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._has_requests.clear()
+            try:
+                await asyncio.wait_for(self._has_requests.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+        return self._select_batch()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            # Requests cancelled by their client while queued are dropped
+            batch = [review for review in batch if not review.future.cancelled()]
+            if len(batch) == 0:
+                continue
+
+            start_time = time.perf_counter()
+            if self.metrics is not None:
+                for review in batch:
+                    self.metrics.queue_wait.observe(start_time - review.queued_at)
+            try:
+                predictions = await loop.run_in_executor(self._executor, self.predict_fn, [review.text for review in batch])
+            except Exception as error:
+                self.counters.increment("batch_errors")
+                for review in batch:
+                    if not review.future.done():
+                        review.future.set_exception(error)
+                continue
+            model_time_s = time.perf_counter() - start_time
+            self.counters.increment("batches")
+            self.counters.increment("batched_reviews", len(batch))
+            self.counters.increment("model_time_s", model_time_s)
+            tokens_per_s = len(batch) * max(review.n_tokens for review in batch) / max(model_time_s, 1e-6)
+            self.tokens_per_s = tokens_per_s if self.tokens_per_s is None else 0.8 * self.tokens_per_s + 0.2 * tokens_per_s
+
+            for review, prediction in zip(batch, predictions):
+                if not review.future.done():
+                    review.future.set_result(prediction)
@@ -0,0 +1,166 @@
+import os
+import time
+import shutil
+import threading
+from colorama import Fore, Style
+from src.aws_services.s3_service import S3Manager, compute_model_version, PROMOTION_MANIFEST_FILE_NAME
+from src.config_loaders.inference_config_loader import InferenceConfig
+from src.modeling.batch_predictor import BatchPredictor
+from src.web_app.service_metrics import ServiceMetrics
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+WARMUP_TEXTS = ["This movie was amazing!",
+                "The plot was predictable and the acting was poor, I would not recommend it to anyone. " * 20]
+
+class ModelVersion(NamedTuple):
+    files_version: str # Identity of the model files in S3 (see compute_model_version)
+    model_version: str # Identity of the served model: files, backend, maximum input length and sliding windows
+    predictor: BatchPredictor
+    local_path: str
+
+class ModelManager:
+    """
+    Versions of the model served by the inference service.
+
+    Each version is downloaded from S3 to its own local directory, loaded and warmed up before being swapped in.
+    The swap is a single reference assignment: batches already running finish on the previous version.
+    The previous version stays in memory for an instant rollback, and the last versions stay on disk.
+    """
+
+    def __init__(self, config: InferenceConfig, metrics: Optional[ServiceMetrics] = None) -> None:
+        self.config = config
+        self.metrics = metrics
+        self.s3_manager = S3Manager(bucket_name=config.bucket_name)
+        self.active: Optional[ModelVersion] = None
+        self.previous: Optional[ModelVersion] = None
+        self._rejected_versions: Set[str] = set()
+        self._pending_listing_version: Optional[str] = None
+        self.last_load_timings: Dict[str, float] = {} # Download and load (warm-up included) times of the last loaded version
+        self._lock = threading.Lock()
+
+    @property
+    def model_version(self) -> Optional[str]:
+        active = self.active
+        return active.model_version if active is not None else None
+
+    def _remote_version(self) -> Optional[Tuple[str, Optional[List[str]]]]:
+        """Version and files of the model available in S3, or None if its upload may not be finished yet."""
+        manifest = self.s3_manager.read_promotion_manifest(self.config.s3_model_prefix)
+        if manifest is not None:
+            return manifest["model_version"], list(manifest["files"])
+
+        # Without a promotion manifest, a version is only trusted once the listing is stable for two checks (upload finished)
+        objects = self.s3_manager.list_objects(self.config.s3_model_prefix)
+        etags = {os.path.relpath(s3_key, self.config.s3_model_prefix).replace("\\", "/"): remote_object["etag"]
+                 for s3_key, remote_object in objects.items()}
+        etags.pop(PROMOTION_MANIFEST_FILE_NAME, None)
+        listing_version = compute_model_version(etags)
+        if self.active is None or listing_version == self._pending_listing_version:
+            return listing_version, None
+        self._pending_listing_version = listing_version
+        return None
+
+    def _local_versions(self) -> List[str]:
+        # Local directories of the downloaded versions, most recent first
+        return sorted((os.path.join(self.config.local_model_dir, name) for name in os.listdir(self.config.local_model_dir)
+                       if os.path.isdir(os.path.join(self.config.local_model_dir, name))),
+                      key=os.path.getmtime, reverse=True)
+
+    def _load_version(self, files_version: str, rel_paths: Optional[List[str]]) -> Optional[ModelVersion]:
+        local_path = os.path.join(self.config.local_model_dir, files_version)
+        start_time = time.perf_counter()
+        etags = self.s3_manager.download_directory(s3_prefix=self.config.s3_model_prefix, local_directory_path=local_path, rel_paths=rel_paths)
+        if compute_model_version(etags) != files_version:
+            # Another model was promoted while downloading: the next check picks it up
+            print(f"{Fore.RED}Downloaded files do not match model version {files_version}. Skipping...{Style.RESET_ALL}")
+            return None
+        self.last_load_timings["s3_download_s"] = time.perf_counter() - start_time
+        if self.metrics is not None:
+            self.metrics.s3_download_seconds.set(self.last_load_timings["s3_download_s"])
+        return self._load_local_version(local_path=local_path)
+
+    def _load_local_version(self, local_path: str) -> ModelVersion:
+        start_time = time.perf_counter()
+        files_version = os.path.basename(os.path.normpath(local_path))
+        predictor = BatchPredictor(model_path=local_path,
+                                   batch_size=self.config.server.max_batch_size,
+                                   max_batch_tokens=self.config.server.max_batch_tokens,
+                                   max_length=self.config.max_input_length,
+                                   backend=self.config.backend,
+                                   sliding_window=self.config.sliding_window.enabled,
+                                   window_overlap=self.config.sliding_window.window_overlap,
+                                   aggregation=self.config.sliding_window.aggregation)
+        # Warm up before serving: the first batches of a new model are much slower (allocations, lazy initializations)
+        for _ in range(2):
+            predictor.predict(WARMUP_TEXTS)
+        self.last_load_timings["model_load_s"] = time.perf_counter() - start_time
+        if self.metrics is not None:
+            self.metrics.model_load_seconds.set(self.last_load_timings["model_load_s"])
+        model_version = f"{files_version}-{self.config.backend}-{self.config.max_input_length}"
+        if self.config.sliding_window.enabled:
+            model_version += f"-window{self.config.sliding_window.window_overlap}-{self.config.sliding_window.aggregation}"
+        return ModelVersion(files_version=files_version,
+                            model_version=model_version,
+                            predictor=predictor,
+                            local_path=local_path)
+
+    def _swap(self, new_version: ModelVersion) -> None:
+        self.previous, self.active = self.active, new_version
+        if self.metrics is not None:
+            self.metrics.model_swaps.inc()
+        self._clean_local_versions()
+        print(f"{Fore.GREEN}Serving model version {new_version.model_version}{Style.RESET_ALL}")
+
+    def _clean_local_versions(self) -> None:
+        # Keep the most recent versions on disk, and always the ones in memory
+        in_use = {version.local_path for version in (self.active, self.previous) if version is not None}
+        for local_path in self._local_versions()[self.config.hot_swap.keep_versions:]:
+            if local_path not in in_use:
+                shutil.rmtree(local_path, ignore_errors=True)
+                print(f"{Fore.CYAN}Removed old model version {local_path}{Style.RESET_ALL}")
+
+    def load_initial(self) -> ModelVersion:
+        """Download, load and warm up the model currently available in S3 (blocking)."""
+        with self._lock:
+            files_version, rel_paths = self._remote_version()
+            new_version = self._load_version(files_version=files_version, rel_paths=rel_paths)
+            if new_version is None:
+                raise RuntimeError(f"Could not download a consistent model from s3://{self.config.bucket_name}/{self.config.s3_model_prefix}. Please try again.")
+            self._swap(new_version)
+            return new_version
+
+    def check_for_update(self) -> bool:
+        """Swap in the model available in S3 if it is a new version (blocking). Returns whether the model was swapped."""
+        with self._lock:
+            remote_version = self._remote_version()
+            if remote_version is None:
+                return False
+            files_version, rel_paths = remote_version
+            if files_version == self.active.files_version or files_version in self._rejected_versions:
+                return False
+
+            print(f"{Fore.YELLOW}New model version {files_version} found in S3. Downloading and warming it up...{Style.RESET_ALL}")
+            new_version = self._load_version(files_version=files_version, rel_paths=rel_paths)
+            if new_version is None:
+                return False
+            self._swap(new_version)
+            return True
+
+    def rollback(self) -> Optional[str]:
+        """
+        Serve the previous version again: instantly if it is in memory, otherwise loaded from the most recent version kept on disk.
+        Returns the served version, or None if there is no previous version.
+        """
+        with self._lock:
+            previous = self.previous
+            if previous is None:
+                local_paths = [local_path for local_path in self._local_versions()
+                               if local_path != self.active.local_path and os.path.basename(local_path) not in self._rejected_versions]
+                if len(local_paths) == 0:
+                    return None
+                previous = self._load_local_version(local_path=local_paths[0])
+            # The rolled back version is not swapped in again by the next checks, until another version is promoted
+            self._rejected_versions.add(self.active.files_version)
+            self.active, self.previous = previous, None
+            print(f"{Fore.GREEN}Rolled back to model version {self.active.model_version}{Style.RESET_ALL}")
+            return self.active.model_version
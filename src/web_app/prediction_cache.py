@@ -0,0 +1,163 @@
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from colorama import Fore, Style
+from typing import Dict, Optional
+
+def normalize_text(text: str) -> str:
+    # Whitespace differences do not change the tokens seen by the model
+    return " ".join(text.split())
+
+class PredictionCache:
+    """
+    Cache of predictions keyed by a hash of the normalized review text and the model version.
+
+    The in-memory tier is an LRU bounded by max_size, with an optional TTL. An optional on-disk tier (SQLite database)
+    is shared by several processes: a miss in memory is looked up on disk before running the model.
+
+    Disk lookups block (up to the busy timeout of a database shared by several processes): with a disk tier, get is meant to
+    be called from a worker thread. Disk writes are queued and written in batches by a background thread, which also deletes
+    the expired predictions and the oldest ones beyond disk_max_size.
+    """
+
+    # Maximum number of predictions written to disk in one transaction
+    DISK_WRITE_BATCH_SIZE = 256
+    # Minimum time between two evictions of the on-disk tier (in seconds)
+    DISK_EVICTION_INTERVAL_S = 60.0
+
+    def __init__(self, model_version: str, max_size: int, ttl_seconds: Optional[float] = None, disk_path: Optional[str] = None,
+                 disk_max_size: Optional[int] = None) -> None:
+        """
+        Args:
+            model_version (str): Identity of the model serving the predictions (part of the cache key).
+            max_size (int): Maximum number of predictions kept in memory.
+            ttl_seconds (Optional[float]): Time to live of a cached prediction. Predictions never expire if None.
+            disk_path (Optional[str]): Path of the SQLite database shared by several processes. No on-disk tier if None.
+            disk_max_size (Optional[int]): Maximum number of predictions kept on disk (the oldest are deleted). Unbounded if None.
+        """
+        self.model_version = model_version
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_size = disk_max_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self._disk_writer = None
+        if disk_path is not None:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, timeout=5)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, prediction TEXT, created_at REAL)")
+            self._disk.execute("CREATE INDEX IF NOT EXISTS predictions_created_at ON predictions (created_at)")
+            self._disk.commit()
+            # The connection is shared by the lookups and the writer thread, the memory tier is never locked during disk accesses
+            self._disk_lock = threading.Lock()
+            self._disk_writes: queue.Queue = queue.Queue()
+            self._disk_writer = threading.Thread(target=self._write_to_disk, name="prediction-cache-writer", daemon=True)
+            self._disk_writer.start()
+
+    @property
+    def has_disk(self) -> bool:
+        return self._disk is not None
+
+    def set_model_version(self, model_version: str) -> None:
+        """Switch to the predictions of another model (the in-memory predictions of the previous model are dropped)."""
+        with self._lock:
+            self.model_version = model_version
+            self._entries.clear()
+
+    def key(self, text: str, model_version: Optional[str] = None) -> str:
+        model_version = model_version if model_version is not None else self.model_version
+        return hashlib.sha256(f"{model_version}|{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, text: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            key = self.key(text)
+            entry = self._entries.get(key)
+            if entry is not None:
+                prediction, created_at = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return prediction
+                del self._entries[key]
+
+        if self._disk is not None:
+            with self._disk_lock:
+                row = self._disk.execute("SELECT prediction, created_at FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is not None and not self._expired(row[1]):
+                prediction = json.loads(row[0])
+                with self._lock:
+                    self._store(key, prediction, row[1])
+                    self.disk_hits += 1
+                return prediction
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text: str, prediction: Dict[str, float], model_version: str) -> None:
+        """Cache a prediction under the version of the model that predicted it, unless that model is no longer served."""
+        created_at = time.time()
+        with self._lock:
+            if model_version != self.model_version:
+                return
+            key = self.key(text, model_version=model_version)
+            self._store(key, prediction, created_at)
+        if self._disk is not None:
+            self._disk_writes.put((key, json.dumps(prediction), created_at))
+
+    def _store(self, key: str, prediction: Dict[str, float], created_at: float) -> None:
+        self._entries[key] = (prediction, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _write_to_disk(self) -> None:
+        # Background thread: the queued predictions are written in batches, one commit per batch
+        next_eviction = time.monotonic()
+        while True:
+            rows = [self._disk_writes.get()]
+            while len(rows) < self.DISK_WRITE_BATCH_SIZE and not self._disk_writes.empty():
+                rows.append(self._disk_writes.get_nowait())
+            closing = None in rows
+            rows = [row for row in rows if row is not None]
+            try:
+                with self._disk_lock:
+                    self._disk.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)", rows)
+                    if time.monotonic() >= next_eviction:
+                        self._evict_from_disk()
+                        next_eviction = time.monotonic() + self.DISK_EVICTION_INTERVAL_S
+                    self._disk.commit()
+            except sqlite3.Error as error: # e.g. database locked by another process beyond the busy timeout
+                print(f"{Fore.RED}Could not write {len(rows)} predictions to the disk cache: {error}{Style.RESET_ALL}")
+            if closing:
+                return
+
+    def _evict_from_disk(self) -> None:
+        if self.ttl_seconds is not None:
+            self._disk.execute("DELETE FROM predictions WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        if self.disk_max_size is not None:
+            # Everything older than the disk_max_size most recent predictions
+            self._disk.execute("DELETE FROM predictions WHERE created_at <= (SELECT created_at FROM predictions ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+                               (self.disk_max_size,))
+
+    def close(self) -> None:
+        """Write the queued predictions to disk and close the database."""
+        if self._disk_writer is not None:
+            self._disk_writes.put(None)
+            self._disk_writer.join()
+            self._disk_writer = None
+            self._disk.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses}
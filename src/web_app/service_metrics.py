@@ -0,0 +1,139 @@
+import math
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Dependency-free implementation of the Prometheus text exposition format (version 0.0.4)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+def _format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    if len(label_names) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(label_names, label_values)) + "}"
+
+class Metric:
+    """Base class of the metrics: a name, a help text, a type and optional label names."""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        assert set(labels) == set(self.label_names), f"Metric {self.name} expects the labels {list(self.label_names)}, got {list(labels)}."
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        return "\n".join(lines + self.samples())
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {} if label_names else {(): 0.0}
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in self._values.items()]
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+class CallbackMetric(Metric):
+    """Metric whose values are read from a callback when the metrics are rendered (e.g. the statistics of a cache)."""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, callback: Callable[[], Dict[Tuple[str, ...], float]], label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self.metric_type = metric_type
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in self.callback().items()]
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]) -> None:
+        super().__init__(name, documentation)
+        self.buckets = sorted(buckets) + [math.inf]
+        self._counts = [0] * len(self.buckets)
+        self._sum = 0.0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._sum += value
+            for idx, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    self._counts[idx] += 1
+                    break
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        samples, cumulative_count = [], 0
+        for upper_bound, count in zip(self.buckets, counts):
+            cumulative_count += count
+            samples.append(f'{self.name}_bucket{{le="{_format_value(upper_bound)}"}} {cumulative_count}')
+        samples.append(f"{self.name}_sum {_format_value(total)}")
+        samples.append(f"{self.name}_count {cumulative_count}")
+        return samples
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+class ServiceMetrics:
+    """Metrics of the inference service, exported by GET /metrics."""
+
+    def __init__(self) -> None:
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.register(Counter("sentiment_requests_total", "Number of /predict requests by status.", label_names=["status"]))
+        self.reviews = self.registry.register(Counter("sentiment_reviews_total", "Number of reviews received by /predict."))
+        self.request_latency = self.registry.register(Histogram("sentiment_request_latency_seconds", "Latency of the /predict requests in seconds.",
+                                                                buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]))
+        self.batch_size = self.registry.register(Histogram("sentiment_batch_size", "Number of reviews per micro-batch run by the model.",
+                                                           buckets=[1, 2, 4, 8, 16, 32, 64, 128]))
+        self.batch_latency = self.registry.register(Histogram("sentiment_batch_latency_seconds", "Model time of a micro-batch in seconds.",
+                                                              buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]))
+        self.queue_wait = self.registry.register(Histogram("sentiment_queue_wait_seconds", "Time a review waited in the micro-batcher queue in seconds.",
+                                                           buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]))
+        self.input_tokens = self.registry.register(Histogram("sentiment_input_tokens", "Number of tokens per review after truncation (per window with sliding windows).",
+                                                             buckets=[16, 32, 64, 128, 256, 384, 512]))
+        self.model_load_seconds = self.registry.register(Gauge("sentiment_model_load_seconds", "Time to load the model in memory, S3 download excluded."))
+        self.s3_download_seconds = self.registry.register(Gauge("sentiment_s3_download_seconds", "Time to download the model from S3."))
+        self.model_swaps = self.registry.register(Counter("sentiment_model_swaps_total", "Number of model versions swapped in without restarting the service."))
+
+    def render(self) -> str:
+        return self.registry.render()
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from src.config_loaders.inference_config_loader import InferenceConfig
+from src.web_app.inference_server import InferenceServer
+from src.web_app.micro_batcher import MicroBatcher
+from src.web_app.prediction_cache import PredictionCache
+
+pytestmark = pytest.mark.asyncio
+
+class VersionedModel:
+    """Model answering with the length of each review, and the model version that ran the batch."""
+
+    def __init__(self, model_version: str) -> None:
+        self.model_version = model_version
+        self.batches = []
+        self.released = threading.Event()
+        self.released.set()
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        assert self.released.wait(timeout=5), "The model was never released."
+        return [({"label": "positive", "score": float(len(text))}, self.model_version) for text in texts]
+
+async def start_server(model: VersionedModel, **batcher_kwargs) -> InferenceServer:
+    # The service without its model manager: the micro-batcher runs the fake model
+    server = InferenceServer(config=InferenceConfig(bucket_name="bucket", local_model_dir="model", s3_model_prefix="models/"))
+    server.cache = PredictionCache(model_version="v1", max_size=100)
+    server.batcher = MicroBatcher(predict_fn=model, **{"max_batch_size": 8, "max_wait_ms": 20, **batcher_kwargs})
+    await server.batcher.start()
+    return server
+
+async def test_identical_requests_in_flight_share_one_prediction():
+    model = VersionedModel(model_version="v1")
+    server = await start_server(model)
+    try:
+        predictions = await asyncio.gather(*[server._predict_one(text) for text in ["great movie", "great  movie", " great movie ", "bad movie"]])
+        assert predictions[0] == predictions[1] == predictions[2]
+        assert model.batches == [["great movie", "bad movie"]]
+        assert len(server._in_flight) == 0
+
+        # Answered by the cache afterwards
+        assert await server._predict_one("great movie") == predictions[0]
+        assert len(model.batches) == 1
+    finally:
+        await server.batcher.stop()
+
+async def test_cancelled_request_does_not_cancel_the_shared_prediction():
+    model = VersionedModel(model_version="v1")
+    model.released.clear()
+    server = await start_server(model)
+    try:
+        first = asyncio.create_task(server._predict_one("great movie"))
+        second = asyncio.create_task(server._predict_one("great movie"))
+        while len(model.batches) == 0:
+            await asyncio.sleep(0.001)
+        first.cancel()
+        model.released.set()
+        assert (await second)["score"] == len("great movie")
+        assert first.cancelled()
+    finally:
+        model.released.set()
+        await server.batcher.stop()
+
+async def test_prediction_of_a_swapped_out_model_is_not_cached():
+    model = VersionedModel(model_version="v1")
+    model.released.clear()
+    server = await start_server(model)
+    try:
+        request = asyncio.create_task(server._predict_one("great movie"))
+        while len(model.batches) == 0:
+            await asyncio.sleep(0.001)
+        # The model is swapped while the batch runs on the previous version
+        server.cache.set_model_version("v2")
+        model.released.set()
+        await request
+        assert server.cache.get("great movie") is None
+    finally:
+        model.released.set()
+        await server.batcher.stop()
+
+async def test_overloaded_service_answers_429():
+    model = VersionedModel(model_version="v1")
+    model.released.clear()
+    server = await start_server(model, max_batch_size=1, max_wait_ms=0, max_queue_size=1)
+    app = web.Application()
+    app.router.add_post("/predict", server.predict)
+    async with TestClient(TestServer(app)) as client:
+        try:
+            running = asyncio.create_task(client.post("/predict", json={"text": "running review"}))
+            while len(model.batches) == 0:
+                await asyncio.sleep(0.001)
+            queued = asyncio.create_task(client.post("/predict", json={"text": "queued review"}))
+            while server.batcher.queue_depth == 0:
+                await asyncio.sleep(0.001)
+
+            response = await client.post("/predict", json={"text": "rejected review"})
+            assert response.status == 429
+            assert response.headers["Retry-After"] == "1"
+            assert "overloaded" in (await response.json())["error"]
+
+            model.released.set()
+            assert [(await request).status for request in [running, queued]] == [200, 200]
+            metrics = server.metrics.render()
+            assert 'sentiment_requests_total{status="rejected"} 1.0' in metrics
+            assert 'sentiment_requests_total{status="ok"} 2.0' in metrics
+        finally:
+            model.released.set()
+            await server.batcher.stop()
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import pytest
+from contextlib import asynccontextmanager
+from src.web_app.micro_batcher import MicroBatcher, QueueFullError
+
+pytestmark = pytest.mark.asyncio
+
+class BlockingModel:
+    """Model recording the batches it runs, that can be held on a batch (to let reviews queue up) until released."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.released = threading.Event()
+        self.released.set()
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        assert self.released.wait(timeout=5), "The model was never released."
+        return [text.upper() for text in texts]
+
+async def wait_for(condition, timeout_s: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_s
+    while not condition():
+        assert loop.time() < deadline, "Condition not met in time."
+        await asyncio.sleep(0.001)
+
+async def queue_behind_running_batch(model: BlockingModel, batcher: MicroBatcher, reviews) -> list:
+    """Hold the model on a first batch, queue the (text, n_tokens) reviews behind it, and return their tasks."""
+    model.released.clear()
+    tasks = [asyncio.create_task(batcher.predict("running", n_tokens=1))]
+    await wait_for(lambda: len(model.batches) == 1)
+    for text, n_tokens in reviews:
+        tasks.append(asyncio.create_task(batcher.predict(text, n_tokens=n_tokens)))
+    await wait_for(lambda: batcher.queue_depth == len(reviews))
+    return tasks
+
+@asynccontextmanager
+async def running_batcher(**kwargs):
+    model = BlockingModel()
+    batcher = MicroBatcher(predict_fn=model, **kwargs)
+    await batcher.start()
+    try:
+        yield model, batcher
+    finally:
+        model.released.set()
+        await batcher.stop()
+
+async def test_concurrent_requests_share_a_batch():
+    async with running_batcher(max_batch_size=8, max_wait_ms=50) as (model, batcher):
+        results = await asyncio.gather(*[batcher.predict(text) for text in ["a", "b", "c"]])
+        assert results == ["A", "B", "C"]
+        assert model.batches == [["a", "b", "c"]]
+        assert batcher.counters.snapshot()["batches"] == 1
+
+async def test_full_batches_run_without_waiting():
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    async with running_batcher(max_batch_size=2, max_wait_ms=1000) as (model, batcher):
+        results = await asyncio.gather(*[batcher.predict(text) for text in ["a", "b", "c", "d"]])
+        assert results == ["A", "B", "C", "D"]
+        assert model.batches == [["a", "b"], ["c", "d"]]
+        assert loop.time() - start_time < 1.0
+
+async def test_model_errors_reach_every_request_of_the_batch():
+    async with running_batcher(max_batch_size=8, max_wait_ms=10) as (model, batcher):
+        batcher.predict_fn = lambda texts: 1 / 0
+        results = await asyncio.gather(batcher.predict("a"), batcher.predict("b"), return_exceptions=True)
+        assert all(isinstance(result, ZeroDivisionError) for result in results)
+        assert batcher.counters.snapshot()["batch_errors"] == 1
+
+        # The worker keeps serving the next batches
+        batcher.predict_fn = model
+        assert await batcher.predict("c") == "C"
+
+async def test_batches_stay_within_the_token_budget():
+    async with running_batcher(max_batch_size=8, max_wait_ms=20, max_batch_tokens=100) as (model, batcher):
+        reviews = [("short 1", 10), ("long", 60), ("short 2", 10), ("short 3", 10)]
+        results = await asyncio.gather(*[batcher.predict(text, n_tokens=n_tokens) for text, n_tokens in reviews])
+        assert results == [text.upper() for text, _ in reviews]
+        # 4 reviews padded to 60 tokens would take 240 tokens: the long review runs alone
+        assert model.batches == [["short 1", "short 2", "short 3"], ["long"]]
+
+async def test_shortest_reviews_are_scheduled_first():
+    async with running_batcher(max_batch_size=1, max_wait_ms=0) as (model, batcher):
+        tasks = await queue_behind_running_batch(model, batcher, [("long", 300), ("medium", 100), ("short", 10)])
+        model.released.set()
+        await asyncio.gather(*tasks)
+        assert model.batches == [["running"], ["short"], ["medium"], ["long"]]
+
+async def test_overdue_reviews_get_every_other_batch():
+    async with running_batcher(max_batch_size=1, max_wait_ms=0, latency_slo_ms=100) as (model, batcher):
+        tasks = await queue_behind_running_batch(model, batcher, [("long 1", 300), ("long 2", 300)])
+        # The long reviews waited for half of the SLO when the short ones arrive
+        await asyncio.sleep(0.06)
+        for text in ["short 1", "short 2"]:
+            tasks.append(asyncio.create_task(batcher.predict(text, n_tokens=10)))
+        await wait_for(lambda: batcher.queue_depth == 4)
+        model.released.set()
+        await asyncio.gather(*tasks)
+        assert model.batches == [["running"], ["long 1"], ["short 1"], ["long 2"], ["short 2"]]
+
+async def test_reviews_beyond_the_queue_size_are_rejected():
+    async with running_batcher(max_batch_size=1, max_wait_ms=0, max_queue_size=2) as (model, batcher):
+        tasks = await queue_behind_running_batch(model, batcher, [("first", 10), ("second", 10)])
+        with pytest.raises(QueueFullError):
+            await batcher.predict("third", n_tokens=10)
+        assert batcher.counters.snapshot()["rejected_reviews"] == 1
+        model.released.set()
+        await asyncio.gather(*tasks)
+
+async def test_reviews_expected_to_miss_the_slo_are_rejected():
+    async with running_batcher(max_batch_size=1, max_wait_ms=0, latency_slo_ms=100) as (model, batcher):
+        tasks = await queue_behind_running_batch(model, batcher, [("waiting", 80)])
+        # Measured throughput of the model: 1000 padded tokens per second, 80 ms for the waiting review
+        batcher.tokens_per_s = 1000.0
+        # Scheduled before the waiting review (shortest first): admitted
+        tasks.append(asyncio.create_task(batcher.predict("short", n_tokens=30)))
+        await wait_for(lambda: batcher.queue_depth == 2)
+        # Scheduled after both: 110 ms of queueing
+        with pytest.raises(QueueFullError):
+            await batcher.predict("long", n_tokens=90)
+        assert batcher.queue_stats()["depth"] == 2
+        model.released.set()
+        await asyncio.gather(*tasks)
@@ -0,0 +1,116 @@
+import sqlite3
+import time
+import types
+import pytest
+from src.web_app import prediction_cache
+from src.web_app.prediction_cache import PredictionCache
+
+POSITIVE = {"label": "positive", "score": 0.9}
+NEGATIVE = {"label": "negative", "score": 0.8}
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(prediction_cache, "time", types.SimpleNamespace(time=fake_clock.time, monotonic=time.monotonic))
+    return fake_clock
+
+def count_disk_rows(disk_path) -> int:
+    with sqlite3.connect(disk_path) as connection:
+        return connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+def test_least_recently_used_prediction_is_evicted():
+    cache = PredictionCache(model_version="v1", max_size=2)
+    cache.put("first review", POSITIVE, model_version="v1")
+    cache.put("second review", NEGATIVE, model_version="v1")
+    assert cache.get("first review") == POSITIVE
+    cache.put("third review", POSITIVE, model_version="v1")
+
+    assert cache.get("second review") is None
+    assert cache.get("first review") == POSITIVE
+    assert cache.get("third review") == POSITIVE
+    assert cache.stats() == {"size": 2, "hits": 3, "disk_hits": 0, "misses": 1}
+
+def test_whitespace_does_not_change_the_key():
+    cache = PredictionCache(model_version="v1", max_size=10)
+    cache.put("  great   movie\n", POSITIVE, model_version="v1")
+    assert cache.get("great movie") == POSITIVE
+
+def test_predictions_expire_after_their_ttl(clock):
+    cache = PredictionCache(model_version="v1", max_size=10, ttl_seconds=60)
+    cache.put("great movie", POSITIVE, model_version="v1")
+    clock.now += 59
+    assert cache.get("great movie") == POSITIVE
+    clock.now += 2
+    assert cache.get("great movie") is None
+    assert cache.stats()["size"] == 0
+
+def test_predictions_of_another_model_version_are_not_served():
+    cache = PredictionCache(model_version="v1", max_size=10)
+    cache.put("great movie", POSITIVE, model_version="v1")
+    cache.set_model_version("v2")
+    assert cache.get("great movie") is None
+
+    # A batch that ran on the previous version is not cached for the new one
+    cache.put("great movie", NEGATIVE, model_version="v1")
+    assert cache.get("great movie") is None
+    cache.put("great movie", POSITIVE, model_version="v2")
+    assert cache.get("great movie") == POSITIVE
+
+def test_disk_tier_is_shared_between_processes(tmp_path):
+    disk_path = str(tmp_path / "cache.sqlite")
+    writer = PredictionCache(model_version="v1", max_size=10, disk_path=disk_path)
+    for idx in range(300):
+        writer.put(f"review {idx}", POSITIVE, model_version="v1")
+    # The background thread writes the queued predictions before the database is closed
+    writer.close()
+    assert count_disk_rows(disk_path) == 300
+
+    reader = PredictionCache(model_version="v1", max_size=10, disk_path=disk_path)
+    other_model_reader = PredictionCache(model_version="v2", max_size=10, disk_path=disk_path)
+    try:
+        assert reader.get("review 7") == POSITIVE
+        # Copied to memory by the disk hit
+        assert reader.get("review 7") == POSITIVE
+        assert reader.stats() == {"size": 1, "hits": 1, "disk_hits": 1, "misses": 0}
+        assert other_model_reader.get("review 7") is None
+    finally:
+        reader.close()
+        other_model_reader.close()
+
+def test_disk_tier_keeps_the_most_recent_predictions(tmp_path, monkeypatch):
+    monkeypatch.setattr(PredictionCache, "DISK_EVICTION_INTERVAL_S", 0.0)
+    disk_path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache(model_version="v1", max_size=10, disk_path=disk_path, disk_max_size=3)
+    for idx in range(5):
+        cache.put(f"review {idx}", POSITIVE, model_version="v1")
+        time.sleep(0.002) # Distinct creation times
+    cache.close()
+    assert count_disk_rows(disk_path) == 3
+
+    reader = PredictionCache(model_version="v1", max_size=10, disk_path=disk_path)
+    try:
+        assert reader.get("review 1") is None
+        assert reader.get("review 4") == POSITIVE
+    finally:
+        reader.close()
+
+def test_expired_predictions_are_deleted_from_disk(tmp_path, clock):
+    disk_path = str(tmp_path / "cache.sqlite")
+    cache = PredictionCache(model_version="v1", max_size=10, ttl_seconds=60, disk_path=disk_path)
+    cache.put("old review", POSITIVE, model_version="v1")
+    cache.close()
+
+    clock.now += 120
+    cache = PredictionCache(model_version="v1", max_size=10, ttl_seconds=60, disk_path=disk_path)
+    assert cache.get("old review") is None
+    # The first write of the next process evicts the expired predictions
+    cache.put("new review", NEGATIVE, model_version="v1")
+    cache.close()
+    assert count_disk_rows(disk_path) == 1
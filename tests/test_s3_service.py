@@ -0,0 +1,127 @@
+import os
+import boto3
+import pytest
+from moto import mock_aws
+from src.aws_services.s3_service import S3Manager, compute_s3_etag, compute_model_version, MANIFEST_FILE_NAME
+
+BUCKET_NAME = "test-bucket"
+# Smallest part size accepted by S3 (and by boto3) for multipart uploads
+MULTIPART_CHUNKSIZE = 5 * 1024 * 1024
+
+class RecordingS3Client:
+    """S3 client recording the transferred keys, and failing the downloads of the keys in fail_keys."""
+
+    def __init__(self, s3_client, fail_keys=()) -> None:
+        self._s3 = s3_client
+        self.fail_keys = set(fail_keys)
+        self.uploaded = []
+        self.downloaded = []
+
+    def upload_file(self, file_path, bucket_name, s3_key, **kwargs):
+        self.uploaded.append(s3_key)
+        return self._s3.upload_file(file_path, bucket_name, s3_key, **kwargs)
+
+    def download_file(self, bucket_name, s3_key, file_path, **kwargs):
+        if s3_key in self.fail_keys:
+            raise ConnectionError(f"Connection lost while downloading {s3_key}")
+        self.downloaded.append(s3_key)
+        return self._s3.download_file(bucket_name, s3_key, file_path, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._s3, name)
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET_NAME)
+        yield client
+
+@pytest.fixture
+def model_dir(tmp_path):
+    model_path = tmp_path / "model"
+    (model_path / "tokenizer").mkdir(parents=True)
+    (model_path / "config.json").write_text('{"model_type": "distilbert"}')
+    (model_path / "tokenizer" / "vocab.txt").write_text("[PAD]\n[UNK]\nhello\n")
+    # Large enough for a multipart upload in 3 parts
+    (model_path / "model.safetensors").write_bytes(os.urandom(2 * MULTIPART_CHUNKSIZE + 1024))
+    return model_path
+
+def test_reupload_of_unchanged_directory_is_a_noop(s3_client, model_dir):
+    client = RecordingS3Client(s3_client)
+    s3_manager = S3Manager(bucket_name=BUCKET_NAME, multipart_chunksize=MULTIPART_CHUNKSIZE, s3_client=client)
+
+    etags = s3_manager.upload_directory(local_directory_path=str(model_dir), s3_prefix="models/")
+    assert sorted(client.uploaded) == ["models/config.json", "models/model.safetensors", "models/tokenizer/vocab.txt"]
+    assert sorted(etags) == ["config.json", "model.safetensors", "tokenizer/vocab.txt"]
+
+    client.uploaded.clear()
+    assert s3_manager.upload_directory(local_directory_path=str(model_dir), s3_prefix="models/") == etags
+    assert client.uploaded == []
+
+    # Only the changed file is uploaded again
+    (model_dir / "config.json").write_text('{"model_type": "bert"}')
+    s3_manager.upload_directory(local_directory_path=str(model_dir), s3_prefix="models/")
+    assert client.uploaded == ["models/config.json"]
+
+def test_multipart_etag_matches_s3(s3_client, model_dir):
+    s3_manager = S3Manager(bucket_name=BUCKET_NAME, multipart_chunksize=MULTIPART_CHUNKSIZE, s3_client=s3_client)
+    etags = s3_manager.upload_directory(local_directory_path=str(model_dir), s3_prefix="models/")
+    remote_objects = s3_manager.list_objects("models/")
+
+    weights_etag = compute_s3_etag(str(model_dir / "model.safetensors"), MULTIPART_CHUNKSIZE)
+    assert weights_etag.endswith("-3")
+    assert remote_objects["models/model.safetensors"]["etag"] == weights_etag == etags["model.safetensors"]
+    # Single part uploads have the MD5 of the content as ETag
+    assert remote_objects["models/config.json"]["etag"] == compute_s3_etag(str(model_dir / "config.json"), MULTIPART_CHUNKSIZE)
+
+def test_interrupted_download_resumes(s3_client, model_dir, tmp_path):
+    S3Manager(bucket_name=BUCKET_NAME, multipart_chunksize=MULTIPART_CHUNKSIZE, s3_client=s3_client).upload_directory(
+        local_directory_path=str(model_dir), s3_prefix="models/")
+    download_dir = tmp_path / "downloaded"
+    download_dir.mkdir()
+    # Leftover of a previous interrupted download
+    (download_dir / "model.safetensors.part").write_bytes(b"truncated")
+
+    client = RecordingS3Client(s3_client, fail_keys=["models/model.safetensors"])
+    s3_manager = S3Manager(bucket_name=BUCKET_NAME, max_workers=1, multipart_chunksize=MULTIPART_CHUNKSIZE, s3_client=client)
+    with pytest.raises(ConnectionError):
+        s3_manager.download_directory(s3_prefix="models/", local_directory_path=str(download_dir))
+    assert not (download_dir / "model.safetensors").exists()
+    # The files downloaded before the interruption are recorded in the manifest
+    assert (download_dir / MANIFEST_FILE_NAME).exists()
+    assert sorted(client.downloaded) == ["models/config.json", "models/tokenizer/vocab.txt"]
+
+    # Only the interrupted file is downloaded again
+    client.fail_keys.clear()
+    client.downloaded.clear()
+    etags = s3_manager.download_directory(s3_prefix="models/", local_directory_path=str(download_dir))
+    assert client.downloaded == ["models/model.safetensors"]
+    for rel_path in ["config.json", "model.safetensors", "tokenizer/vocab.txt"]:
+        assert (download_dir / rel_path).read_bytes() == (model_dir / rel_path).read_bytes()
+    assert not (download_dir / "model.safetensors.part").exists()
+
+    # Everything is up to date: nothing is downloaded again
+    client.downloaded.clear()
+    assert s3_manager.download_directory(s3_prefix="models/", local_directory_path=str(download_dir)) == etags
+    assert client.downloaded == []
+
+def test_promotion_manifest_round_trip(s3_client, model_dir, tmp_path):
+    s3_manager = S3Manager(bucket_name=BUCKET_NAME, multipart_chunksize=MULTIPART_CHUNKSIZE, s3_client=s3_client)
+    assert s3_manager.read_promotion_manifest("models/") is None
+
+    etags = s3_manager.upload_directory(local_directory_path=str(model_dir), s3_prefix="models/")
+    model_version = s3_manager.write_promotion_manifest(s3_prefix="models/", etags=etags, metadata={"metrics": {"accuracy": 0.9}})
+    manifest = s3_manager.read_promotion_manifest("models/")
+    assert manifest["model_version"] == model_version == compute_model_version(etags)
+    assert manifest["files"] == etags
+    assert manifest["metrics"] == {"accuracy": 0.9}
+
+    # Only the files of the manifest are downloaded, not the manifest itself
+    download_dir = tmp_path / "promoted"
+    downloaded_etags = s3_manager.download_directory(s3_prefix="models/", local_directory_path=str(download_dir), rel_paths=manifest["files"])
+    assert downloaded_etags == etags
+    assert not (download_dir / "promotion_manifest.json").exists()
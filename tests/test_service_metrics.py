@@ -0,0 +1,72 @@
+import pytest
+from src.web_app.service_metrics import Counter, Gauge, Histogram, CallbackMetric, MetricsRegistry, ServiceMetrics
+
+def test_counter_with_labels():
+    counter = Counter("requests_total", "Number of requests by status.", label_names=["status"])
+    counter.inc(status="ok")
+    counter.inc(2, status="ok")
+    counter.inc(status='bad "quoted"\\path\nline')
+    assert counter.render().split("\n") == ["# HELP requests_total Number of requests by status.",
+                                            "# TYPE requests_total counter",
+                                            'requests_total{status="ok"} 3.0',
+                                            'requests_total{status="bad \\"quoted\\"\\\\path\\nline"} 1.0']
+
+def test_unlabeled_counter_starts_at_zero():
+    assert Counter("reviews_total", "Number of reviews.").samples() == ["reviews_total 0.0"]
+
+def test_labels_must_match_the_label_names():
+    counter = Counter("requests_total", "Number of requests by status.", label_names=["status"])
+    with pytest.raises(AssertionError):
+        counter.inc(code="200")
+
+def test_gauge_keeps_the_last_value():
+    gauge = Gauge("load_seconds", "Time to load the model.")
+    gauge.set(3.5)
+    gauge.set(1.25)
+    assert gauge.render().split("\n")[1:] == ["# TYPE load_seconds gauge", "load_seconds 1.25"]
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency in seconds.", buckets=[0.5, 0.1, 1])
+    for value in [0.05, 0.1, 0.3, 0.7, 2.0]:
+        histogram.observe(value)
+    assert histogram.render().split("\n") == [
+        "# HELP latency_seconds Latency in seconds.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="0.5"} 3',
+        'latency_seconds_bucket{le="1.0"} 4',
+        'latency_seconds_bucket{le="+Inf"} 5',
+        "latency_seconds_sum 3.15",
+        "latency_seconds_count 5"]
+
+def test_callback_metric_is_read_when_rendered():
+    stats = {"hits": 1}
+    metric = CallbackMetric("cache_lookups_total", "Number of cache lookups by result.", "counter",
+                            callback=lambda: {("hit",): stats["hits"]}, label_names=["result"])
+    stats["hits"] = 7
+    assert metric.samples() == ['cache_lookups_total{result="hit"} 7.0']
+
+def test_registry_renders_every_metric_once():
+    registry = MetricsRegistry()
+    registry.register(Counter("a_total", "A."))
+    registry.register(Gauge("b", "B."))
+    text = registry.render()
+    assert text.endswith("\n")
+    assert text == "# HELP a_total A.\n# TYPE a_total counter\na_total 0.0\n# HELP b B.\n# TYPE b gauge\nb 0.0\n"
+
+def test_service_metrics_are_valid_exposition_text():
+    metrics = ServiceMetrics()
+    metrics.requests.inc(status="ok")
+    metrics.request_latency.observe(0.02)
+    names = set()
+    for line in metrics.render().strip().split("\n"):
+        if line.startswith("# TYPE"):
+            _, _, name, metric_type = line.split(" ")
+            assert name not in names, f"Metric {name} declared twice."
+            assert metric_type in ("counter", "gauge", "histogram")
+            names.add(name)
+        elif not line.startswith("# HELP"):
+            sample_name, value = line.rsplit(" ", 1)
+            float(value.replace("+Inf", "inf"))
+            assert sample_name.split("{")[0].removesuffix("_bucket").removesuffix("_sum").removesuffix("_count") in names
+    assert {"sentiment_requests_total", "sentiment_request_latency_seconds", "sentiment_queue_wait_seconds"} <= names
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support
+from src.evaluators.testing_metrics import MetricsCalculator
+from src.utils.schema import MetricSchema
+
+LABELS = ["negative", "neutral", "positive"]
+N_REVIEWS = 1000
+BATCH_SIZE = 64
+
+@pytest.fixture
+def predictions():
+    rng = np.random.default_rng(0)
+    true_ids = rng.integers(len(LABELS), size=N_REVIEWS)
+    probabilities = rng.dirichlet(np.ones(len(LABELS)), size=N_REVIEWS)
+    # The "neutral" label (index 1) is never predicted
+    probabilities[:, 1] = 0.0
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    return true_ids, probabilities
+
+def accumulate(predictions, positive_label=None) -> MetricsCalculator:
+    true_ids, probabilities = predictions
+    metrics_calculator = MetricsCalculator(labels=LABELS, output_csv_path="unused.csv", positive_label=positive_label)
+    for start in range(0, N_REVIEWS, BATCH_SIZE):
+        end = start + BATCH_SIZE
+        metrics_calculator.update(true_ids=true_ids[start:end], pred_ids=probabilities[start:end].argmax(axis=-1), probabilities=probabilities[start:end])
+    return metrics_calculator
+
+def test_confusion_matrix_matches_sklearn(predictions):
+    true_ids, probabilities = predictions
+    metrics_calculator = accumulate(predictions)
+    expected = confusion_matrix(true_ids, probabilities.argmax(axis=-1), labels=list(range(len(LABELS))))
+    np.testing.assert_array_equal(metrics_calculator.confusion_matrix, expected)
+    assert metrics_calculator.confusion_matrix[:, 1].sum() == 0
+
+@pytest.mark.parametrize("positive_label", [None, "positive", "neutral"])
+def test_metrics_match_sklearn(predictions, positive_label):
+    true_ids, probabilities = predictions
+    pred_ids = probabilities.argmax(axis=-1)
+    metrics = accumulate(predictions, positive_label=positive_label).compute()
+
+    if positive_label is None:
+        precision, recall, f1, _ = precision_recall_fscore_support(true_ids, pred_ids, labels=list(range(len(LABELS))), average="macro", zero_division=0)
+    else:
+        precision, recall, f1, _ = precision_recall_fscore_support(true_ids, pred_ids, labels=[LABELS.index(positive_label)], average="macro", zero_division=0)
+    assert metrics[MetricSchema.ACCURACY] == pytest.approx(accuracy_score(true_ids, pred_ids))
+    assert metrics[MetricSchema.PRECISION] == pytest.approx(precision)
+    assert metrics[MetricSchema.RECALL] == pytest.approx(recall)
+    assert metrics[MetricSchema.F1_SCORE] == pytest.approx(f1)
+
+def test_threshold_sweep_matches_sklearn(predictions):
+    true_ids, probabilities = predictions
+    positive_index = LABELS.index("positive")
+    thresholds = np.linspace(0.0, 1.0, 21)
+    sweep = accumulate(predictions, positive_label="positive").threshold_sweep(thresholds=thresholds)
+
+    positive_probabilities = probabilities[:, positive_index].astype(np.float32)
+    for threshold, row in zip(thresholds, sweep.itertuples(index=False)):
+        # One-vs-rest: a review is predicted positive when its probability is at least the threshold
+        predicted_positive = positive_probabilities >= threshold
+        precision, recall, f1, _ = precision_recall_fscore_support(true_ids == positive_index, predicted_positive, average="binary", zero_division=0)
+        assert row.n_predicted_positive == predicted_positive.sum()
+        assert getattr(row, MetricSchema.PRECISION) == pytest.approx(precision)
+        assert getattr(row, MetricSchema.RECALL) == pytest.approx(recall)
+        assert getattr(row, MetricSchema.F1_SCORE) == pytest.approx(f1)